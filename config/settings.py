@@ -1,5 +1,6 @@
 # config/settings.py
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import Dict
 import os
 
 
@@ -23,5 +24,91 @@ class Settings(BaseSettings):
     # [新增] 短线 Agent 运行间隔：15分钟 (900秒)
     #SHORT_TERM_INTERVAL : int = 600
 
+    # [新增] 采集器并发 Worker 数 (同时在 Pipeline 中处理的新闻条数)
+    COLLECTOR_MAX_WORKERS: int = 6
+    # [新增] 每个 LLM 模型的并发上限 (JSON 格式，例如 {"qwen3-max": 4})，未列出的模型使用默认值
+    LLM_MODEL_CONCURRENCY: Dict[str, int] = {}
+    LLM_DEFAULT_CONCURRENCY: int = 4
+
+    # [新增] 去重索引：sql (持久化，使用 DATABASE_URL，可多副本共享) / memory (仅进程内)
+    DEDUP_BACKEND: str = "sql"
+    # 已见 ID 的保留时长 (小时)，需大于采集窗口 (12h)
+    DEDUP_TTL_HOURS: int = 48
+    # 派发时先占用的短租约 (分钟)：Pipeline / 重试队列接手后才延长到 DEDUP_TTL_HOURS，
+    # 中途崩溃或重启时租约到期后重新处理；需大于单轮采集耗时
+    DEDUP_LEASE_MINUTES: int = 30
+    # 进程内最近窗口的最大条目数 (内存上限)
+    DEDUP_MEMORY_CAPACITY: int = 50000
+
+    # [新增] 共享 HTTP 连接池是否启用 HTTP/2 (需要安装 h2)
+    HTTP_ENABLE_HTTP2: bool = False
+
+    # [新增] 批量过滤：单次 LLM 调用最多打包的新闻条数
+    FILTER_BATCH_MAX_ITEMS: int = 20
+    # 单批的 token 预算 (估算的输入 + 输出)，超出则拆成下一批
+    FILTER_BATCH_TOKEN_BUDGET: int = 6000
+
+    # [新增] LLM 响应缓存 (按 模型 + 提示词版本 + 内容哈希)，持久化到 DATABASE_URL
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL_HOURS: int = 72
+    # 进程内 LRU 条目上限
+    LLM_CACHE_MEMORY_CAPACITY: int = 5000
+    # 数据库中最多保留的条目数，超出后淘汰最久未命中的
+    LLM_CACHE_MAX_ROWS: int = 50000
+
+    # [新增] 近重复新闻检测 (SimHash)：汉明距离不超过该值视为同一条新闻的改写
+    NEAR_DUP_ENABLED: bool = True
+    NEAR_DUP_MAX_HAMMING: int = 8
+    # 索引保留的时间窗口 (小时) 与最大条目数
+    NEAR_DUP_WINDOW_HOURS: int = 24
+    NEAR_DUP_CAPACITY: int = 20000
+
+    # [新增] 爬虫浏览器池：常驻浏览器的页面槽位数 (同时抓取的页面数)
+    CRAWLER_POOL_SIZE: int = 3
+    # 单个页面导航多少次后关闭重开
+    CRAWLER_PAGE_MAX_NAVIGATIONS: int = 50
+    # 浏览器进程总内存上限 (MB)，超出后整体重启
+    CRAWLER_MEMORY_LIMIT_MB: int = 1500
+    # 健康检查间隔 (秒)
+    CRAWLER_HEALTH_CHECK_INTERVAL: int = 60
+
+    # [新增] 爬虫正文的磁盘缓存目录、有效期 (小时) 和总大小上限 (MB)
+    CRAWL_CACHE_DIR: str = "data/crawl_cache"
+    CRAWL_CACHE_TTL_HOURS: int = 24
+    CRAWL_CACHE_MAX_MB: int = 200
+
+    # [新增] 爬虫按域名调度：单个域名的并发上限、统计窗口 (最近 N 次抓取)
+    CRAWL_HOST_CONCURRENCY: int = 2
+    CRAWL_HOST_WINDOW: int = 20
+    # 样本数达到 CRAWL_SKIP_MIN_SAMPLES 且失败率不低于阈值的域名，跳过 CRAWL_SKIP_COOLDOWN 秒
+    CRAWL_SKIP_MIN_SAMPLES: int = 4
+    CRAWL_SKIP_FAILURE_RATE: float = 0.75
+    CRAWL_SKIP_COOLDOWN: int = 1800
+
+    # [新增] updatePanicNews 发件箱：后台并发发送数与最大重试次数 (超出后标记为 dead 保留在表中)
+    OUTBOX_CONCURRENCY: int = 4
+    OUTBOX_MAX_ATTEMPTS: int = 12
+
+    # [新增] Pipeline 出错的新闻先进入重试队列 (指数退避)，重试次数用尽才进入死信表并标记为 Tag 4
+    RETRY_MAX_ATTEMPTS: int = 5
+    RETRY_BASE_DELAY: int = 120  # 首次重试等待 (秒)，之后每次翻倍
+    RETRY_MAX_DELAY: int = 3600
+    # 每轮采集最多处理的条数 (新新闻 + 到期重试)，新新闻优先，剩余容量留给重试
+    RETRY_CYCLE_CAPACITY: int = 30
+
+    # [新增] Dashboard 快照 (stale-while-revalidate)：超过软过期 (秒) 先返回旧快照并在后台刷新，超过硬过期才等待刷新完成
+    DASHBOARD_SOFT_TTL: int = 60
+    DASHBOARD_HARD_TTL: int = 600
+
+    # [新增] 共享 K 线存储：已收盘 K 线的持久化目录 (为空则只保存在内存)、每个序列保留的根数、
+    # 正在形成的 K 线的缓存时长 (秒)
+    CANDLE_STORE_DIR: str = "data/candles"
+    CANDLE_MAX_ROWS: int = 2000
+    CANDLE_FORMING_REFRESH: int = 15
+
+    # [新增] dataCenter 接口 (fetchCryptoPanic / updatePanicNews) 的基础地址，压测时可指向本地模拟服务
+    # (python -m src.mocks.datacenter_server)
+    DATACENTER_BASE_URL: str = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto"
+
 
 settings = Settings()
\ No newline at end of file
@@ -1,15 +1,14 @@
 # src/agents/large_agents/anomaly_agent.py
 import time
-import httpx
-from datetime import datetime, timedelta
+
+from src.core import news_store
+from src.core.update_outbox import update_outbox
 
 # [变更] 移除本地数据库依赖
 # from src.core.database import async_session
 # from src.core.models import SentimentMetrics, TradingSignals
 
 # --- 配置 ---
-FETCH_API_URL = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto/fetchCryptoPanic"
-UPDATE_API_URL = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto/updatePanicNews"
 HEADERS = {'Content-Type': 'application/json'}
 
 ASSETS_TO_TRACK = ["BTC", "ETH"]  # 这里主要用于日志，实际API调用通过 type 1/2 区分
@@ -22,31 +21,21 @@ async def fetch_recent_processed_news(coin_type: int, minutes: int = 60) -> list
     """
     获取过去 X 分钟内的已处理新闻 (Tag != 0)
     """
-    end_time = datetime.now()
-    start_time = end_time - timedelta(minutes=minutes)
-
-    json_data = {
-        "type": coin_type,
-        "startTime": start_time.strftime("%Y-%m-%d %H:%M:%S"),
-        "endTime": end_time.strftime("%Y-%m-%d %H:%M:%S")
-    }
+    end_time = time.time()
+    start_time = end_time - minutes * 60
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(FETCH_API_URL, headers=HEADERS, json=json_data, timeout=15.0)
-            if response.status_code != 200:
-                return []
-
-            raw_list = response.json()
+        # 本地副本范围查询 (按时间倒序，最新的在前)
+        raw_list = await news_store.query_range(coin_type, start_time, end_time)
 
-            # [修复] 筛选出已处理的 (newsTag 不为 None 且不为 0)
-            clean_list = []
-            for item in raw_list:
-                tag = item.get('newsTag')
-                if tag is not None and tag != 0:
-                    clean_list.append(item)
+        # [修复] 筛选出已处理的 (newsTag 不为 None 且不为 0)
+        clean_list = []
+        for item in raw_list:
+            tag = item.get('newsTag')
+            if tag is not None and tag != 0:
+                clean_list.append(item)
 
-            return clean_list
+        return clean_list
 
     except Exception as e:
         print(f"[AnomalyAgent] Fetch Error: {e}")
@@ -75,12 +64,9 @@ async def write_anomaly_back_to_api(latest_news_item: dict, anomaly_msg: str):
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(UPDATE_API_URL, json=payload, headers=HEADERS, timeout=10.0)
-            if response.status_code == 200:
-                print(f"[AnomalyAgent] Signal written back to News ID: {obj_id}")
-            else:
-                print(f"[AnomalyAgent] Write back failed: {response.status_code}")
+        # 交给发件箱异步回写 (本地副本立即更新)
+        await update_outbox.enqueue(payload)
+        print(f"[AnomalyAgent] Signal queued for News ID: {obj_id}")
     except Exception as e:
         print(f"[AnomalyAgent] Write back error: {e}")
 
@@ -1,9 +1,9 @@
 # src/agents/large_agents/short_term_agent.py
 import time
-import httpx
 import json
 import statistics
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
@@ -11,15 +11,21 @@ from config.settings import settings
 from src.schemas.data_models import TradingSignal
 # 【新增】引入 JSON 助手
 from src.utils.json_helper import append_signal_to_structure
+from src.core.llm_cache import llm_cache
+from src.core.http_client import get_http_client, endpoint_timeout
+from src.core import news_store
+from src.core.update_outbox import update_outbox
+from src.core.candle_store import candle_store
+from src.utils.indicators import compute_indicators
+from src.core.prediction_ledger import prediction_ledger
 import ccxt.async_support as ccxt
 from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
 # --- 配置 ---
-FETCH_API_URL = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto/fetchCryptoPanic"
-UPDATE_API_URL = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto/updatePanicNews"
+FETCH_API_URL = f"{settings.DATACENTER_BASE_URL}/fetchCryptoPanic"
 HEADERS = {'Content-Type': 'application/json'}
-
-# 币安 K线接口 (无需API Key)
-BINANCE_KLINES_URL = "https://api.binance.com/api/v3/klines"
+# LLM 缓存：提示词版本 (修改提示词时提升) 与信号缓存时长 (秒)，信号时效性强，只短期复用
+SHORT_TERM_PROMPT_VERSION = "short-term-v1"
+SIGNAL_CACHE_TTL = 900
 
 llm = ChatOpenAI(
     api_key=settings.OPENAI_API_KEY,
@@ -110,113 +116,27 @@ def parse_news_time(time_str: str) -> datetime:
 # 📊 行情与回测模块
 # ==============================================================================
 
-async def fetch_binance_klines(symbol: str, interval: str = "15m", limit: int = 96):
-    params = {"symbol": symbol, "interval": interval, "limit": limit}
-    try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(BINANCE_KLINES_URL, params=params, timeout=10)
-            if resp.status_code == 200:
-                return resp.json()
-    except Exception as e:
-        print(f"⚠️ [MarketData] Failed to fetch klines for {symbol}: {e}")
-    return []
-
-
 async def generate_feedback_report(coin_type: int) -> str:
     """
     生成反馈报告。
-    【优化版】支持解析 JSON 列表，回测所有历史预测记录。
+    读取预测账本中最近 24 小时已结算的 1H 预测准确率 (结算在后台随 K 线收盘增量完成)。
     """
     symbol = "BTCUSDT" if coin_type == 1 else "ETHUSDT"
 
-    # 1. 获取过去 24 小时的新闻 (以确保覆盖足够的历史预测)
-    end_time = datetime.now(timezone.utc)
-    start_time = end_time - timedelta(hours=24)
-    news_history = await fetch_news_window(coin_type, start_time, end_time)
-
-    # 2. 获取高精度 K 线 (15m, 足够覆盖24h)
-    klines = await fetch_binance_klines(symbol, "15m", 100)
-    if not klines or not news_history:
-        return "尚无足够的历史数据进行回测，请按常规策略分析。"
-
-    # K线字典: { timestamp_sec: {open, close} }
-    kline_map = {}
-    for k in klines:
-        ts_sec = int(k[0]) / 1000
-        kline_map[ts_sec] = {"open": float(k[1]), "close": float(k[4])}
-
-    correct_count = 0
-    total_eval = 0
-
-    # 3. 逐条新闻 -> 逐个预测信号 进行比对
-    for item in news_history:
-        analysis = item.get('analysis') or ""
-
-        # 跳过空分析
-        if not analysis: continue
-
-        # 容器：存放所有提取出来的 (预测时间, 预测方向)
-        predictions_to_eval = []
-
-        try:
-            # A. 尝试 JSON 解析 (新格式)
-            data = json.loads(analysis)
-            # 获取 1H 信号列表
-            signals_list = data.get("short_term_signals", [])
-
-            for sig in signals_list:
-                pred_ts_str = sig.get("timestamp")
-                direction = sig.get("direction")
-                if pred_ts_str and direction:
-                    predictions_to_eval.append((pred_ts_str, direction))
-
-        except (json.JSONDecodeError, TypeError):
-            # B. 兼容旧格式 (String 解析)
-            if "【1H_PREDICTION】" in analysis:
-                try:
-                    pred_part = analysis.split("【1H_PREDICTION】:")[1].split("||")[0]
-                    trend_pred = pred_part.split("|")[1].strip().upper()
-                    # 旧格式没有单独记录预测时间，只能近似使用新闻发布时间
-                    news_time_str = item.get('time')
-                    predictions_to_eval.append((news_time_str, trend_pred))
-                except:
-                    pass
-
-        # 4. 评估提取出的预测
-        for ts_str, pred_direction in predictions_to_eval:
-            try:
-                # 解析预测产生的时间 (UTC)
-                pred_dt = parse_news_time(ts_str)
-                pred_ts = pred_dt.timestamp()
-
-                # 对齐到 15m K线 (找到预测发生时的那一根)
-                # 比如预测在 12:05 产生，我们取 12:00 的K线作为起点
-                start_kline_ts = int(pred_ts // 900) * 900
-
-                # 目标时间：预测后 1小时 (3600秒)
-                target_kline_ts = start_kline_ts + 3600
-
-                # 确保起止 K 线都在我们获取的数据范围内
-                if start_kline_ts in kline_map and target_kline_ts in kline_map:
-                    start_price = kline_map[start_kline_ts]["open"]  # 预测时的价格
-                    end_price = kline_map[target_kline_ts]["close"]  # 1小时后的价格
-
-                    price_change = end_price - start_price
-
-                    actual_trend = "NEUTRAL"
-                    if price_change > 0:
-                        actual_trend = "BULLISH"
-                    elif price_change < 0:
-                        actual_trend = "BEARISH"
-
-                    # 只有当预测不是 NEUTRAL 时才计入考核 (NEUTRAL 很难界定对错)
-                    if pred_direction != "NEUTRAL":
-                        total_eval += 1
-                        is_correct = (pred_direction == actual_trend)
-                        if is_correct: correct_count += 1
-            except Exception:
-                continue
+    try:
+        # 顺带结算已到期的预测 (通常后台已完成，这里没有到期项时几乎不耗时)
+        await prediction_ledger.resolve_due()
+    except Exception as e:
+        print(f"⚠️ [FeedbackLoop] 预测结算失败: {e}")
+
+    total_eval, correct_count = prediction_ledger.accuracy(coin_type, "1h")
+    if total_eval:
+        print(f"📊 [FeedbackLoop] {symbol} Accuracy: {correct_count / total_eval:.2f} ({correct_count}/{total_eval})")
+    return format_feedback_report(total_eval, correct_count)
+
 
+def format_feedback_report(total_eval: int, correct_count: int) -> str:
+    """把滚动准确率格式化为 Prompt 中的反馈段落 (回放引擎共用)"""
     if total_eval == 0:
         return "过去24小时无有效预测记录。"
 
@@ -228,8 +148,6 @@ async def generate_feedback_report(coin_type: int) -> str:
         feedback_str += "\n⚠️ 警告：准确率偏低。请反思是否存在过度看多/看空的情绪，更加关注实际价格动能。"
     elif accuracy > 0.7:
         feedback_str += "\n🎉 表现优异：预测逻辑与市场走势高度吻合，请保持。"
-
-    print(f"📊 [FeedbackLoop] {symbol} Accuracy: {accuracy:.2f} ({correct_count}/{total_eval})")
     return feedback_str
 
 
@@ -242,6 +160,11 @@ async def fetch_latest_analysis_state_short(news_item: dict) -> str:
     target_id = news_item.get('objectId')
     news_time_str = news_item.get('time')
 
+    # 优先读本地副本 (本系统的回写会同步写入本地，无需再请求上游)
+    local_item = await news_store.get_item(target_id)
+    if local_item is not None:
+        return local_item.get('analysis') or ""
+
     try:
         if not news_time_str: return ""
         clean_str = news_time_str.replace("T", " ").replace("Z", "").split(".")[0]
@@ -257,21 +180,22 @@ async def fetch_latest_analysis_state_short(news_item: dict) -> str:
                 "startTime": start_t.strftime("%Y-%m-%dT%H:%M:%S"),
                 "endTime": end_t.strftime("%Y-%m-%dT%H:%M:%S")
             }
-            async with httpx.AsyncClient() as client:
-                resp = await client.post(FETCH_API_URL, headers=HEADERS, json=json_data, timeout=5.0)
-                if resp.status_code == 200:
-                    items = resp.json()
-                    target = next((x for x in items if x.get('objectId') == target_id), None)
-                    if target:
-                        print(f"🔄 [ShortTermAgent] Refetched latest state for ID: {target_id}")
-                        return target.get('analysis') or ""
+            client = get_http_client(FETCH_API_URL)
+            resp = await client.post(FETCH_API_URL, headers=HEADERS, json=json_data,
+                                     timeout=endpoint_timeout(FETCH_API_URL))
+            if resp.status_code == 200:
+                items = resp.json()
+                target = next((x for x in items if x.get('objectId') == target_id), None)
+                if target:
+                    print(f"🔄 [ShortTermAgent] Refetched latest state for ID: {target_id}")
+                    return target.get('analysis') or ""
     except Exception as e:
         print(f"⚠️ [ShortTermAgent] Failed to refetch latest state: {e}")
 
     return news_item.get('analysis') or ""
 
 
-async def write_short_term_signal(latest_news: dict, signal: TradingSignal):
+async def write_short_term_signal(latest_news: dict, signal: TradingSignal, coin_type: Optional[int] = None):
     if not latest_news: return
 
     obj_id = latest_news.get('objectId')
@@ -298,34 +222,128 @@ async def write_short_term_signal(latest_news: dict, signal: TradingSignal):
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(UPDATE_API_URL, json=payload, headers=HEADERS, timeout=10.0)
-            if response.status_code == 200:
-                print(f"✅ [ShortTermAgent] 1H Signal JSON APPENDED for ID: {obj_id}")
-            else:
-                print(f"❌ [ShortTermAgent] Save Failed: {response.status_code}")
+        # 交给发件箱异步回写；本地副本立即更新，下一次追加读到的就是最新 analysis
+        await update_outbox.enqueue(payload)
+        print(f"✅ [ShortTermAgent] 1H Signal JSON APPENDED for ID: {obj_id}")
+        # 登记到预测账本，目标 K 线收盘后自动结算
+        await prediction_ledger.record_from_analysis(obj_id, "1h", new_analysis_json_str, coin_type)
     except Exception as e:
         print(f"❌ [ShortTermAgent] Error: {e}")
 
 
 async def fetch_news_window(coin_type: int, start_time: datetime, end_time: datetime) -> list:
-    json_data = {
-        "type": coin_type,
-        "startTime": start_time.strftime("%Y-%m-%dT%H:%M:%S"),
-        "endTime": end_time.strftime("%Y-%m-%dT%H:%M:%S")
-    }
-
+    """从本地新闻副本做范围查询 (start/end 为 UTC)"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(FETCH_API_URL, headers=HEADERS, json=json_data, timeout=15.0)
-            if response.status_code == 200:
-                return response.json()
-            return []
+        return await news_store.query_range(coin_type, start_time, end_time)
     except Exception as e:
         print(f"❌ [ShortTermAgent] Fetch Error: {e}")
         return []
 
 
+def pick_anchor_news(items: list) -> Optional[dict]:
+    """已打标签 (Tag 1/2/3) 的新闻中时间最新的一条，作为本轮分析的锚点"""
+    valid_candidates = []
+    for item in items:
+        tag = item.get('newsTag')
+        if tag and int(tag) in [1, 2, 3]:
+            valid_candidates.append(item)
+    if not valid_candidates:
+        return None
+    valid_candidates.sort(key=lambda x: str(x.get('time', '0')), reverse=True)
+    return valid_candidates[0]
+
+
+def build_market_context(candles_15m, now_utc: datetime, news_time_utc: datetime) -> str:
+    """由 15m K线 (结构化数组) 和新闻滞后时间构建市场上下文"""
+    # 计算分钟差 (防止负数)
+    lag_seconds = (now_utc - news_time_utc).total_seconds()
+    lag_minutes = int(lag_seconds / 60)
+    if lag_minutes < 0: lag_minutes = 0
+
+    if len(candles_15m) < 2:
+        return f"当前市场价格数据不可用 (新闻滞后: {lag_minutes}m)。"
+
+    ind = compute_indicators({"BTCUSDT": candles_15m})["BTCUSDT"]
+    close_p = ind["close"]
+    pct_change = ind["last_change_pct"]
+
+    # 显式告诉 LLM 这个时间差
+    time_sync_info = (
+        f"⚠️【时间同步警报】\n"
+        f"- 当前系统时间: {now_utc.strftime('%H:%M')} (UTC)\n"
+        f"- 最新新闻时间: {news_time_utc.strftime('%H:%M')} (UTC)\n"
+        f"- **新闻滞后时长 (Time Lag)**: {lag_minutes} 分钟\n"
+        f"- 下方 K 线数据为: **实时最新数据** (包含了这 {lag_minutes} 分钟内的市场反应)\n"
+        f"-----------------------------\n"
+    )
+
+    vol_status = "放量" if ind["volume_ratio"] is not None and ind["volume_ratio"] > 1 else "缩量"
+
+    market_context = (
+        f"{time_sync_info}"
+        f"1. 价格走势: {'📈' if pct_change > 0 else '📉'} {pct_change:.2f}% (现价: {close_p})\n"
+        f"2. 成交量态势: 较上一根15mK线呈现【{vol_status}】状态。\n"
+        f"3. 趋势强度: 只有在高波动(>0.3%)配合放量时，信号才有效，否则视为噪音。"
+    )
+    # 技术指标 (数据不足时跳过对应项)
+    extra = []
+    if ind["rsi"] is not None:
+        extra.append(f"RSI(15m): {ind['rsi']:.1f}")
+    if ind["ema_fast"] is not None and ind["ema_slow"] is not None:
+        extra.append(f"EMA12 {'>' if ind['ema_fast'] > ind['ema_slow'] else '<'} EMA26")
+    if ind["atr_pct"] is not None:
+        extra.append(f"ATR(15m): {ind['atr_pct']:.2f}%")
+    if ind["volatility_pct"] is not None:
+        extra.append(f"15m 波动率: {ind['volatility_pct']:.2f}%")
+    if ind["vwap_dev_pct"] is not None:
+        extra.append(f"偏离 VWAP: {ind['vwap_dev_pct']:+.2f}%")
+    if ind["volume_z"] is not None:
+        extra.append(f"成交量 z-score: {ind['volume_z']:+.1f}")
+    if extra:
+        market_context += f"\n4. 技术指标 (最近 {len(candles_15m)} 根 15m K线): " + " | ".join(extra)
+    return market_context
+
+
+def format_news_timeline(context_items: list, anchor_time: datetime) -> str:
+    """锚点前 75 分钟内的有效新闻，按时间倒序格式化为 [Xm ago] [TAG] 内容"""
+    final_news_list = [x for x in context_items if x.get('newsTag') and int(x.get('newsTag')) in [1, 2, 3]]
+    final_news_list.sort(key=lambda x: str(x.get('time', '0')), reverse=True)
+
+    formatted_lines = []
+    tag_map = {1: "BULLISH", 2: "NEUTRAL", 3: "BEARISH", 4: "NOISE"}
+
+    # 【优化】计算精确到分钟的时间差
+    base_time = anchor_time
+
+    for item in final_news_list[:25]:
+        tag_val = int(item.get('newsTag', 0))
+        tag_str = tag_map.get(tag_val, "UNKNOWN")
+        content = item.get('summary') or item.get('title')
+
+        # 计算分钟差
+        item_time = parse_news_time(item.get('time'))
+        time_diff = base_time - item_time
+        minutes_ago = int(time_diff.total_seconds() / 60)
+        if minutes_ago < 0: minutes_ago = 0  # 修正未来时间数据异常
+
+        time_str = f"{minutes_ago}m ago"
+
+        formatted_lines.append(f"- [{time_str}] [{tag_str}] {content}")
+
+    return "\n".join(formatted_lines)
+
+
+def build_short_term_inputs(anchor_news: dict, context_items: list, candles_15m,
+                            feedback_report: str, now_utc: datetime) -> dict:
+    """组装短线 Prompt 的输入 (线上运行与回放引擎共用，保证两者逻辑一致)"""
+    anchor_time = parse_news_time(anchor_news.get('time'))
+    return {
+        "news_data": format_news_timeline(context_items, anchor_time),
+        "feedback_context": feedback_report,
+        "market_context": build_market_context(candles_15m, now_utc, anchor_time),
+    }
+
+
 async def run_short_term_analysis():
     print(f"[{time.ctime()}] ⚡ Running Short-Term (1H) Agent...")
 
@@ -336,20 +354,13 @@ async def run_short_term_analysis():
 
         btc_raw = await fetch_news_window(1, search_start, search_end)
         eth_raw = await fetch_news_window(2, search_start, search_end)
-        raw_all = btc_raw + eth_raw
+        latest_valid_news = pick_anchor_news(btc_raw + eth_raw)
 
-        valid_candidates = []
-        for item in raw_all:
-            tag = item.get('newsTag')
-            if tag and int(tag) in [1, 2, 3]:
-                valid_candidates.append(item)
-
-        if not valid_candidates:
+        if latest_valid_news is None:
             print("⚠️ [ShortTermAgent] No valid news found in last 12h.")
             return
-
-        valid_candidates.sort(key=lambda x: str(x.get('time', '0')), reverse=True)
-        latest_valid_news = valid_candidates[0]
+        # 锚点所属币种 (预测按该币种的 K 线结算)
+        anchor_coin = 1 if any(x is latest_valid_news for x in btc_raw) else 2
 
         # 2. 防重复/更新检查
         current_analysis = latest_valid_news.get('analysis') or ""
@@ -362,49 +373,8 @@ async def run_short_term_analysis():
         # =======================================================
         feedback_report = await generate_feedback_report(1)
 
-        # 获取 15m K线 (limit=3)
-        klines_15m = await fetch_binance_klines("BTCUSDT", "15m", limit=3)
-
-        # 1. 计算时间滞后 (Time Lag)
-        now_utc = datetime.now(timezone.utc)
-        news_time_utc = parse_news_time(latest_valid_news.get('time'))
-
-        # 计算分钟差 (防止负数)
-        lag_seconds = (now_utc - news_time_utc).total_seconds()
-        lag_minutes = int(lag_seconds / 60)
-        if lag_minutes < 0: lag_minutes = 0
-
-        # 2. 构建包含时间差的市场上下文
-        market_context = "数据不可用"
-        if klines_15m:
-            current_k = klines_15m[-1]
-            prev_k = klines_15m[-2]
-            open_p = float(current_k[1])
-            close_p = float(current_k[4])
-            pct_change = ((close_p - open_p) / open_p) * 100
-
-            # 显式告诉 LLM 这个时间差
-            time_sync_info = (
-                f"⚠️【时间同步警报】\n"
-                f"- 当前系统时间: {now_utc.strftime('%H:%M')} (UTC)\n"
-                f"- 最新新闻时间: {news_time_utc.strftime('%H:%M')} (UTC)\n"
-                f"- **新闻滞后时长 (Time Lag)**: {lag_minutes} 分钟\n"
-                f"- 下方 K 线数据为: **实时最新数据** (包含了这 {lag_minutes} 分钟内的市场反应)\n"
-                f"-----------------------------\n"
-            )
-
-            curr_vol = float(current_k[5])
-            prev_vol = float(prev_k[5])
-            vol_status = "放量" if curr_vol > prev_vol else "缩量"
-
-            market_context = (
-                f"{time_sync_info}"
-                f"1. 价格走势: {'📈' if pct_change > 0 else '📉'} {pct_change:.2f}% (现价: {close_p})\n"
-                f"2. 成交量态势: 较上一根15mK线呈现【{vol_status}】状态。\n"
-                f"3. 趋势强度: 只有在高波动(>0.3%)配合放量时，信号才有效，否则视为噪音。"
-            )
-        else:
-            market_context = f"当前市场价格数据不可用 (新闻滞后: {lag_minutes}m)。"
+        # 15m K线：与预测账本的结算共用 K 线存储中的同一序列
+        candles_15m = await candle_store.get("BTCUSDT", "15m", 100)
 
         # 4. 时间锚定
         anchor_time = parse_news_time(latest_valid_news.get('time'))
@@ -415,46 +385,28 @@ async def run_short_term_analysis():
 
         btc_context = await fetch_news_window(1, analysis_window_start, anchor_time)
         eth_context = await fetch_news_window(2, analysis_window_start, anchor_time)
-        context_all = btc_context + eth_context
-
-        final_news_list = [x for x in context_all if x.get('newsTag') and int(x.get('newsTag')) in [1, 2, 3]]
-        final_news_list.sort(key=lambda x: str(x.get('time', '0')), reverse=True)
-
-        formatted_lines = []
-        tag_map = {1: "BULLISH", 2: "NEUTRAL", 3: "BEARISH", 4: "NOISE"}
-
-        # 【优化】计算精确到分钟的时间差
-        base_time = anchor_time
-
-        for item in final_news_list[:25]:
-            tag_val = int(item.get('newsTag', 0))
-            tag_str = tag_map.get(tag_val, "UNKNOWN")
-            content = item.get('summary') or item.get('title')
-
-            # 计算分钟差
-            item_time = parse_news_time(item.get('time'))
-            time_diff = base_time - item_time
-            minutes_ago = int(time_diff.total_seconds() / 60)
-            if minutes_ago < 0: minutes_ago = 0  # 修正未来时间数据异常
-
-            time_str = f"{minutes_ago}m ago"
-
-            formatted_lines.append(f"- [{time_str}] [{tag_str}] {content}")
 
-        news_data_str = "\n".join(formatted_lines)
+        llm_inputs = build_short_term_inputs(latest_valid_news, btc_context + eth_context, candles_15m,
+                                             feedback_report, datetime.now(timezone.utc))
 
         # 5. LLM 分析
         print(f"🤖 [ShortTermAgent] Analyzing with Feedback & Price Action...")
-        signal: TradingSignal = await short_term_chain.ainvoke({
-            "news_data": news_data_str,
-            "feedback_context": feedback_report,
-            "market_context": market_context
-        })
+        # 输入完全相同 (例如调度重跑) 时直接复用上一轮的结论
+        signal: TradingSignal = await llm_cache.cached_ainvoke(
+            short_term_chain, llm_inputs,
+            model=llm.model_name,
+            prompt_version=SHORT_TERM_PROMPT_VERSION,
+            cache_text=json.dumps(llm_inputs, ensure_ascii=False, sort_keys=True),
+            schema=TradingSignal,
+            ttl_seconds=SIGNAL_CACHE_TTL,
+        )
+        # 缓存命中时返回的是上一轮的结论，时间戳改为本次预测的时间
+        signal.timestamp = time.time()
 
         print(f"⚡ [ShortTermResult] {signal.trend_24h} (Conf: {signal.confidence})")
 
         # 6. 写回
-        await write_short_term_signal(latest_valid_news, signal)
+        await write_short_term_signal(latest_valid_news, signal, anchor_coin)
 
     except Exception as e:
         print(f"❌ [ShortTermAgent] Error: {e}")
@@ -1,9 +1,10 @@
 # src/agents/large_agents/trend_agent.py
+import asyncio
 import time
-import httpx
 import json
 import statistics
 from datetime import datetime, timedelta
+from typing import Optional
 
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
@@ -11,13 +12,22 @@ from config.settings import settings
 from src.schemas.data_models import TradingSignal
 # 【新增】引入 JSON 助手
 from src.utils.json_helper import append_signal_to_structure
+from src.core.llm_cache import llm_cache
+from src.core.http_client import get_http_client, endpoint_timeout
+from src.core import news_store
+from src.core.update_outbox import update_outbox
+from src.core.candle_store import candle_store
+from src.utils.indicators import compute_indicators
+from src.core.prediction_ledger import prediction_ledger
 
 # --- 配置 ---
-FETCH_API_URL = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto/fetchCryptoPanic"
-UPDATE_API_URL = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto/updatePanicNews"
+FETCH_API_URL = f"{settings.DATACENTER_BASE_URL}/fetchCryptoPanic"
 # 币安公共接口 (无需鉴权，用于获取辅助K线数据)
 BINANCE_KLINE_URL = "https://api.binance.com/api/v3/klines"
 HEADERS = {'Content-Type': 'application/json'}
+# LLM 缓存：提示词版本 (修改提示词时提升) 与信号缓存时长 (秒)，信号时效性强，只短期复用
+TREND_PROMPT_VERSION = "trend-v1"
+SIGNAL_CACHE_TTL = 900
 
 llm = ChatOpenAI(
     api_key=settings.OPENAI_API_KEY,
@@ -95,111 +105,55 @@ def parse_news_time(time_str: str) -> datetime:
         return datetime.utcnow()
 
 
-# --- 技术指标计算模块 ---
-def calculate_rsi(prices, period=14):
-    """计算 RSI 指标"""
-    if len(prices) < period + 1:
-        return 50.0
-
-    deltas = [prices[i + 1] - prices[i] for i in range(len(prices) - 1)]
-    gains = [d if d > 0 else 0 for d in deltas]
-    losses = [-d if d < 0 else 0 for d in deltas]
-
-    avg_gain = sum(gains[:period]) / period
-    avg_loss = sum(losses[:period]) / period
+def format_market_report(candles_by_symbol: dict) -> str:
+    """由各币种最近 25 根 1h K线生成盘面报告 (两个币种的指标一次向量化计算)"""
+    indicators = compute_indicators(candles_by_symbol)
+    report = []
 
-    for i in range(period, len(prices) - 1):
-        avg_gain = (avg_gain * (period - 1) + gains[i]) / period
-        avg_loss = (avg_loss * (period - 1) + losses[i]) / period
+    for symbol in candles_by_symbol:
+        ind = indicators[symbol]
+        if not ind:
+            continue
+
+        rsi_val = ind["rsi"]
+        rsi_status = "Neutral"
+        if rsi_val > 70:
+            rsi_status = "Overbought"
+        elif rsi_val < 30:
+            rsi_status = "Oversold"
+
+        line = (
+            f"- **{symbol}**: ${ind['close']:,.2f} | "
+            f"24h Change: {ind['change_pct']:+.2f}% | "
+            f"RSI(1h): {rsi_val:.1f} ({rsi_status})"
+        )
+        if ind["ema_fast"] is not None:
+            line += f" | vs EMA12: {(ind['close'] / ind['ema_fast'] - 1) * 100:+.2f}%"
+        if ind["atr_pct"] is not None:
+            line += f" | ATR(1h): {ind['atr_pct']:.2f}%"
+        if ind["volatility_pct"] is not None:
+            line += f" | Volatility(1h): {ind['volatility_pct']:.2f}%"
+        if ind["vwap_dev_pct"] is not None:
+            line += f" | vs 24h VWAP: {ind['vwap_dev_pct']:+.2f}%"
+        if ind["volume_z"] is not None:
+            line += f" | Volume z-score: {ind['volume_z']:+.1f}"
+        report.append(line)
 
-    if avg_loss == 0:
-        return 100.0
+    if not report:
+        return "Market data unavailable (using news only)."
 
-    rs = avg_gain / avg_loss
-    return 100 - (100 / (1 + rs))
+    return "\n".join(report)
 
 
 async def fetch_market_data() -> str:
     """
-    [使用 Taapi.io] 获取 BTC/ETH 实时价格与技术形态
-    文档参考: https://taapi.io/indicators/candles/
+    获取 BTC/ETH 实时价格与技术形态 (1h K线，来自共享 K 线存储：币安优先，失败时回退 Taapi)
     """
-    # Taapi 需要带斜杠的 symbol 格式 (如 BTC/USDT)
-    symbols = ["BTC/USDT", "ETH/USDT"]
-    report = []
-
-    # 请确保你在 settings 中配置了 TAAPI_API_KEY
-    # 或者直接写死: api_key = "你的_taapi_secret_key"
-    api_key = settings.TAAPI_API_KEY
-    base_url = "https://api.taapi.io/candles"
-
-    async with httpx.AsyncClient() as client:
-        for symbol in symbols:
-            try:
-                # 构造请求参数
-                params = {
-                    "secret": api_key,
-                    "exchange": "binance",  # 指定交易所
-                    "symbol": symbol,
-                    "interval": "1h",  # 1小时 K线
-                    "results": 25  # 获取最近 25 根 (Taapi limit max=300)
-                }
-
-                # 发送 GET 请求
-                resp = await client.get(base_url, params=params, timeout=10.0)
-
-                if resp.status_code != 200:
-                    print(f"⚠️ [TrendAgent] Taapi Error {symbol}: {resp.text}")
-                    continue
-
-                # Taapi 返回格式: [{"timestamp": 161..., "open": 30000, "close": 30100, ...}, ...]
-                # 数据通常是按时间倒序或正序，Taapi 返回通常是时间正序 (旧->新)，但在 results 参数下可能相反
-                # 根据文档，results 返回的是"historical values"，通常最新的在最后。
-                # 我们可以通过 sort 确保一下顺序
-                klines_data = resp.json()
-
-                if not isinstance(klines_data, list):
-                    continue
-
-                # 按时间戳排序：旧 -> 新
-                klines_data.sort(key=lambda x: x['timestamp'])
-
-                if not klines_data: continue
-
-                # 提取 Close Price 列表用于计算 RSI
-                close_prices = [float(k['close']) for k in klines_data]
-
-                current_price = close_prices[-1]
-                # 获取 24小时前的价格 (索引 -24 或者 0，取决于由多少数据)
-                # 假设拿到了 25 根，第 0 根就是 24小时前
-                open_price_24h = close_prices[0]
-
-                price_change_pct = ((current_price - open_price_24h) / open_price_24h) * 100
-
-                # 复用你原有的 calculate_rsi 函数
-                rsi_val = calculate_rsi(close_prices)
-
-                rsi_status = "Neutral"
-                if rsi_val > 70:
-                    rsi_status = "Overbought"
-                elif rsi_val < 30:
-                    rsi_status = "Oversold"
-
-                display_symbol = symbol.replace("/", "")
-                report.append(
-                    f"- **{display_symbol} (Taapi)**: ${current_price:,.2f} | "
-                    f"24h Change: {price_change_pct:+.2f}% | "
-                    f"RSI(1h): {rsi_val:.1f} ({rsi_status})"
-                )
-
-            except Exception as e:
-                print(f"⚠️ [TrendAgent] Fetch failed for {symbol}: {e}")
-                continue
+    symbols = ["BTCUSDT", "ETHUSDT"]
 
-    if not report:
-        return "Market data unavailable (using news only)."
-
-    return "\n".join(report)
+    # 最近 25 根 1h K线 (第 0 根就是 24 小时前)，两个币种并发读取
+    results = await asyncio.gather(*(candle_store.get(symbol, "1h", 25) for symbol in symbols))
+    return format_market_report(dict(zip(symbols, results)))
 
 
 # --- 修改后的 write_signal_back_to_api ---
@@ -212,6 +166,11 @@ async def fetch_latest_analysis_state(news_item: dict) -> str:
     target_id = news_item.get('objectId')
     news_time_str = news_item.get('time')
 
+    # 优先读本地副本 (本系统的回写会同步写入本地，无需再请求上游)
+    local_item = await news_store.get_item(target_id)
+    if local_item is not None:
+        return local_item.get('analysis') or ""
+
     # 构造一个极小的时间窗口 (前后1分钟) 来快速定位数据
     try:
         if not news_time_str: return ""
@@ -230,16 +189,17 @@ async def fetch_latest_analysis_state(news_item: dict) -> str:
                 "startTime": start_t.strftime("%Y-%m-%dT%H:%M:%S"),
                 "endTime": end_t.strftime("%Y-%m-%dT%H:%M:%S")
             }
-            async with httpx.AsyncClient() as client:
-                resp = await client.post(FETCH_API_URL, headers=HEADERS, json=json_data, timeout=5.0)
-                if resp.status_code == 200:
-                    items = resp.json()
-                    # 寻找匹配 ID 的项
-                    target = next((x for x in items if x.get('objectId') == target_id), None)
-                    if target:
-                        # 找到了！返回数据库里最新的 analysis
-                        print(f"🔄 [TrendAgent] Refetched latest state for ID: {target_id}")
-                        return target.get('analysis') or ""
+            client = get_http_client(FETCH_API_URL)
+            resp = await client.post(FETCH_API_URL, headers=HEADERS, json=json_data,
+                                     timeout=endpoint_timeout(FETCH_API_URL))
+            if resp.status_code == 200:
+                items = resp.json()
+                # 寻找匹配 ID 的项
+                target = next((x for x in items if x.get('objectId') == target_id), None)
+                if target:
+                    # 找到了！返回数据库里最新的 analysis
+                    print(f"🔄 [TrendAgent] Refetched latest state for ID: {target_id}")
+                    return target.get('analysis') or ""
     except Exception as e:
         print(f"⚠️ [TrendAgent] Failed to refetch latest state: {e}")
 
@@ -247,7 +207,7 @@ async def fetch_latest_analysis_state(news_item: dict) -> str:
     return news_item.get('analysis') or ""
 
 
-async def write_signal_back_to_api(latest_news: dict, signal: TradingSignal):
+async def write_signal_back_to_api(latest_news: dict, signal: TradingSignal, coin_type: Optional[int] = None):
     if not latest_news: return
 
     obj_id = latest_news.get('objectId')
@@ -279,30 +239,85 @@ async def write_signal_back_to_api(latest_news: dict, signal: TradingSignal):
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            await client.post(UPDATE_API_URL, json=payload, headers=HEADERS, timeout=10.0)
-            print(f"✅ [TrendAgent] Signal JSON APPENDED (ID: {obj_id}) | Trend: {trend_int}")
+        # 交给发件箱异步回写；本地副本立即更新，下一次追加读到的就是最新 analysis
+        await update_outbox.enqueue(payload)
+        print(f"✅ [TrendAgent] Signal JSON APPENDED (ID: {obj_id}) | Trend: {trend_int}")
+        await prediction_ledger.record_from_analysis(obj_id, "24h", new_analysis_json_str, coin_type)
     except Exception as e:
         print(f"❌ [TrendAgent] Save Request Error: {e}")
 
 
 async def fetch_news_window(coin_type: int, start_time: datetime, end_time: datetime) -> list:
-    json_data = {
-        "type": coin_type,
-        "startTime": start_time.strftime("%Y-%m-%dT%H:%M:%S"),
-        "endTime": end_time.strftime("%Y-%m-%dT%H:%M:%S")
-    }
+    """从本地新闻副本做范围查询 (start/end 为 UTC)"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(FETCH_API_URL, headers=HEADERS, json=json_data, timeout=20.0)
-            if response.status_code == 200:
-                return response.json()
-            return []
+        return await news_store.query_range(coin_type, start_time, end_time)
     except Exception as e:
         print(f"❌ [TrendAgent] Fetch Exception: {e}")
         return []
 
 
+def pick_anchor_news(items: list) -> Optional[dict]:
+    """有效新闻 (Tag 1/2/3) 中时间最新的一条，作为本轮分析的锚点"""
+    valid_candidates = [x for x in items if int(x.get('newsTag') or 0) in [1, 2, 3]]
+    if not valid_candidates:
+        return None
+    valid_candidates.sort(key=lambda x: str(x.get('time', '0')), reverse=True)
+    return valid_candidates[0]
+
+
+def format_trend_timeline(context_items: list, anchor_time: datetime) -> str:
+    """锚点前 24 小时内的有效新闻，按时间倒序格式化为 [X.Xh ago] [TAG] 内容"""
+    final_list = [x for x in context_items if int(x.get('newsTag') or 0) in [1, 2, 3]]
+    final_list.sort(key=lambda x: str(x.get('time', '0')), reverse=True)
+
+    formatted_lines = []
+    tag_map = {1: "BULLISH", 2: "NEUTRAL", 3: "BEARISH"}
+    base_time = anchor_time
+
+    for item in final_list[:50]:
+        tag_val = int(item.get('newsTag', 0))
+        tag_str = tag_map.get(tag_val, "UNKNOWN")
+        content = item.get('summary') or item.get('title')
+
+        # 计算准确的时间差
+        item_time = parse_news_time(item.get('time'))
+        time_diff = base_time - item_time
+        hours_ago = time_diff.total_seconds() / 3600
+
+        # 格式化: 显式标记时间，方便 LLM 识别 "Shock Phase"
+        time_label = f"{hours_ago:.1f}h ago"
+        formatted_lines.append(f"- [{time_label}] [{tag_str}] {content}")
+
+    return "\n".join(formatted_lines)
+
+
+def build_trend_inputs(anchor_news: dict, context_items: list, market_report: str,
+                       now_utc: datetime) -> Optional[dict]:
+    """
+    组装趋势 Prompt 的输入 (线上运行与回放引擎共用)。now_utc 为不带时区的 UTC 时间；
+    窗口内没有可用新闻时返回 None。
+    """
+    anchor_time = parse_news_time(anchor_news.get('time'))
+    news_data_str = format_trend_timeline(context_items, anchor_time)
+    if not news_data_str:
+        return None
+
+    # 计算针对最新一条新闻的滞后时间
+    lag_minutes = int((now_utc - anchor_time).total_seconds() / 60)
+
+    # 注入时间差信息
+    time_context_str = (
+        f"【时间同步状态】\n"
+        f"- 最新一条宏观新闻距今已过去: **{lag_minutes} 分钟**。\n"
+        f"- 请基于此滞后时间判断当前 K 线形态是否已经完成了对该新闻的定价 (Priced-in)。\n\n"
+    )
+
+    return {
+        "market_context": time_context_str + market_report,
+        "news_data": news_data_str
+    }
+
+
 async def run_trend_analysis():
     print(f"[{time.ctime()}] 🩺 Running Trend Agent (Optimized)...")
 
@@ -313,17 +328,13 @@ async def run_trend_analysis():
 
         btc_raw = await fetch_news_window(1, search_start, search_end)
         eth_raw = await fetch_news_window(2, search_start, search_end)
-        raw_all = btc_raw + eth_raw
-
-        # 过滤有效新闻
-        valid_candidates = [x for x in raw_all if int(x.get('newsTag') or 0) in [1, 2, 3]]
+        latest_valid_news = pick_anchor_news(btc_raw + eth_raw)
 
-        if not valid_candidates:
+        if latest_valid_news is None:
             print("⚠️ [TrendAgent] No valid news found.")
             return
-
-        valid_candidates.sort(key=lambda x: str(x.get('time', '0')), reverse=True)
-        latest_valid_news = valid_candidates[0]
+        # 锚点所属币种 (预测按该币种的 K 线结算)
+        anchor_coin = 1 if any(x is latest_valid_news for x in btc_raw) else 2
 
         # 2. 状态检查 (检查 JSON 中是否已有 trend_signals)
         current_analysis = latest_valid_news.get('analysis') or ""
@@ -341,62 +352,33 @@ async def run_trend_analysis():
         # 重新拉取锚定窗口数据
         btc_context = await fetch_news_window(1, analysis_window_start, anchor_time)
         eth_context = await fetch_news_window(2, analysis_window_start, anchor_time)
-        context_all = btc_context + eth_context
-
-        final_list = [x for x in context_all if int(x.get('newsTag') or 0) in [1, 2, 3]]
-        final_list.sort(key=lambda x: str(x.get('time', '0')), reverse=True)
-
-        # 4. 准备新闻数据
-        formatted_lines = []
-        tag_map = {1: "BULLISH", 2: "NEUTRAL", 3: "BEARISH"}
-        base_time = anchor_time
 
-        for item in final_list[:50]:
-            tag_val = int(item.get('newsTag', 0))
-            tag_str = tag_map.get(tag_val, "UNKNOWN")
-            content = item.get('summary') or item.get('title')
-
-            # 计算准确的时间差
-            item_time = parse_news_time(item.get('time'))
-            time_diff = base_time - item_time
-            hours_ago = time_diff.total_seconds() / 3600
-
-            # 格式化: 显式标记时间，方便 LLM 识别 "Shock Phase"
-            time_label = f"{hours_ago:.1f}h ago"
-            formatted_lines.append(f"- [{time_label}] [{tag_str}] {content}")
-
-        if not formatted_lines:
-            return
-
-        news_data_str = "\n".join(formatted_lines)
-
-        # 5. 获取辅助盘面数据
+        # 4. 获取辅助盘面数据
         print("📈 [TrendAgent] Fetching Market Context for Verification...")
         base_market_str = await fetch_market_data()
 
-        # 计算针对最新一条新闻的滞后时间
-        now_utc = datetime.utcnow()
-        latest_news_time = parse_news_time(latest_valid_news.get('time'))
-        lag_minutes = int((now_utc - latest_news_time).total_seconds() / 60)
-
-        # 注入时间差信息
-        time_context_str = (
-            f"【时间同步状态】\n"
-            f"- 最新一条宏观新闻距今已过去: **{lag_minutes} 分钟**。\n"
-            f"- 请基于此滞后时间判断当前 K 线形态是否已经完成了对该新闻的定价 (Priced-in)。\n\n"
-        )
-
-        final_market_context = time_context_str + base_market_str
+        # 5. 准备新闻数据与时间同步信息
+        llm_inputs = build_trend_inputs(latest_valid_news, btc_context + eth_context, base_market_str,
+                                        datetime.utcnow())
+        if llm_inputs is None:
+            return
 
         # 6. LLM 分析
         print("🤖 [TrendAgent] Asking LLM with Time-Decay Logic...")
-        signal: TradingSignal = await trend_agent_chain.ainvoke({
-            "market_context": final_market_context,
-            "news_data": news_data_str
-        })
+        # 输入完全相同 (例如调度重跑) 时直接复用上一轮的结论
+        signal: TradingSignal = await llm_cache.cached_ainvoke(
+            trend_agent_chain, llm_inputs,
+            model=llm.model_name,
+            prompt_version=TREND_PROMPT_VERSION,
+            cache_text=json.dumps(llm_inputs, ensure_ascii=False, sort_keys=True),
+            schema=TradingSignal,
+            ttl_seconds=SIGNAL_CACHE_TTL,
+        )
+        # 缓存命中时返回的是上一轮的结论，时间戳改为本次预测的时间
+        signal.timestamp = time.time()
 
         # 7. 写回结果
-        await write_signal_back_to_api(latest_valid_news, signal)
+        await write_signal_back_to_api(latest_valid_news, signal, anchor_coin)
 
     except Exception as e:
         print(f"❌ [TrendAgent] Critical Error: {e}")
\ No newline at end of file
@@ -0,0 +1,269 @@
+# src/agents/small_agents/browser_pool.py
+"""
+常驻的无头浏览器池 (基于 Crawl4AI)。
+
+原先每个 URL 都新开一个 AsyncWebCrawler (完整启动一次 Chromium)，启动开销远大于抓取本身。
+这里在应用启动时只启动一次浏览器，固定 CRAWLER_POOL_SIZE 个槽位，每个槽位对应一个
+Crawl4AI session (独立的页面)，在 Pipeline 的多次调用之间复用。
+
+- 页面导航次数达到 CRAWLER_PAGE_MAX_NAVIGATIONS 后关闭重开 (回收泄漏的 DOM / JS 堆)
+- 健康检查发现浏览器断开，或浏览器进程 (启动时新建的 driver 及其子进程) 总内存超过 CRAWLER_MEMORY_LIMIT_MB 时，整体重启
+- 重启时先收回所有槽位，等正在进行的抓取结束后再重启，不会打断进行中的请求
+"""
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig
+
+from config.settings import settings
+
+try:
+    import psutil
+except ImportError:  # psutil 缺失时不做内存检查
+    psutil = None
+
+# 统计页面耗时时保留的最近样本数
+LATENCY_SAMPLES = 200
+
+
+@dataclass
+class _PageSlot:
+    session_id: str
+    navigations: int = 0
+
+
+class BrowserPool:
+    def __init__(self, size: int, max_navigations: int, memory_limit_mb: int):
+        self.size = max(1, size)
+        self.max_navigations = max_navigations
+        self.memory_limit_mb = memory_limit_mb
+
+        self.browser_config = BrowserConfig(
+            headless=True,
+            verbose=False,
+            java_script_enabled=True,
+            text_mode=True
+        )
+        self._crawler: Optional[AsyncWebCrawler] = None
+        self._slots: Optional[asyncio.Queue] = None
+        self._start_lock = asyncio.Lock()
+        self._restart_lock = asyncio.Lock()
+        self._restarting = False
+        self._restart_tasks = set()
+        self._browser_pids = set()  # 启动浏览器时新建的子进程 (playwright driver)，内存统计只算这些进程树
+
+        # --- 统计 ---
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.in_use = 0
+        self.waiting = 0
+        self.navigations = 0
+        self.errors = 0
+        self.page_recycles = 0
+        self.restarts = 0
+        self.last_restart_reason = None
+        self.last_memory_mb = None
+
+    @property
+    def started(self) -> bool:
+        return self._crawler is not None
+
+    # ==========================================
+    # 启动 / 关闭
+    # ==========================================
+    async def start(self):
+        async with self._start_lock:
+            if self._crawler is not None:
+                return
+            before = self._child_pids()
+            crawler = AsyncWebCrawler(config=self.browser_config)
+            await crawler.start()
+            self._crawler = crawler
+            self._browser_pids = self._child_pids() - before
+            if self._slots is None:
+                self._slots = asyncio.Queue()
+                for i in range(self.size):
+                    self._slots.put_nowait(_PageSlot(session_id=f"pool-page-{i}"))
+            print(f"✅ [BrowserPool] 浏览器已启动，页面槽位: {self.size}")
+
+    async def close(self):
+        """关闭浏览器；先取消并等待尚未完成的后台重启，避免和半途的重启交错"""
+        current = asyncio.current_task()
+        tasks = [t for t in self._restart_tasks if t is not current]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._restarting = False
+        await self._close_crawler()
+
+    async def _close_crawler(self):
+        async with self._start_lock:
+            crawler, self._crawler = self._crawler, None
+            self._browser_pids = set()
+            if crawler is not None:
+                try:
+                    await crawler.close()
+                except Exception as e:
+                    print(f"⚠️ [BrowserPool] 关闭浏览器失败: {e}")
+
+    async def restart(self, reason: str):
+        """收回全部槽位 (等待进行中的抓取完成)，然后重启浏览器"""
+        async with self._restart_lock:
+            self._restarting = True
+            try:
+                print(f"♻️ [BrowserPool] 重启浏览器: {reason}")
+                slots = [await self._slots.get() for _ in range(self.size)]
+                try:
+                    await self._close_crawler()
+                    await self.start()
+                finally:
+                    for slot in slots:
+                        slot.navigations = 0
+                        self._slots.put_nowait(slot)
+                self.restarts += 1
+                self.last_restart_reason = reason
+            finally:
+                self._restarting = False
+
+    def _schedule_restart(self, reason: str):
+        if not self._restarting:
+            self._restarting = True
+            task = asyncio.create_task(self.restart(reason))
+            self._restart_tasks.add(task)
+            task.add_done_callback(self._restart_tasks.discard)
+
+    # ==========================================
+    # 抓取
+    # ==========================================
+    async def arun(self, url: str, config: CrawlerRunConfig):
+        """
+        在一个空闲页面上执行抓取，返回 Crawl4AI 的 CrawlResult。
+        池未启动时 (脱离 FastAPI 独立运行) 会自动启动。
+        """
+        if self._crawler is None:
+            await self.start()
+
+        self.waiting += 1
+        try:
+            slot: _PageSlot = await self._slots.get()
+        finally:
+            self.waiting -= 1
+
+        self.in_use += 1
+        start = time.perf_counter()
+        try:
+            result = await self._crawler.arun(url=url, config=config.clone(session_id=slot.session_id))
+            slot.navigations += 1
+            self.navigations += 1
+            if slot.navigations >= self.max_navigations:
+                await self._recycle_page(slot)
+            return result
+        except Exception:
+            self.errors += 1
+            # 页面可能已经损坏，关掉它，下次使用时会重新创建
+            await self._recycle_page(slot)
+            if not self.is_healthy():
+                # 浏览器已断开：不等下一轮健康检查，后台立即重启
+                self._schedule_restart("browser disconnected")
+            raise
+        finally:
+            self._latencies.append(time.perf_counter() - start)
+            self.in_use -= 1
+            self._slots.put_nowait(slot)
+
+    async def _recycle_page(self, slot: _PageSlot):
+        try:
+            await self._crawler.crawler_strategy.browser_manager.kill_session(slot.session_id)
+        except Exception as e:
+            print(f"⚠️ [BrowserPool] 回收页面失败 {slot.session_id}: {e}")
+        slot.navigations = 0
+        self.page_recycles += 1
+
+    # ==========================================
+    # 健康检查
+    # ==========================================
+    @staticmethod
+    def _child_pids() -> set:
+        if psutil is None:
+            return set()
+        try:
+            return {child.pid for child in psutil.Process().children()}
+        except Exception:
+            return set()
+
+    def memory_mb(self) -> Optional[float]:
+        """浏览器进程树 (playwright driver + chromium) 的总常驻内存；需要遍历进程树，由健康检查放到线程里调用"""
+        if psutil is None or not self._browser_pids:
+            return None
+        total = 0
+        for pid in self._browser_pids:
+            try:
+                root = psutil.Process(pid)
+                processes = [root] + root.children(recursive=True)
+            except Exception:
+                continue
+            for process in processes:
+                try:
+                    total += process.memory_info().rss
+                except Exception:
+                    continue
+        return round(total / 1024 / 1024, 1)
+
+    async def _check_memory(self):
+        memory = await asyncio.to_thread(self.memory_mb)
+        self.last_memory_mb = memory
+        if memory is not None and self.memory_limit_mb and memory > self.memory_limit_mb:
+            await self.restart(f"memory {memory}MB > {self.memory_limit_mb}MB")
+
+    def is_healthy(self) -> bool:
+        if self._crawler is None:
+            return False
+        try:
+            browser = self._crawler.crawler_strategy.browser_manager.browser
+        except Exception:
+            return False
+        # 持久化上下文模式下没有 browser 对象，视为正常
+        return browser is None or browser.is_connected()
+
+    async def run_health_checks(self):
+        """后台循环：浏览器断开或内存超限时重启 (由 main.py 的 lifespan 启动)"""
+        if psutil is None:
+            print(f"⚠️ [BrowserPool] 未安装 psutil，内存超过 {self.memory_limit_mb} MB 时的自动回收不会生效")
+        while True:
+            await asyncio.sleep(settings.CRAWLER_HEALTH_CHECK_INTERVAL)
+            try:
+                if self.started and not self.is_healthy():
+                    await self.restart("browser disconnected")
+                else:
+                    await self._check_memory()
+            except Exception as e:
+                print(f"⚠️ [BrowserPool] 健康检查失败: {e}")
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        return {
+            "started": self.started,
+            "healthy": self.is_healthy(),
+            "size": self.size,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "saturation": round(self.in_use / self.size, 3),
+            "navigations": self.navigations,
+            "errors": self.errors,
+            "page_recycles": self.page_recycles,
+            "restarts": self.restarts,
+            "last_restart_reason": self.last_restart_reason,
+            "memory_mb": self.last_memory_mb,
+            "avg_page_s": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p95_page_s": round(latencies[int(len(latencies) * 0.95) - 1], 3) if latencies else 0.0,
+        }
+
+
+browser_pool = BrowserPool(
+    size=settings.CRAWLER_POOL_SIZE,
+    max_navigations=settings.CRAWLER_PAGE_MAX_NAVIGATIONS,
+    memory_limit_mb=settings.CRAWLER_MEMORY_LIMIT_MB,
+)
@@ -0,0 +1,205 @@
+# src/agents/small_agents/crawl_cache.py
+"""
+爬虫结果的本地磁盘缓存 (按 URL)。
+
+重试、失败重跑、近重复条目和多条新闻指向同一链接时，不再重新下载和渲染页面。
+- 缓存的是清洗后的正文 (Markdown)，不是原始 HTML
+- 未过期 (CRAWL_CACHE_TTL_HOURS) 直接命中；过期但有 ETag / Last-Modified 的条目
+  发一次条件请求，304 则续期后命中
+- 目录总大小超过 CRAWL_CACHE_MAX_MB 时按最近访问时间 (mtime) 淘汰 (LRU)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from config.settings import settings
+from src.core.http_client import get_crawl_client
+
+REVALIDATE_TIMEOUT = 5.0
+REVALIDATE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+}
+
+
+def normalize_url(url: str) -> str:
+    """去掉首尾空白和 #fragment，主机名统一小写"""
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path or "/", parts.query, ""))
+
+
+def extract_validators(headers) -> Dict[str, str]:
+    """从响应头中取出用于条件请求的 ETag / Last-Modified"""
+    if not headers:
+        return {}
+    lowered = {str(k).lower(): v for k, v in dict(headers).items()}
+    validators = {}
+    if lowered.get("etag"):
+        validators["etag"] = lowered["etag"]
+    if lowered.get("last-modified"):
+        validators["last_modified"] = lowered["last-modified"]
+    return validators
+
+
+class CrawlCache:
+    def __init__(self, directory: str, ttl_seconds: float, max_bytes: int):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._total_bytes: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+        self.totals = {"hits": 0, "revalidated": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self.cycle = {"hits": 0, "revalidated": 0, "misses": 0}
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _count(self, field: str):
+        self.totals[field] += 1
+        if field in self.cycle:
+            self.cycle[field] += 1
+
+    # --- 同步的磁盘操作 (通过 asyncio.to_thread 调用，避免阻塞事件循环) ---
+    def _read(self, path: str) -> Optional[dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path: str, entry: dict) -> int:
+        """写入 (覆盖) 一条缓存，返回写入前后的文件大小差"""
+        os.makedirs(self.directory, exist_ok=True)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return os.path.getsize(path) - old_size
+
+    def _touch(self, path: str):
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def _scan_size(self) -> int:
+        if not os.path.isdir(self.directory):
+            return 0
+        return sum(e.stat().st_size for e in os.scandir(self.directory) if e.name.endswith(".json"))
+
+    def _evict_lru(self, target_bytes: int) -> Tuple[int, int]:
+        """按 mtime 从旧到新删除，直到总大小不超过 target_bytes。返回 (删除个数, 剩余大小)"""
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entries)
+        removed = 0
+        for e in entries:
+            if total <= target_bytes:
+                break
+            try:
+                size = e.stat().st_size
+                os.remove(e.path)
+                total -= size
+                removed += 1
+            except OSError:
+                continue
+        return removed, total
+
+    # --- 对外接口 ---
+    async def get(self, url: str) -> Optional[str]:
+        """
+        返回缓存的正文；未命中或过期且无法重新验证时返回 None。
+        """
+        path = self._path(url)
+        entry = await asyncio.to_thread(self._read, path)
+        if not entry or not entry.get("text"):
+            self._count("misses")
+            return None
+
+        age = time.time() - entry.get("fetched_at", 0)
+        if age < self.ttl_seconds:
+            await asyncio.to_thread(self._touch, path)
+            self._count("hits")
+            return entry["text"]
+
+        if await self._revalidate(url, entry):
+            entry["fetched_at"] = time.time()
+            delta = await asyncio.to_thread(self._write, path, entry)
+            if self._total_bytes is not None:
+                self._total_bytes += delta
+            self._count("revalidated")
+            return entry["text"]
+
+        self._count("misses")
+        return None
+
+    async def _revalidate(self, url: str, entry: dict) -> bool:
+        headers = dict(REVALIDATE_HEADERS)
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if len(headers) == len(REVALIDATE_HEADERS):
+            return False
+        try:
+            client = get_crawl_client()
+            response = await client.get(url, headers=headers, timeout=REVALIDATE_TIMEOUT, follow_redirects=True)
+            return response.status_code == 304
+        except Exception:
+            return False
+
+    async def put(self, url: str, text: str, validators: Dict[str, str] = None, tier: str = None):
+        if not text:
+            return
+        entry = {
+            "url": normalize_url(url),
+            "text": text,
+            "fetched_at": time.time(),
+            "tier": tier,
+            **(validators or {}),
+        }
+        async with self._lock:
+            try:
+                if self._total_bytes is None:
+                    self._total_bytes = await asyncio.to_thread(self._scan_size)
+                self._total_bytes += await asyncio.to_thread(self._write, self._path(url), entry)
+                self._count("stores")
+
+                if self._total_bytes > self.max_bytes:
+                    # 一次淘汰到上限的 90%，避免每次写入都触发扫描
+                    removed, self._total_bytes = await asyncio.to_thread(self._evict_lru, int(self.max_bytes * 0.9))
+                    self.totals["evictions"] += removed
+            except OSError as e:
+                print(f"⚠️ [CrawlCache] 写入失败: {e}")
+
+    def take_cycle_stats(self) -> dict:
+        """返回并清零本轮的命中统计 (由采集器在每轮结束时调用)"""
+        stats = dict(self.cycle)
+        lookups = sum(stats.values())
+        stats["hit_ratio"] = round((stats["hits"] + stats["revalidated"]) / lookups, 3) if lookups else 0.0
+        for key in self.cycle:
+            self.cycle[key] = 0
+        return stats
+
+    def stats(self) -> dict:
+        lookups = self.totals["hits"] + self.totals["revalidated"] + self.totals["misses"]
+        return {
+            **self.totals,
+            "hit_ratio": round((self.totals["hits"] + self.totals["revalidated"]) / lookups, 3) if lookups else 0.0,
+            "size_mb": round((self._total_bytes or 0) / 1024 / 1024, 2),
+            "max_mb": round(self.max_bytes / 1024 / 1024, 2),
+        }
+
+
+crawl_cache = CrawlCache(
+    directory=settings.CRAWL_CACHE_DIR,
+    ttl_seconds=settings.CRAWL_CACHE_TTL_HOURS * 3600,
+    max_bytes=settings.CRAWL_CACHE_MAX_MB * 1024 * 1024,
+)
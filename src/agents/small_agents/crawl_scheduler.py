@@ -0,0 +1,142 @@
+# src/agents/small_agents/crawl_scheduler.py
+"""
+按域名调度爬虫请求。
+
+- 每个域名一把信号量 (CRAWL_HOST_CONCURRENCY)，同一批新闻指向同一站点时不会同时压过去
+- 每个域名维护最近 CRAWL_HOST_WINDOW 次抓取的成功率和耗时
+- 最近失败率超过 CRAWL_SKIP_FAILURE_RATE 的域名 (通常是稳定拦截爬虫的站点) 直接跳过
+  CRAWL_SKIP_COOLDOWN 秒，期满后只放行一次探测 (探测期间其余请求仍跳过)：探测成功则清空样本恢复正常，
+  失败则重新进入冷却；被跳过的新闻直接用原始标题/描述进入分析
+- 失败率偏高但还没到跳过阈值的域名，浏览器层只重试一次
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from config.settings import settings
+from .crawler_agent import run_crawler_agent, domain_of
+
+# 失败率超过该值 (但未到跳过阈值) 时，浏览器层只尝试一次
+REDUCED_RETRY_FAILURE_RATE = 0.5
+DEFAULT_RETRIES = 3
+
+
+class _HostState:
+    def __init__(self, concurrency: int, window: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.results = deque(maxlen=window)  # (是否成功, 耗时秒)
+        self.in_flight = 0
+        self.skipped = 0
+        self.skip_until = 0.0
+        self.probing = False  # 冷却期满后的探测请求正在进行
+
+    def failure_rate(self) -> float:
+        if not self.results:
+            return 0.0
+        return sum(1 for ok, _ in self.results if not ok) / len(self.results)
+
+    def avg_latency(self) -> float:
+        if not self.results:
+            return 0.0
+        return sum(latency for _, latency in self.results) / len(self.results)
+
+
+class CrawlScheduler:
+    def __init__(self, host_concurrency: int, window: int, min_samples: int,
+                 skip_failure_rate: float, skip_cooldown: float):
+        self.host_concurrency = max(1, host_concurrency)
+        self.window = window
+        self.min_samples = min_samples
+        self.skip_failure_rate = skip_failure_rate
+        self.skip_cooldown = skip_cooldown
+        self._hosts: Dict[str, _HostState] = {}
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = _HostState(self.host_concurrency, self.window)
+            self._hosts[host] = state
+        return state
+
+    def should_skip(self, host: str) -> bool:
+        state = self._state(host)
+        now = time.time()
+        if state.probing or state.skip_until > now:
+            return True
+        if state.skip_until:
+            # 冷却期结束：只放行这一次探测，结果出来之前其余请求继续跳过
+            state.skip_until = 0.0
+            state.probing = True
+            return False
+        if len(state.results) >= self.min_samples and state.failure_rate() >= self.skip_failure_rate:
+            state.skip_until = now + self.skip_cooldown
+            print(f"⛔ [CrawlScheduler] {host} 最近失败率 {state.failure_rate():.0%}，"
+                  f"跳过 {int(self.skip_cooldown)}s")
+            return True
+        return False
+
+    async def crawl(self, url: str) -> Optional[str]:
+        """
+        调度一次抓取。域名处于跳过期时立即返回 None。
+        """
+        host = domain_of(url)
+        state = self._state(host)
+        if self.should_skip(host):
+            state.skipped += 1
+            print(f"⏭️ [CrawlScheduler] Skip {host} (blocked recently), use original metadata")
+            return None
+
+        probe = state.probing
+        retries = 1 if probe or state.failure_rate() >= REDUCED_RETRY_FAILURE_RATE else DEFAULT_RETRIES
+        async with state.semaphore:
+            state.in_flight += 1
+            start = time.perf_counter()
+            content = None
+            try:
+                content = await run_crawler_agent(url, max_retries=retries)
+                return content
+            finally:
+                state.in_flight -= 1
+                if probe:
+                    self._finish_probe(host, state, bool(content))
+                state.results.append((bool(content), time.perf_counter() - start))
+
+    def _finish_probe(self, host: str, state: _HostState, ok: bool):
+        state.probing = False
+        if ok:
+            # 探测成功：丢弃冷却前的失败样本，重新积累
+            state.results.clear()
+            print(f"✅ [CrawlScheduler] {host} 探测成功，恢复抓取")
+        else:
+            state.skip_until = time.time() + self.skip_cooldown
+            print(f"⛔ [CrawlScheduler] {host} 探测失败，继续跳过 {int(self.skip_cooldown)}s")
+
+    def stats(self) -> dict:
+        now = time.time()
+        hosts = sorted(self._hosts.items(), key=lambda kv: len(kv[1].results) + kv[1].skipped, reverse=True)[:50]
+        return {
+            "hosts_tracked": len(self._hosts),
+            "hosts_skipped": sum(1 for s in self._hosts.values() if s.skip_until > now),
+            "hosts": {
+                host: {
+                    "samples": len(state.results),
+                    "success_rate": round(1 - state.failure_rate(), 3),
+                    "avg_latency_s": round(state.avg_latency(), 3),
+                    "in_flight": state.in_flight,
+                    "skipped": state.skipped,
+                    "skip_remaining_s": max(0, int(state.skip_until - now)),
+                    "probing": state.probing,
+                }
+                for host, state in hosts
+            },
+        }
+
+
+crawl_scheduler = CrawlScheduler(
+    host_concurrency=settings.CRAWL_HOST_CONCURRENCY,
+    window=settings.CRAWL_HOST_WINDOW,
+    min_samples=settings.CRAWL_SKIP_MIN_SAMPLES,
+    skip_failure_rate=settings.CRAWL_SKIP_FAILURE_RATE,
+    skip_cooldown=settings.CRAWL_SKIP_COOLDOWN,
+)
@@ -1,6 +1,16 @@
 # src/agents/small_agents/crawler_agent.py
 import asyncio
-from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
+import re
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from bs4 import BeautifulSoup
+from crawl4ai import CrawlerRunConfig, CacheMode
+
+from src.core.http_client import get_crawl_client
+from .browser_pool import browser_pool
+from .crawl_cache import crawl_cache, extract_validators
 
 # 定义一组高优先级的正文选择器
 MAIN_CONTENT_SELECTORS = "article, main, .post-content, .entry-content, .article-body, #content"
@@ -14,22 +24,213 @@ EXCLUDED_SELECTORS = (
 )
 
 
-async def run_crawler_agent(url: str) -> str | None:
+# 抓取结果的最大长度 (与 NLP 输入长度保持一致)
+MAX_CONTENT_CHARS = 6000
+
+# ==========================================
+# ⚡ 第一层：静态抓取 (httpx + BeautifulSoup)
+# ==========================================
+STATIC_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9,zh-CN;q=0.8",
+}
+STATIC_TIMEOUT = 8.0
+# 超过该大小的页面不做静态解析 (通常是 SPA 打包产物或下载文件)
+STATIC_MAX_BYTES = 3 * 1024 * 1024
+# 静态提取的正文少于该长度时，认为需要浏览器渲染
+STATIC_MIN_TEXT_LENGTH = 300
+# 页面中出现这些特征说明需要执行 JS (或遇到了反爬验证页)
+JS_REQUIRED_MARKERS = (
+    "enable javascript", "please turn on javascript", "javascript is required",
+    "cf-browser-verification", "challenge-platform", "just a moment...",
+    'id="__next"></div>', 'id="root"></div>', 'id="app"></div>',
+)
+
+# 域名分层策略：静态层连续失败这么多次、且成功率低于阈值后，该域名直接走浏览器
+TIER_MIN_SAMPLES = 3
+TIER_STATIC_MIN_SUCCESS_RATE = 0.2
+# 已判定走浏览器的域名，每隔多少次请求重新探测一次静态层 (站点可能改版)
+TIER_REPROBE_EVERY = 20
+
+# 每个域名在各层的成功/失败次数: {domain: {"static_ok":..., "static_fail":..., "browser_ok":..., "browser_fail":..., "requests":...}}
+DOMAIN_TIER_STATS: Dict[str, Dict[str, int]] = {}
+
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+def domain_of(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _domain_stats(domain: str) -> Dict[str, int]:
+    return DOMAIN_TIER_STATS.setdefault(
+        domain, {"static_ok": 0, "static_fail": 0, "browser_ok": 0, "browser_fail": 0, "requests": 0})
+
+
+def choose_tier(domain: str) -> str:
+    """根据历史记录决定从哪一层开始抓取: static / browser"""
+    stats = _domain_stats(domain)
+    attempts = stats["static_ok"] + stats["static_fail"]
+    if attempts < TIER_MIN_SAMPLES:
+        return "static"
+    if stats["static_ok"] / attempts >= TIER_STATIC_MIN_SUCCESS_RATE:
+        return "static"
+    # 静态层基本不可用：直接走浏览器，但定期重新探测
+    return "static" if stats["requests"] % TIER_REPROBE_EVERY == 0 else "browser"
+
+
+def _element_to_text(element) -> str:
+    """把正文节点转换成接近 Markdown 的纯文本 (保留标题和段落换行)"""
+    lines = []
+    for node in element.find_all(["h1", "h2", "h3", "h4", "p", "li", "blockquote", "pre"]):
+        # 只取最内层的块，避免嵌套块 (例如 li 里的 p) 重复输出
+        if node.find(["p", "li", "blockquote", "pre"]):
+            continue
+        text = node.get_text(" ", strip=True)
+        if not text:
+            continue
+        if node.name in ("h1", "h2", "h3", "h4"):
+            lines.append(f"{'#' * int(node.name[1])} {text}")
+        elif node.name == "li":
+            lines.append(f"- {text}")
+        else:
+            lines.append(text)
+    if not lines:
+        return element.get_text("\n", strip=True)
+    return "\n\n".join(lines)
+
+
+def extract_main_text(html: str) -> str:
     """
-    使用 Crawl4AI 智能抓取网页核心内容，自动去除导航和弹窗噪音。
-    [新增] 增加 3 次重试机制
+    Readability 风格的正文提取：
+    1. 删除 EXCLUDED_SELECTORS 命中的噪音节点
+    2. 优先使用 MAIN_CONTENT_SELECTORS 中文本最多的节点
+    3. 都没有命中时，选段落文本最多的容器
+    """
+    soup = BeautifulSoup(html, "lxml")
+    for node in soup.select(EXCLUDED_SELECTORS):
+        node.decompose()
+
+    candidates = soup.select(MAIN_CONTENT_SELECTORS)
+    if not candidates:
+        scores = {}
+        for p in soup.find_all("p"):
+            parent = p.parent
+            if parent is not None:
+                scores[id(parent)] = (scores.get(id(parent), (0, parent))[0] + len(p.get_text(strip=True)), parent)
+        candidates = [max(scores.values(), key=lambda x: x[0])[1]] if scores else []
+    if not candidates:
+        candidates = [soup.body or soup]
+
+    best = max(candidates, key=lambda el: len(el.get_text(strip=True)))
+    text = _element_to_text(best)
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def _needs_js(html: str) -> bool:
+    lowered = html[:200000].lower()
+    return any(marker in lowered for marker in JS_REQUIRED_MARKERS)
+
+
+async def fetch_static(url: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    """
+    静态抓取 + 正文提取，返回 (正文, ETag/Last-Modified)。
+    正文过短、需要 JS 或请求失败时返回 None (交给浏览器层)。
+    """
+    try:
+        client = get_crawl_client()
+        async with client.stream("GET", url, headers=STATIC_HEADERS, timeout=STATIC_TIMEOUT,
+                                 follow_redirects=True) as response:
+            content_type = response.headers.get("content-type", "")
+            if response.status_code != 200 or "html" not in content_type:
+                return None
+            # 先看 Content-Length，缺失时边读边计数，超过上限立即放弃，不把整个响应缓存在内存里
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > STATIC_MAX_BYTES:
+                return None
+            chunks, size = [], 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > STATIC_MAX_BYTES:
+                    return None
+                chunks.append(chunk)
+            html = b"".join(chunks).decode(response.encoding or "utf-8", errors="replace")
+            validators = extract_validators(response.headers)
+    except Exception as e:
+        print(f"⚠️ [Crawler] Static fetch error ({url}): {e}")
+        return None
+
+    # 解析大页面是 CPU 密集的同步操作，放到线程里执行，不阻塞事件循环
+    text = await asyncio.to_thread(extract_main_text, html)
+    if len(text) < STATIC_MIN_TEXT_LENGTH:
+        return None
+    if len(text) < STATIC_MIN_TEXT_LENGTH * 3 and await asyncio.to_thread(_needs_js, html):
+        return None
+    return text, validators
+
+
+async def run_crawler_agent(url: str, max_retries: int = 3) -> str | None:
+    """
+    分层抓取网页核心内容：
+    1. 静态抓取 (httpx + 正文提取)，大多数服务端渲染的新闻页在这一层完成
+    2. 正文过短或需要 JS 时升级到 Crawl4AI 浏览器
+    每个域名记录各层的成功情况，静态层长期失败的域名直接从浏览器层开始。
+    成功的结果写入磁盘缓存 (crawl_cache)，由 Pipeline 的 crawler_node 在调用前查询。
     """
     if not url or not url.startswith("http"):
         return None
 
-    print(f"🕷️ [Crawler] Intelligent Fetching: {url}")
+    domain = domain_of(url)
+    stats = _domain_stats(domain)
+    tier = choose_tier(domain)
+    stats["requests"] += 1
 
-    browser_config = BrowserConfig(
-        headless=True,
-        verbose=False,
-        java_script_enabled=True,
-        text_mode=True
-    )
+    if tier == "static":
+        start = time.perf_counter()
+        fetched = await fetch_static(url)
+        if fetched:
+            text, validators = fetched
+            stats["static_ok"] += 1
+            print(f"⚡ [Crawler] Static OK: {url} | length {len(text)} | "
+                  f"{(time.perf_counter() - start) * 1000:.0f}ms")
+            text = text[:MAX_CONTENT_CHARS]
+            await crawl_cache.put(url, text, validators, tier="static")
+            return text
+        stats["static_fail"] += 1
+
+    content = await crawl_with_browser(url, max_retries)
+    stats["browser_ok" if content else "browser_fail"] += 1
+    if content:
+        # 浏览器层拿不到可靠的验证头，只按 TTL 过期
+        await crawl_cache.put(url, content, tier="browser")
+    return content
+
+
+def get_crawler_tier_stats() -> dict:
+    """各域名的分层统计 (按请求数排序，只返回前 50 个域名)"""
+    ranked = sorted(DOMAIN_TIER_STATS.items(), key=lambda kv: kv[1]["requests"], reverse=True)[:50]
+    totals = {"static_ok": 0, "static_fail": 0, "browser_ok": 0, "browser_fail": 0, "requests": 0}
+    for _, stats in DOMAIN_TIER_STATS.items():
+        for key in totals:
+            totals[key] += stats[key]
+    return {
+        "totals": totals,
+        "domains": {domain: {**stats, "tier": choose_tier(domain)} for domain, stats in ranked},
+    }
+
+
+# ==========================================
+# 🕷️ 第二层：浏览器渲染 (Crawl4AI)
+# ==========================================
+async def crawl_with_browser(url: str, max_retries: int = 3) -> str | None:
+    """
+    使用 Crawl4AI 智能抓取网页核心内容，自动去除导航和弹窗噪音。
+    [新增] 增加 3 次重试机制
+    """
+    print(f"🕷️ [Crawler] Intelligent Fetching: {url}")
 
     run_config = CrawlerRunConfig(
         cache_mode=CacheMode.BYPASS,
@@ -38,50 +239,43 @@ async def run_crawler_agent(url: str) -> str | None:
         word_count_threshold=10,
     )
 
-    # [新增] 重试循环
-    max_retries = 3
+    # [新增] 重试循环 (次数由调用方决定，经常失败的域名由调度器减少重试)
+    # 浏览器由全局 browser_pool 常驻复用，这里只占用一个页面槽位
+    for attempt in range(max_retries):
+        try:
+            result = await browser_pool.arun(url, run_config)
 
-    # 注意：我们将 AsyncWebCrawler 上下文管理器放在重试外面，复用浏览器实例
-    # 如果遇到浏览器崩溃等严重错误，可能需要把它放里面，但通常这样够了
-    try:
-        async with AsyncWebCrawler(config=browser_config) as crawler:
-            for attempt in range(max_retries):
-                try:
-                    result = await crawler.arun(url=url, config=run_config)
-
-                    if result.success:
-                        markdown_content = result.markdown
-
-                        # 【兜底策略】
-                        if not markdown_content or len(markdown_content) < 100:
-                            print(f"⚠️ [Crawler] Main selector failed, trying fallback... ({url})")
-                            fallback_config = CrawlerRunConfig(
-                                cache_mode=CacheMode.BYPASS,
-                                excluded_selector=EXCLUDED_SELECTORS,
-                                word_count_threshold=20
-                            )
-                            fallback_result = await crawler.arun(url=url, config=fallback_config)
-                            markdown_content = fallback_result.markdown
-
-                        if markdown_content and len(markdown_content) >= 50:
-                            print(f"✅ [Crawler] Scraped length: {len(markdown_content)}")
-                            return markdown_content[:6000]
-                        else:
-                            raise ValueError("Content too short or empty after fallback")
-                    else:
-                        raise ValueError(f"Crawl failed: {result.error_message}")
-
-                except Exception as e:
-                    if attempt == max_retries - 1:
-                        print(f"❌ [Crawler] Failed after {max_retries} attempts: {e}")
-                        return None
-
-                    print(f"⚠️ [Crawler] Retry ({attempt + 1}/{max_retries}) for {url}: {e}")
-                    await asyncio.sleep(2)  # 等待2秒重试
+            if result.success:
+                markdown_content = result.markdown
 
-    except Exception as e:
-        print(f"❌ [Crawler] Browser Init Error: {e}")
-        return None
+                # 【兜底策略】
+                if not markdown_content or len(markdown_content) < 100:
+                    print(f"⚠️ [Crawler] Main selector failed, trying fallback... ({url})")
+                    fallback_config = CrawlerRunConfig(
+                        cache_mode=CacheMode.BYPASS,
+                        excluded_selector=EXCLUDED_SELECTORS,
+                        word_count_threshold=20
+                    )
+                    fallback_result = await browser_pool.arun(url, fallback_config)
+                    markdown_content = fallback_result.markdown
+
+                if markdown_content and len(markdown_content) >= 50:
+                    print(f"✅ [Crawler] Scraped length: {len(markdown_content)}")
+                    return markdown_content[:MAX_CONTENT_CHARS]
+                else:
+                    raise ValueError("Content too short or empty after fallback")
+            else:
+                raise ValueError(f"Crawl failed: {result.error_message}")
+
+        except Exception as e:
+            if attempt == max_retries - 1:
+                print(f"❌ [Crawler] Failed after {max_retries} attempts: {e}")
+                return None
+
+            print(f"⚠️ [Crawler] Retry ({attempt + 1}/{max_retries}) for {url}: {e}")
+            await asyncio.sleep(2)  # 等待2秒重试
+
+    return None
 
 
 # 本地测试代码
@@ -92,6 +286,7 @@ if __name__ == "__main__":
         content = await run_crawler_agent(url)
         print("\n--- Final Cleaned Content ---\n")
         print(content)
+        await browser_pool.close()
 
 
     asyncio.run(test())
\ No newline at end of file
@@ -1,10 +1,18 @@
 # src/agents/small_agents/filter_agent.py
 import asyncio  # [新增] 用于 sleep
+from typing import Dict, List, Optional
 from src.schemas.data_models import RawDataInput
 from pydantic import BaseModel, Field
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from config.settings import settings
+from src.core.llm_limits import model_slot
+from src.core.llm_cache import llm_cache
+
+# 提示词版本：修改过滤提示词或输出结构时需要提升，旧缓存随之失效
+FILTER_PROMPT_VERSION = "filter-v1"
+# 批量过滤使用不同的提示词且内容截断到 BATCH_CONTENT_MAX_CHARS，结果单独缓存，不与单条结果混用
+FILTER_BATCH_PROMPT_VERSION = "filter-batch-v1"
 
 
 # 2. 定义过滤链的Pydantic输出
@@ -33,37 +41,210 @@ filter_prompt = ChatPromptTemplate.from_messages([
 filter_chain = filter_prompt | structured_filter_llm
 
 
-async def run_filter_agent(raw_data: RawDataInput) -> bool:
+async def classify_single(raw_data: RawDataInput) -> Optional[FilterOutput]:
     """
-    运行价值判断Agent。
-    返回 True (相关) 或 False (噪音/不相关)。
-    [新增] 增加 3 次重试机制
+    单条调用过滤链，带 3 次重试。全部失败时返回 None。
     """
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            # 尝试调用 LLM
-            response: FilterOutput = await filter_chain.ainvoke({
-                "content": raw_data.content,
-                "source": raw_data.source
-            })
-
-            if response.is_relevant:
-                print(f"[FilterAgent]: RELEVANT. Reason: {response.reason}")
-                return True
-            else:
-                print(f"[FilterAgent]: NOISE. Reason: {response.reason}")
-                return False
+            # 先查缓存，未命中时调用 LLM (受模型并发上限约束)
+            return await llm_cache.cached_ainvoke(
+                filter_chain,
+                {"content": raw_data.content, "source": raw_data.source},
+                model=filter_llm.model_name,
+                prompt_version=FILTER_PROMPT_VERSION,
+                cache_text=raw_data.content,
+                schema=FilterOutput,
+            )
 
         except Exception as e:
             # 如果是最后一次尝试，打印错误并放弃
             if attempt == max_retries - 1:
                 print(f"❌ [FilterAgent] Failed after {max_retries} attempts: {e}")
-                return False  # 宁可错杀，不放过（噪音）
+                return None
 
             # 否则打印警告并等待重试
             wait_time = 2 * (attempt + 1)  # 2s, 4s...
             print(f"⚠️ [FilterAgent] Error: {e}. Retrying ({attempt + 1}/{max_retries}) in {wait_time}s...")
             await asyncio.sleep(wait_time)
 
-    return False
\ No newline at end of file
+    return None
+
+
+async def run_filter_agent(raw_data: RawDataInput) -> bool:
+    """
+    运行价值判断Agent。
+    返回 True (相关) 或 False (噪音/不相关)。
+    [新增] 增加 3 次重试机制
+    """
+    response = await classify_single(raw_data)
+    if response is None:
+        return False  # 宁可错杀，不放过（噪音）
+
+    if response.is_relevant:
+        print(f"[FilterAgent]: RELEVANT. Reason: {response.reason}")
+        return True
+    else:
+        print(f"[FilterAgent]: NOISE. Reason: {response.reason}")
+        return False
+
+
+# ==========================================
+# 📦 批量过滤：一次 LLM 调用判断多条新闻
+# ==========================================
+# 单条内容在批量提示词中的最大字符数 (标题 + 摘要足够判断相关性)
+BATCH_CONTENT_MAX_CHARS = 600
+# 每条结果 (objectId + 布尔值 + 简短理由) 预留的输出 token
+BATCH_OUTPUT_TOKENS_PER_ITEM = 60
+# 系统提示词等固定开销
+BATCH_PROMPT_OVERHEAD_TOKENS = 200
+
+# 最近一次批量过滤的统计 (供采集器汇总到 /api/system/metrics)
+FILTER_BATCH_STATS = {"items": 0, "cached": 0, "calls": 0, "fallback": 0, "relevant": 0}
+
+
+class FilterBatchItem(BaseModel):
+    """单条新闻的判断结果。"""
+    object_id: str = Field(..., description="原样返回输入中该条新闻的 objectId")
+    is_relevant: bool = Field(...,
+                              description="该新闻信息是否与比特币(BTC)或以太坊(ETH)的价格、技术或市场情绪相关，而且对市场价格会造成影响")
+    reason: str = Field(..., description="简要说明为什么相关或不相关 (一句话)。")
+
+
+class FilterBatchOutput(BaseModel):
+    """批量判断多条信息是否相关。"""
+    results: List[FilterBatchItem] = Field(..., description="每条输入新闻对应一条结果，不要遗漏")
+
+
+structured_batch_filter_llm = filter_llm.with_structured_output(
+    FilterBatchOutput,
+    method="function_calling"
+)
+
+batch_filter_prompt = ChatPromptTemplate.from_messages([
+    ("system", "你是一个新闻过滤器，你的唯一工作是逐条判断信息是否与'BTC'或'ETH'相关。"
+               "输入中每条新闻以 [objectId] 开头，请为每一条都返回一个结果，object_id 必须原样返回。"),
+    ("human", "共 {count} 条信息:\n\n{items}\n\n逐条判断是否相关?")
+])
+
+batch_filter_chain = batch_filter_prompt | structured_batch_filter_llm
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算 token 数：中文等非 ASCII 字符约 1 token/字，ASCII 约 4 字符/token。
+    """
+    if not text:
+        return 0
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii) // 4 + 1
+
+
+def _format_batch_item(raw_data: RawDataInput) -> str:
+    content = raw_data.content[:BATCH_CONTENT_MAX_CHARS]
+    return f"[{raw_data.object_id}]\n{content}\n来源: {raw_data.source}"
+
+
+def plan_filter_batches(raw_items: List[RawDataInput], max_items: int = None,
+                        token_budget: int = None) -> List[List[RawDataInput]]:
+    """
+    按条数上限和 token 预算把新闻切成若干批 (保持原有顺序)。
+    单条就超过预算的新闻独占一批。
+    """
+    max_items = max(1, max_items or settings.FILTER_BATCH_MAX_ITEMS)
+    token_budget = token_budget or settings.FILTER_BATCH_TOKEN_BUDGET
+
+    batches: List[List[RawDataInput]] = []
+    current: List[RawDataInput] = []
+    used = BATCH_PROMPT_OVERHEAD_TOKENS
+    for raw_data in raw_items:
+        cost = estimate_tokens(_format_batch_item(raw_data)) + BATCH_OUTPUT_TOKENS_PER_ITEM
+        if current and (len(current) >= max_items or used + cost > token_budget):
+            batches.append(current)
+            current = []
+            used = BATCH_PROMPT_OVERHEAD_TOKENS
+        current.append(raw_data)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _classify_batch(batch: List[RawDataInput]) -> Dict[str, FilterOutput]:
+    """
+    一次调用判断一批新闻，返回 {objectId: FilterOutput}。
+    整批失败 (重试用尽) 时返回空字典，由调用方逐条补判。
+    """
+    expected_ids = {r.object_id for r in batch}
+    items_text = "\n\n".join(_format_batch_item(r) for r in batch)
+
+    max_retries = 2
+    for attempt in range(max_retries):
+        try:
+            async with model_slot(filter_llm.model_name):
+                response: FilterBatchOutput = await batch_filter_chain.ainvoke({
+                    "count": len(batch),
+                    "items": items_text
+                })
+
+            results = {}
+            for entry in response.results:
+                # 只接受输入中存在的 ID，模型编造的 ID 直接丢弃
+                if entry.object_id in expected_ids and entry.object_id not in results:
+                    results[entry.object_id] = FilterOutput(is_relevant=entry.is_relevant, reason=entry.reason)
+            return results
+
+        except Exception as e:
+            if attempt == max_retries - 1:
+                print(f"❌ [FilterAgent] Batch of {len(batch)} failed after {max_retries} attempts: {e}")
+                return {}
+            wait_time = 2 * (attempt + 1)
+            print(f"⚠️ [FilterAgent] Batch error: {e}. Retrying ({attempt + 1}/{max_retries}) in {wait_time}s...")
+            await asyncio.sleep(wait_time)
+
+    return {}
+
+
+async def run_filter_batch(raw_items: List[RawDataInput]) -> Dict[str, FilterOutput]:
+    """
+    批量运行价值判断Agent，返回 {objectId: FilterOutput}。
+    - 按 token 预算切批，各批并发发送 (仍受模型并发上限约束)
+    - 批量结果中缺失的条目逐条补判；补判也失败的条目按噪音处理
+    """
+    if not raw_items:
+        return {}
+
+    # 命中缓存的条目 (同一通稿换了 objectId、失败后重跑) 不再进入批量请求
+    decisions: Dict[str, FilterOutput] = {}
+    for raw_data in raw_items:
+        cached = await llm_cache.get(filter_llm.model_name, FILTER_BATCH_PROMPT_VERSION, raw_data.content, FilterOutput)
+        if cached is not None:
+            decisions[raw_data.object_id] = cached
+    uncached = [r for r in raw_items if r.object_id not in decisions]
+
+    batches = plan_filter_batches(uncached)
+    batch_results = await asyncio.gather(*(_classify_batch(b) for b in batches))
+
+    for batch, result in zip(batches, batch_results):
+        decisions.update(result)
+        for raw_data in batch:
+            if raw_data.object_id in result:
+                await llm_cache.put(filter_llm.model_name, FILTER_BATCH_PROMPT_VERSION,
+                                    raw_data.content, result[raw_data.object_id])
+
+    missing = [r for r in uncached if r.object_id not in decisions]
+    if missing:
+        print(f"🔁 [FilterAgent] {len(missing)} 条在批量结果中缺失，逐条补判...")
+        singles = await asyncio.gather(*(classify_single(r) for r in missing))
+        for raw_data, response in zip(missing, singles):
+            decisions[raw_data.object_id] = response or FilterOutput(
+                is_relevant=False, reason="Filter failed after retries")
+
+    relevant = sum(1 for d in decisions.values() if d.is_relevant)
+    FILTER_BATCH_STATS.update(items=len(raw_items), cached=len(raw_items) - len(uncached),
+                              calls=len(batches), fallback=len(missing), relevant=relevant)
+    print(f"[FilterAgent]: Batch done. {len(raw_items)} items / {len(batches)} calls | "
+          f"cached {len(raw_items) - len(uncached)}, RELEVANT {relevant}, "
+          f"NOISE {len(decisions) - relevant}, fallback {len(missing)}")
+    return decisions
\ No newline at end of file
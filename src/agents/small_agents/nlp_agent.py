@@ -5,8 +5,12 @@ from pydantic import BaseModel, Field
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from config.settings import settings
+from src.core.llm_cache import llm_cache
 from typing import Literal
 
+# 提示词版本：修改分析提示词或输出结构时需要提升，旧缓存随之失效
+NLP_PROMPT_VERSION = "nlp-v1"
+
 # 1. 定义一个更强大的LLM，用于分析
 analysis_llm = ChatOpenAI(
     api_key=settings.OPENAI_API_KEY,
@@ -46,11 +50,15 @@ async def run_nlp_agent(raw_data: RawDataInput) -> ProcessedData | None:
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            # 1. 调用 LLM 获取分析结果
-            response: NLPAnalysisOutput = await analysis_chain.ainvoke({
-                "content": raw_data.content,
-                "source": raw_data.source
-            })
+            # 1. 调用 LLM 获取分析结果 (先查缓存；未命中时受模型并发上限约束)
+            response: NLPAnalysisOutput = await llm_cache.cached_ainvoke(
+                analysis_chain,
+                {"content": raw_data.content, "source": raw_data.source},
+                model=analysis_llm.model_name,
+                prompt_version=NLP_PROMPT_VERSION,
+                cache_text=raw_data.content,
+                schema=NLPAnalysisOutput,
+            )
 
             # 2. 构造处理后的数据对象
             processed = ProcessedData(
@@ -2,19 +2,13 @@
 from typing_extensions import TypedDict
 from typing import Literal, Optional
 from langgraph.graph import StateGraph, END
-import httpx
-import asyncio
-from datetime import datetime, timedelta
 
 from src.schemas.data_models import RawDataInput, ProcessedData
+from src.core.update_outbox import update_outbox
 from .filter_agent import run_filter_agent
 from .nlp_agent import run_nlp_agent
-from .crawler_agent import run_crawler_agent
-
-# --- 配置 ---
-UPDATE_API_URL = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto/updatePanicNews"
-FETCH_API_URL = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto/fetchCryptoPanic"
-HEADERS = {'Content-Type': 'application/json', 'User-Agent': 'Mozilla/5.0'}
+from .crawl_cache import crawl_cache
+from .crawl_scheduler import crawl_scheduler
 
 
 # --- 1. State ---
@@ -23,13 +17,17 @@ class SmallAgentState(TypedDict):
     processed_data: Optional[ProcessedData]
     is_relevant: bool
     full_content: Optional[str]
+    # 采集器批量过滤时预先给出的判断，存在时过滤节点不再调用 LLM
+    filter_decision: Optional[bool]
 
 
 # --- 2. Nodes (保持其他 Node 不变，因为重试逻辑已内嵌到 Agent 函数中) ---
 
 async def filter_node(state: SmallAgentState) -> dict:
     raw_data = state['raw_data']
-    is_relevant = await run_filter_agent(raw_data)
+    is_relevant = state.get('filter_decision')
+    if is_relevant is None:
+        is_relevant = await run_filter_agent(raw_data)
     return {"is_relevant": is_relevant, "raw_data": raw_data, "full_content": raw_data.content}
 
 
@@ -38,8 +36,13 @@ async def crawler_node(state: SmallAgentState) -> dict:
     target_url = raw_data.source
     scraped_text = None
     if target_url and target_url.startswith("http"):
-        # run_crawler_agent 内部已经有重试逻辑了
-        scraped_text = await run_crawler_agent(target_url)
+        # 先查磁盘缓存 (重试 / 重跑 / 多条新闻指向同一链接时直接命中)
+        scraped_text = await crawl_cache.get(target_url)
+        if scraped_text:
+            print(f"💾 [Crawler] Cache hit: {target_url}")
+        else:
+            # 按域名调度 (并发上限 + 失败率熔断)，被跳过的域名直接用原始标题/描述进入分析
+            scraped_text = await crawl_scheduler.crawl(target_url)
 
     if scraped_text:
         enriched_content = f"【Web Scraped Content】\n{scraped_text}\n\n【Original Meta】\n{raw_data.content}"
@@ -60,35 +63,8 @@ async def analysis_node(state: SmallAgentState) -> dict:
         return {"is_relevant": False}
 
 
-# --- 验证辅助函数 (保持不变) ---
-async def verify_db_write(client: httpx.AsyncClient, object_id: str, expected_tag: int) -> bool:
-    end_time = datetime.now()
-    start_time = end_time - timedelta(hours=24)
-    for coin_type in [1, 2]:
-        try:
-            payload = {
-                "type": coin_type,
-                "startTime": start_time.strftime("%Y-%m-%d %H:%M:%S"),
-                "endTime": end_time.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            response = await client.post(FETCH_API_URL, json=payload, headers=HEADERS, timeout=10.0)
-            if response.status_code == 200:
-                items = response.json()
-                target_item = next((item for item in items if str(item.get('objectId')) == str(object_id)), None)
-                if target_item:
-                    actual_tag = target_item.get('newsTag') or target_item.get('newTag') or target_item.get('tag')
-                    try:
-                        actual_tag = int(actual_tag)
-                    except:
-                        actual_tag = 0
-                    if actual_tag == expected_tag: return True
-        except Exception:
-            pass
-    return False
-
-
 async def db_write_node(state: SmallAgentState):
-    """写入节点 (包含重试和回读验证逻辑)"""
+    """写入节点 (包含重试逻辑；回读验证由 write_verifier 在后台批量完成)"""
     # 【新增】检查上一步是否成功生成了 processed_data
     if 'processed_data' not in state or state['processed_data'] is None:
         print("⚠️ [Pipeline] Skip writing: No processed data available.")
@@ -114,39 +90,9 @@ async def db_write_node(state: SmallAgentState):
         "content": final_content
     }
 
-    # [新增] 写入时的重试机制
-    max_retries = 3
-
-    async with httpx.AsyncClient() as client:
-        for attempt in range(max_retries):
-            try:
-                # 1. 执行写入
-                response = await client.post(UPDATE_API_URL, json=payload, headers=HEADERS, timeout=10.0)
-
-                if response.status_code == 200:
-                    print(f"✅ [Pipeline] Write OK. Tag:{tag_value}. Now Verifying...")
-
-                    # 2. 等待并验证
-                    await asyncio.sleep(2.0)
-                    is_verified = await verify_db_write(client, data.object_id, tag_value)
-
-                    if is_verified:
-                        print(f"🎉 [Pipeline] DOUBLE CHECK PASSED!")
-                    else:
-                        print(f"💊 [Pipeline] Write OK but verify failed (Latency).")
-
-                    # 成功后直接退出函数
-                    return {}
-                else:
-                    raise Exception(f"API Code {response.status_code}")
-
-            except Exception as e:
-                if attempt == max_retries - 1:
-                    print(f"❌ [Pipeline] Write Failed after {max_retries} attempts: {e}")
-                else:
-                    print(f"⚠️ [Pipeline] Write Retry ({attempt + 1}/{max_retries}): {e}")
-                    await asyncio.sleep(2)
-
+    # 写入发件箱后立即返回：由后台 flusher 合并、发送和重试，送达后自动登记批量回读验证
+    await update_outbox.enqueue(payload, verify_tag=tag_value)
+    print(f"✅ [Pipeline] Write queued. Tag:{tag_value}")
     return {}
 
 
@@ -160,13 +106,8 @@ async def log_noise_node(state: SmallAgentState):
         "summary": "Filtered as Noise",
         "analysis": "Status:Ignored"
     }
-    # 噪音记录偶尔失败也没关系，不需要重试太狠
-    try:
-        async with httpx.AsyncClient() as client:
-            await client.post(UPDATE_API_URL, json=payload, headers=HEADERS, timeout=5.0)
-            print(f"🗑️ [Pipeline] Marked as NOISE: {raw_data.object_id}")
-    except Exception:
-        pass
+    await update_outbox.enqueue(payload)
+    print(f"🗑️ [Pipeline] Marked as NOISE: {raw_data.object_id}")
     return {}
 
 
@@ -0,0 +1,529 @@
+# src/backtest/replay.py
+"""
+离线回放回测：把录制好的历史新闻 (fetchCryptoPanic 格式) 和 K 线按模拟时钟逐步喂给大模型 Agent，
+按配置输出命中率、延迟与成本，一周的历史几分钟内即可回放完。
+
+- 语料 (Corpus)：一个 JSON 文件，包含 BTC/ETH 新闻和 15m / 1h K 线，由 `record` 子命令从本地新闻副本和币安录制
+- 输入与线上完全一致：复用 short_term_agent / trend_agent 中的 build_*_inputs，只是把"当前时间"换成模拟时钟；
+  新闻只取模拟时钟之前发布的，K 线只取模拟时钟之前已收盘的，避免未来数据泄漏
+- LLM 应答有三种模式：
+  stub (按新闻多空标签计数的确定性基线，不调用模型)；
+  recorded (按输入哈希从录制的应答库读取，未命中时退回 stub 并计数)；
+  live (真实调用模型并把应答、耗时写入应答库，之后即可用 recorded 反复回放)
+- 预测结算与线上账本共用 align_outcomes；短线 Prompt 中的反馈段落按模拟时钟下已结算的预测计算
+- 日期范围按 --chunk-hours 切分，每个 (配置, 时间段) 是独立任务，在进程池中并行
+
+注意：语料中的 newsTag 是录制时的最终值 (线上运行时部分新闻可能尚未打标)；每个时间段独立回放，
+反馈段落只包含本时间段内的预测 (相当于账本冷启动)。
+
+用法:
+    python -m src.backtest.replay record --start 2026-10-01T00:00:00 --end 2026-10-08T00:00:00
+    python -m src.backtest.replay run --configs configs.json --workers 4 --output results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict, fields
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.agents.large_agents import short_term_agent, trend_agent
+from src.agents.small_agents.filter_agent import estimate_tokens
+from src.core import news_store
+from src.core.candle_store import CANDLE_DTYPE, candle_store, interval_ms, to_binance_rows
+from src.core.llm_cache import make_cache_key
+from src.core.prediction_ledger import COIN_SYMBOLS, FEEDBACK_WINDOW_HOURS, HORIZONS, align_outcomes
+
+# --- 配置 ---
+DEFAULT_CORPUS_PATH = "data/backtest/corpus.json"
+DEFAULT_STORE_PATH = "data/backtest/llm_responses.jsonl"
+AGENT_HORIZONS = {"short_term": "1h", "trend": "24h"}
+LLM_MODES = ("stub", "recorded", "live")
+CANDLE_INTERVALS = ("15m", "1h")
+SHORT_TERM_CANDLES = 100  # 与 run_short_term_analysis 一致
+TREND_CANDLES = 25  # 与 fetch_market_data 一致
+LOOKBACK_HOURS = 48  # 语料向前多录制的时长：趋势 Agent 24h 锚点搜索 + 24h 上下文
+DEFAULT_CHUNK_HOURS = 24
+
+# 未指定 --configs 时的默认配置 (与线上调度一致：短线每 20 分钟，趋势每小时)
+DEFAULT_CONFIGS = [
+    {"name": "short_term-stub", "agent": "short_term", "step_minutes": 20, "llm_mode": "stub"},
+    {"name": "trend-stub", "agent": "trend", "step_minutes": 60, "llm_mode": "stub"},
+]
+
+
+def _to_ms(dt: datetime) -> int:
+    return int(dt.timestamp() * 1000)
+
+
+def _parse_utc(value: str) -> datetime:
+    """ISO 时间字符串 -> UTC datetime (不带时区的按 UTC 处理)"""
+    dt = datetime.fromisoformat(value.replace("Z", ""))
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+@dataclass
+class ReplayConfig:
+    name: str
+    agent: str = "short_term"  # short_term / trend
+    step_minutes: int = 20  # 模拟时钟步长 (Agent 调度间隔)
+    llm_mode: str = "stub"  # stub / recorded / live
+    prompt_version: str = ""  # 为空时使用 Agent 当前的提示词版本 (决定应答库的键)
+    min_confidence: float = 0.0  # 置信度低于该值的信号按 NEUTRAL 处理 (不计入命中率)
+    price_per_1k_input: float = 0.0  # 每 1k 输入 token 的价格，用于估算成本
+    price_per_1k_output: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ReplayConfig":
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown config fields: {sorted(unknown)}")
+        config = cls(**data)
+        if config.agent not in AGENT_HORIZONS:
+            raise ValueError(f"Unknown agent: {config.agent}")
+        if config.llm_mode not in LLM_MODES:
+            raise ValueError(f"Unknown llm_mode: {config.llm_mode}")
+        if config.step_minutes <= 0:
+            raise ValueError("step_minutes must be positive")
+        return config
+
+
+# ==========================================
+# 语料
+# ==========================================
+class Corpus:
+    def __init__(self, news: Dict[int, List[dict]], candles: Dict[Tuple[str, str], np.ndarray],
+                 start_ts: float, end_ts: float):
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        # 每个币种按发布时间正序保存 (时间戳数组, 新闻列表)，窗口查询用二分
+        self.news: Dict[int, Tuple[np.ndarray, List[dict]]] = {}
+        for coin_type, items in news.items():
+            pairs = sorted(((news_store.parse_api_timestamp(x['time']), x) for x in items if x.get('time')),
+                           key=lambda p: p[0])
+            self.news[coin_type] = (np.array([p[0] for p in pairs], dtype=np.float64), [p[1] for p in pairs])
+        self.candles = candles
+
+    def news_window(self, coin_type: int, start_ts: float, end_ts: float) -> List[dict]:
+        """[start_ts, end_ts] 内发布的新闻，按时间倒序 (与 news_store.query_range 一致)"""
+        epochs, items = self.news.get(coin_type, (np.empty(0), []))
+        lo = int(np.searchsorted(epochs, start_ts, side="left"))
+        hi = int(np.searchsorted(epochs, end_ts, side="right"))
+        return items[lo:hi][::-1]
+
+    def closed_candles(self, symbol: str, interval: str, now_ms: float, limit: int) -> np.ndarray:
+        """模拟时钟 now_ms 时已收盘的最近 limit 根 K 线"""
+        candles = self.candles.get((symbol, interval))
+        if candles is None:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        count = int(np.searchsorted(candles["open_time"], now_ms - interval_ms(interval), side="right"))
+        return candles[max(0, count - limit):count]
+
+    @classmethod
+    def load(cls, path: str) -> "Corpus":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        candles = {}
+        for key, rows in data["candles"].items():
+            symbol, interval = key.split(":")
+            array = np.array([tuple(row[:6]) for row in rows], dtype=CANDLE_DTYPE)
+            array.sort(order="open_time")
+            candles[(symbol, interval)] = array
+        news = {int(coin_type): items for coin_type, items in data["news"].items()}
+        return cls(news, candles, _parse_utc(data["start"]).timestamp(), _parse_utc(data["end"]).timestamp())
+
+    def save(self, path: str):
+        data = {
+            "start": datetime.fromtimestamp(self.start_ts, timezone.utc).isoformat(),
+            "end": datetime.fromtimestamp(self.end_ts, timezone.utc).isoformat(),
+            "news": {str(coin_type): items for coin_type, (_, items) in self.news.items()},
+            "candles": {f"{symbol}:{interval}": to_binance_rows(array)
+                        for (symbol, interval), array in self.candles.items()},
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+async def record_corpus(path: str, start: datetime, end: datetime) -> Corpus:
+    """录制 [start, end) 的回放语料：新闻来自本地新闻副本 (缺失部分回源)，K 线按范围从币安分页拉取"""
+    lookback_start = start - timedelta(hours=LOOKBACK_HOURS)
+    news = {}
+    for coin_type in COIN_SYMBOLS:
+        news[coin_type] = await news_store.query_range(coin_type, lookback_start, end)
+
+    # 结束之后再多录一个最长预测周期，保证范围末尾的预测也能结算
+    longest = max(seconds for _, seconds, _ in HORIZONS.values())
+    candles = {}
+    for symbol in COIN_SYMBOLS.values():
+        for interval in CANDLE_INTERVALS:
+            candles[(symbol, interval)] = await candle_store.fetch_range(
+                symbol, interval, _to_ms(lookback_start), _to_ms(end) + (longest + 3600) * 1000)
+
+    corpus = Corpus(news, candles, start.timestamp(), end.timestamp())
+    corpus.save(path)
+    print(f"📼 [Backtest] 语料已保存到 {path}: "
+          f"新闻 {sum(len(items) for items in news.values())} 条, "
+          f"K 线 {sum(len(c) for c in candles.values())} 根")
+    return corpus
+
+
+# ==========================================
+# LLM 应答
+# ==========================================
+def stub_signal(news_data: str) -> Dict[str, Any]:
+    """确定性基线：按时间线中多空标签的数量决定方向，置信度为净差占比"""
+    bullish = news_data.count("[BULLISH]")
+    bearish = news_data.count("[BEARISH]")
+    total = bullish + bearish
+    if bullish > bearish:
+        direction = "BULLISH"
+    elif bearish > bullish:
+        direction = "BEARISH"
+    else:
+        direction = "NEUTRAL"
+    return {"trend_24h": direction, "confidence": abs(bullish - bearish) / total if total else 0.0,
+            "reasoning": f"stub: {bullish} bullish / {bearish} bearish"}
+
+
+class ReplayResponder:
+    def __init__(self, config: ReplayConfig, store_path: str):
+        self.config = config
+        self.store_path = store_path
+        agent = short_term_agent if config.agent == "short_term" else trend_agent
+        self.model = agent.llm.model_name
+        self.prompt = agent.prompt_template
+        if config.agent == "short_term":
+            self.chain = short_term_agent.short_term_chain
+            self.prompt_version = config.prompt_version or short_term_agent.SHORT_TERM_PROMPT_VERSION
+        else:
+            self.chain = trend_agent.trend_agent_chain
+            self.prompt_version = config.prompt_version or trend_agent.TREND_PROMPT_VERSION
+        self._store: Optional[Dict[str, dict]] = None
+
+        self.calls = 0
+        self.recorded_hits = 0
+        self.recorded_misses = 0
+        self.latencies: List[float] = []
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def _load_store(self) -> Dict[str, dict]:
+        if self._store is None:
+            self._store = {}
+            if self.store_path and os.path.exists(self.store_path):
+                with open(self.store_path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                            self._store[entry["key"]] = entry
+                        except (json.JSONDecodeError, KeyError):
+                            continue
+        return self._store
+
+    def _append(self, entry: Dict[str, Any]):
+        self._load_store()[entry["key"]] = entry
+        os.makedirs(os.path.dirname(self.store_path) or ".", exist_ok=True)
+        # 单行追加写：多个进程同时 live 回放时也不会互相截断
+        with open(self.store_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    async def respond(self, inputs: Dict[str, str]) -> Dict[str, Any]:
+        """返回信号字典 (至少包含 trend_24h / confidence)，同时累计调用次数、耗时与 token"""
+        self.calls += 1
+        # 与线上 llm_cache 相同的键：同一模型、提示词版本和输入得到同一条应答
+        key = make_cache_key(self.model, self.prompt_version, json.dumps(inputs, ensure_ascii=False, sort_keys=True))
+        self.input_tokens += estimate_tokens(self.prompt.format(**inputs))
+
+        if self.config.llm_mode == "recorded":
+            entry = self._load_store().get(key)
+            if entry is None:
+                self.recorded_misses += 1
+                return stub_signal(inputs["news_data"])
+            self.recorded_hits += 1
+            self.latencies.append(entry.get("latency_s", 0.0))
+            self.output_tokens += entry.get("output_tokens", 0)
+            return entry["response"]
+
+        if self.config.llm_mode == "live":
+            start = time.perf_counter()
+            signal = await self.chain.ainvoke(inputs)
+            latency = time.perf_counter() - start
+            response = signal.model_dump()
+            output_tokens = estimate_tokens(json.dumps(response, ensure_ascii=False))
+            self.latencies.append(latency)
+            self.output_tokens += output_tokens
+            self._append({"key": key, "model": self.model, "prompt_version": self.prompt_version,
+                          "response": response, "latency_s": round(latency, 3), "output_tokens": output_tokens})
+            return response
+
+        return stub_signal(inputs["news_data"])
+
+
+# ==========================================
+# 回放
+# ==========================================
+class ReplayLedger:
+    """回放中的预测记录；按模拟时钟结算 (与线上账本共用 align_outcomes)"""
+
+    def __init__(self, corpus: Corpus, horizon: str):
+        self.corpus = corpus
+        self.interval, horizon_s, _ = HORIZONS[horizon]
+        self.horizon_ms = horizon_s * 1000
+        self.step_ms = interval_ms(self.interval)
+        self.window_ms = FEEDBACK_WINDOW_HOURS * 3600 * 1000
+        self.rows: Dict[int, Tuple[List[float], List[str]]] = {}
+
+    def record(self, coin_type: int, predicted_ms: float, direction: str):
+        predicted, directions = self.rows.setdefault(coin_type, ([], []))
+        predicted.append(predicted_ms)
+        directions.append(direction)
+
+    def outcomes(self, coin_type: int, now_ms: float, since_ms: float = -np.inf) -> Tuple[int, int]:
+        """预测时间 >= since_ms、且在 now_ms 时已可结算的非 NEUTRAL 预测：(评估次数, 正确次数)"""
+        predicted, directions = self.rows.get(coin_type, ([], []))
+        candles = self.corpus.candles.get((COIN_SYMBOLS[coin_type], self.interval))
+        if not predicted or candles is None or len(candles) == 0:
+            return 0, 0
+        predicted_ms = np.array(predicted)
+        directions = np.array(directions)
+        start_idx, target_idx, ready = align_outcomes(
+            candles["open_time"], predicted_ms, self.step_ms, self.horizon_ms, now_ms)
+        usable = ready & (start_idx >= 0) & (target_idx > start_idx) & (predicted_ms >= since_ms) \
+            & (directions != "NEUTRAL")
+        if not usable.any():
+            return 0, 0
+        moves = np.sign(candles["close"][target_idx[usable]] - candles["open"][start_idx[usable]])
+        actual = np.where(moves > 0, "BULLISH", np.where(moves < 0, "BEARISH", "NEUTRAL"))
+        return int(usable.sum()), int((actual == directions[usable]).sum())
+
+    def accuracy(self, coin_type: int, now_ms: float) -> Tuple[int, int]:
+        """与 prediction_ledger.accuracy 相同的口径：最近 FEEDBACK_WINDOW_HOURS 小时内已结算的预测"""
+        return self.outcomes(coin_type, now_ms, now_ms - self.window_ms)
+
+
+def _build_inputs(corpus: Corpus, config: ReplayConfig, ledger: ReplayLedger,
+                  now_ts: float) -> Tuple[Optional[dict], Optional[int]]:
+    """模拟时钟 now_ts 下复刻 run_short_term_analysis / run_trend_analysis 的输入，返回 (输入, 锚点币种)"""
+    now_ms = now_ts * 1000
+    search_hours = 12 if config.agent == "short_term" else 24
+    windows = {coin_type: corpus.news_window(coin_type, now_ts - search_hours * 3600, now_ts)
+               for coin_type in COIN_SYMBOLS}
+    agent = short_term_agent if config.agent == "short_term" else trend_agent
+    anchor = agent.pick_anchor_news([item for items in windows.values() for item in items])
+    if anchor is None:
+        return None, None
+    coin_type = next(ct for ct, items in windows.items() if any(item is anchor for item in items))
+
+    anchor_ts = news_store.parse_api_timestamp(anchor['time'])
+    context_seconds = 75 * 60 if config.agent == "short_term" else 24 * 3600
+    context = [item for ct in COIN_SYMBOLS for item in corpus.news_window(ct, anchor_ts - context_seconds, anchor_ts)]
+
+    if config.agent == "short_term":
+        candles = corpus.closed_candles("BTCUSDT", "15m", now_ms, SHORT_TERM_CANDLES)
+        # 与线上一致：反馈段落读取 BTC 的短线准确率
+        feedback = short_term_agent.format_feedback_report(*ledger.accuracy(1, now_ms))
+        inputs = short_term_agent.build_short_term_inputs(
+            anchor, context, candles, feedback, datetime.fromtimestamp(now_ts, timezone.utc))
+    else:
+        market_report = trend_agent.format_market_report({
+            symbol: corpus.closed_candles(symbol, "1h", now_ms, TREND_CANDLES) for symbol in ("BTCUSDT", "ETHUSDT")})
+        inputs = trend_agent.build_trend_inputs(
+            anchor, context, market_report, datetime.fromtimestamp(now_ts, timezone.utc).replace(tzinfo=None))
+    return inputs, coin_type
+
+
+async def replay_range(corpus: Corpus, config: ReplayConfig, start_ts: float, end_ts: float,
+                       store_path: str) -> Dict[str, Any]:
+    """按模拟时钟回放 [start_ts, end_ts)，返回该时间段的原始统计"""
+    wall_start = time.perf_counter()
+    responder = ReplayResponder(config, store_path)
+    ledger = ReplayLedger(corpus, AGENT_HORIZONS[config.agent])
+    steps = predictions = neutral = 0
+
+    now_ts = start_ts
+    while now_ts < end_ts:
+        steps += 1
+        inputs, coin_type = _build_inputs(corpus, config, ledger, now_ts)
+        if inputs is not None:
+            signal = await responder.respond(inputs)
+            direction = str(signal.get("trend_24h") or "NEUTRAL").upper()
+            if float(signal.get("confidence") or 0.0) < config.min_confidence:
+                direction = "NEUTRAL"
+            ledger.record(coin_type, now_ts * 1000, direction)
+            predictions += 1
+            neutral += direction == "NEUTRAL"
+        now_ts += config.step_minutes * 60
+
+    # 语料范围内全部可结算的预测
+    evaluated = correct = 0
+    for coin_type in COIN_SYMBOLS:
+        e, c = ledger.outcomes(coin_type, np.inf)
+        evaluated += e
+        correct += c
+
+    return {
+        "config": config.name,
+        "start": start_ts,
+        "end": end_ts,
+        "steps": steps,
+        "predictions": predictions,
+        "neutral": neutral,
+        "evaluated": evaluated,
+        "correct": correct,
+        "llm_calls": responder.calls,
+        "recorded_hits": responder.recorded_hits,
+        "recorded_misses": responder.recorded_misses,
+        "latencies": responder.latencies,
+        "input_tokens": responder.input_tokens,
+        "output_tokens": responder.output_tokens,
+        "wall_s": time.perf_counter() - wall_start,
+    }
+
+
+# 每个工作进程只加载一次语料
+_WORKER_CORPORA: Dict[str, Corpus] = {}
+
+
+def _run_job(corpus_path: str, config_dict: Dict[str, Any], start_ts: float, end_ts: float,
+             store_path: str) -> Dict[str, Any]:
+    """进程池任务入口 (必须是模块顶层函数才能被 pickle)"""
+    corpus = _WORKER_CORPORA.get(corpus_path)
+    if corpus is None:
+        corpus = _WORKER_CORPORA[corpus_path] = Corpus.load(corpus_path)
+    config = ReplayConfig.from_dict(config_dict)
+    return asyncio.run(replay_range(corpus, config, start_ts, end_ts, store_path))
+
+
+def split_range(start_ts: float, end_ts: float, chunk_hours: float) -> List[Tuple[float, float]]:
+    chunk = max(chunk_hours, 1) * 3600
+    ranges = []
+    cursor = start_ts
+    while cursor < end_ts:
+        ranges.append((cursor, min(cursor + chunk, end_ts)))
+        cursor += chunk
+    return ranges
+
+
+def summarize(config: ReplayConfig, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """汇总同一配置下所有时间段的结果"""
+    latencies = [lat for r in results for lat in r["latencies"]]
+    evaluated = sum(r["evaluated"] for r in results)
+    correct = sum(r["correct"] for r in results)
+    input_tokens = sum(r["input_tokens"] for r in results)
+    output_tokens = sum(r["output_tokens"] for r in results)
+    return {
+        "config": config.name,
+        "agent": config.agent,
+        "llm_mode": config.llm_mode,
+        "runs": len(results),
+        "steps": sum(r["steps"] for r in results),
+        "predictions": sum(r["predictions"] for r in results),
+        "neutral": sum(r["neutral"] for r in results),
+        "evaluated": evaluated,
+        "correct": correct,
+        "hit_rate": round(correct / evaluated, 4) if evaluated else None,
+        "llm_calls": sum(r["llm_calls"] for r in results),
+        "recorded_hits": sum(r["recorded_hits"] for r in results),
+        "recorded_misses": sum(r["recorded_misses"] for r in results),
+        "avg_latency_s": round(float(np.mean(latencies)), 3) if latencies else None,
+        "p95_latency_s": round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "est_cost": round(input_tokens / 1000 * config.price_per_1k_input
+                          + output_tokens / 1000 * config.price_per_1k_output, 4),
+        "wall_s": round(sum(r["wall_s"] for r in results), 3),
+    }
+
+
+def run_backtest(corpus_path: str, configs: List[ReplayConfig], start_ts: Optional[float] = None,
+                 end_ts: Optional[float] = None, chunk_hours: float = DEFAULT_CHUNK_HOURS, workers: int = 1,
+                 store_path: str = DEFAULT_STORE_PATH) -> List[Dict[str, Any]]:
+    """把每个配置的日期范围切分成独立任务并行回放，返回每个配置的汇总"""
+    if start_ts is None or end_ts is None:
+        corpus = Corpus.load(corpus_path)
+        _WORKER_CORPORA[corpus_path] = corpus
+        start_ts = corpus.start_ts if start_ts is None else start_ts
+        end_ts = corpus.end_ts if end_ts is None else end_ts
+
+    jobs = [(config, chunk_start, chunk_end)
+            for config in configs for chunk_start, chunk_end in split_range(start_ts, end_ts, chunk_hours)]
+    print(f"🎞️ [Backtest] {len(configs)} 个配置 x {len(jobs) // max(len(configs), 1)} 个时间段，"
+          f"{workers} 个进程")
+
+    started = time.perf_counter()
+    if workers <= 1:
+        results = [_run_job(corpus_path, asdict(config), s, e, store_path) for config, s, e in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run_job, corpus_path, asdict(config), s, e, store_path) for config, s, e in jobs]
+            results = [future.result() for future in futures]
+
+    by_config: Dict[str, List[Dict[str, Any]]] = {}
+    for result in results:
+        by_config.setdefault(result["config"], []).append(result)
+    summaries = [summarize(config, by_config.get(config.name, [])) for config in configs]
+    print(f"✅ [Backtest] 回放完成，耗时 {time.perf_counter() - started:.1f}s")
+    return summaries
+
+
+def _print_summaries(summaries: List[Dict[str, Any]]):
+    for s in summaries:
+        hit_rate = f"{s['hit_rate']:.1%}" if s["hit_rate"] is not None else "-"
+        latency = f"{s['avg_latency_s']}s / p95 {s['p95_latency_s']}s" if s["avg_latency_s"] is not None else "-"
+        print(f"📊 [Backtest] {s['config']} ({s['agent']}, {s['llm_mode']}): "
+              f"命中率 {hit_rate} ({s['correct']}/{s['evaluated']}) | 预测 {s['predictions']} (NEUTRAL {s['neutral']}) | "
+              f"LLM 调用 {s['llm_calls']} (录制命中 {s['recorded_hits']}, 未命中 {s['recorded_misses']}) | "
+              f"延迟 {latency} | tokens {s['input_tokens']}+{s['output_tokens']} | 成本 {s['est_cost']}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline replay backtest for the large agents")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    record = sub.add_parser("record", help="record a corpus of news and klines")
+    record.add_argument("--start", required=True, help="UTC ISO time, e.g. 2026-10-01T00:00:00")
+    record.add_argument("--end", required=True)
+    record.add_argument("--corpus", default=DEFAULT_CORPUS_PATH)
+
+    run = sub.add_parser("run", help="replay a corpus")
+    run.add_argument("--corpus", default=DEFAULT_CORPUS_PATH)
+    run.add_argument("--configs", help="JSON file with a list of ReplayConfig objects")
+    run.add_argument("--start", help="defaults to the corpus start")
+    run.add_argument("--end", help="defaults to the corpus end")
+    run.add_argument("--chunk-hours", type=float, default=DEFAULT_CHUNK_HOURS)
+    run.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    run.add_argument("--store", default=DEFAULT_STORE_PATH, help="recorded LLM response store (JSONL)")
+    run.add_argument("--output", help="write the summaries to this JSON file")
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        asyncio.run(record_corpus(args.corpus, _parse_utc(args.start), _parse_utc(args.end)))
+        return
+
+    config_dicts = DEFAULT_CONFIGS
+    if args.configs:
+        with open(args.configs, encoding="utf-8") as f:
+            config_dicts = json.load(f)
+    configs = [ReplayConfig.from_dict(c) for c in config_dicts]
+    summaries = run_backtest(
+        args.corpus, configs,
+        start_ts=_parse_utc(args.start).timestamp() if args.start else None,
+        end_ts=_parse_utc(args.end).timestamp() if args.end else None,
+        chunk_hours=args.chunk_hours, workers=args.workers, store_path=args.store)
+    _print_summaries(summaries)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+# src/core/candle_store.py
+"""
+共享的 K 线 (OHLCV) 本地存储，按 (交易对, 周期) 各保存一份。
+
+原先短线 Agent (每次运行拉两次币安 K 线)、趋势 Agent (逐个币种请求 Taapi) 和 /api/market/history
+(每次打开 Dashboard) 各自请求上游，没有任何缓存。现在三者都从这里读取：
+- 每个序列是一个紧凑的 numpy 结构化数组 (open_time / open / high / low / close / volume)，
+  最多保留 CANDLE_MAX_ROWS 根
+- 已收盘的 K 线不可变，增量更新只从最后一根 (正在形成的那根) 开始拉取并替换它
+- 正在形成的 K 线最多缓存 CANDLE_FORMING_REFRESH 秒；新的一根开始后立即增量拉取
+- 同一序列的并发请求只触发一次上游拉取 (每个序列一把锁)
+- 币安失败时回退到 Taapi (配置了 TAAPI_API_KEY 时)；都失败则返回已有的旧数据
+- 按月 ("1M") 等不定长的周期无法按固定步长增量合并，不缓存，直接透传给币安
+- CANDLE_STORE_DIR 非空时，已收盘的 K 线以 .npy 保存，重启后以 mmap 方式加载
+"""
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from src.core.http_client import get_http_client, endpoint_timeout
+
+# --- 配置 ---
+BINANCE_KLINES_URL = "https://api.binance.com/api/v3/klines"
+TAAPI_CANDLES_URL = "https://api.taapi.io/candles"
+BINANCE_MAX_LIMIT = 1000  # 币安单次最多返回的 K 线数
+TAAPI_MAX_RESULTS = 300
+
+CANDLE_DTYPE = np.dtype([
+    ("open_time", "<i8"),  # 开盘时间 (毫秒)
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+
+_INTERVAL_UNITS_MS = {"m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000}
+
+
+def interval_ms(interval: str) -> int:
+    """"15m" / "1h" / "1d" -> 毫秒 (不支持按月的 "1M")"""
+    try:
+        return int(interval[:-1]) * _INTERVAL_UNITS_MS[interval[-1]]
+    except (KeyError, ValueError, IndexError):
+        raise ValueError(f"Unsupported kline interval: {interval}")
+
+
+def is_cacheable_interval(interval: str) -> bool:
+    """固定步长的周期才能进入共享存储 (按月的 "1M" 不行)"""
+    try:
+        interval_ms(interval)
+        return True
+    except ValueError:
+        return False
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class _Series:
+    def __init__(self, symbol: str, interval: str):
+        self.symbol = symbol
+        self.interval = interval
+        self.step = interval_ms(interval)
+        self.candles = np.empty(0, dtype=CANDLE_DTYPE)
+        self.fetched_at = 0.0
+        self.persisted_closed = 0  # 已写入磁盘的最后一根收盘 K 线的 open_time
+        self.loaded = False
+        self.lock = asyncio.Lock()
+
+    def closed_count(self, now_ms: int) -> int:
+        """已收盘的 K 线数 (open_time + 周期 <= 当前时间)"""
+        return int(np.searchsorted(self.candles["open_time"], now_ms - self.step, side="right"))
+
+    def is_fresh(self, limit: int, forming_refresh: float) -> bool:
+        if len(self.candles) < limit:
+            return False
+        last_open = int(self.candles["open_time"][-1])
+        # 最后一根已收盘 (新的一根已开始) 或形成中的 K 线缓存过期，都需要增量拉取
+        return _now_ms() < last_open + self.step and time.time() - self.fetched_at < forming_refresh
+
+
+def merge_candles(old: np.ndarray, new: np.ndarray, max_rows: int) -> np.ndarray:
+    """
+    合并新拉取的 K 线：已有的收盘 K 线保持不变，只有旧数据的最后一根 (可能还在形成中) 会被新数据替换。
+    """
+    if len(new) == 0:
+        return old
+    if len(old):
+        old_times = old["open_time"]
+        mutable = old_times >= old_times[-1]
+        old = old[~(mutable & np.isin(old_times, new["open_time"]))]
+        new = new[~np.isin(new["open_time"], old["open_time"])]
+    merged = np.concatenate([old, new])
+    merged.sort(order="open_time", kind="stable")
+    return merged[-max_rows:]
+
+
+def _parse_binance(rows) -> np.ndarray:
+    """币安格式 [[open_time, "open", "high", "low", "close", "volume", close_time, ...], ...]"""
+    candles = np.empty(len(rows), dtype=CANDLE_DTYPE)
+    for i, k in enumerate(rows):
+        candles[i] = (int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+    return candles
+
+
+def _parse_taapi(rows) -> np.ndarray:
+    """Taapi 格式 [{"timestamp": 秒, "open", "high", "low", "close", "volume"}, ...]"""
+    candles = np.empty(len(rows), dtype=CANDLE_DTYPE)
+    for i, k in enumerate(rows):
+        candles[i] = (int(k["timestamp"]) * 1000, float(k["open"]), float(k["high"]),
+                      float(k["low"]), float(k["close"]), float(k.get("volume") or 0.0))
+    candles.sort(order="open_time")
+    return candles
+
+
+def to_binance_rows(candles: np.ndarray) -> List[list]:
+    """转回币安 K 线的行格式 [open_time, open, high, low, close, volume] (数值为 float)"""
+    return [[int(c["open_time"]), float(c["open"]), float(c["high"]), float(c["low"]),
+             float(c["close"]), float(c["volume"])] for c in candles]
+
+
+class CandleStore:
+    def __init__(self, directory: str, max_rows: int, forming_refresh: float):
+        self.directory = directory
+        self.max_rows = max(max_rows, 1)
+        self.forming_refresh = forming_refresh
+        self._series: Dict[Tuple[str, str], _Series] = {}
+
+        self.hits = 0
+        self.fetches = 0
+        self.fetched_rows = 0
+        self.fallbacks = 0
+        self.errors = 0
+        self.stale_served = 0
+
+    def _get_series(self, symbol: str, interval: str) -> _Series:
+        # symbol 会出现在持久化文件名中，只允许字母和数字
+        if not symbol or not symbol.isalnum():
+            raise ValueError(f"Invalid symbol: {symbol}")
+        key = (symbol.upper(), interval)
+        series = self._series.get(key)
+        if series is None:
+            series = _Series(*key)
+            self._series[key] = series
+        return series
+
+    # ==========================================
+    # 持久化 (可选)
+    # ==========================================
+    def _path(self, series: _Series) -> str:
+        return os.path.join(self.directory, f"{series.symbol}_{series.interval}.npy")
+
+    def _load(self, series: _Series):
+        """在线程中执行：以 mmap 方式打开已保存的收盘 K 线，复制最近 max_rows 根到内存"""
+        path = self._path(series)
+        if not os.path.exists(path):
+            return
+        try:
+            stored = np.load(path, mmap_mode="r")
+            if stored.dtype != CANDLE_DTYPE:
+                return
+            series.candles = np.array(stored[-self.max_rows:])
+            if len(series.candles):
+                series.persisted_closed = int(series.candles["open_time"][-1])
+        except Exception as e:
+            print(f"⚠️ [CandleStore] 读取 {path} 失败: {e}")
+
+    def _save(self, series: _Series, closed: np.ndarray):
+        """在线程中执行：原子写入已收盘的 K 线"""
+        path = self._path(series)
+        tmp_path = path + ".tmp.npy"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            np.save(tmp_path, closed)
+            os.replace(tmp_path, path)
+            series.persisted_closed = int(closed["open_time"][-1])
+        except Exception as e:
+            print(f"⚠️ [CandleStore] 写入 {path} 失败: {e}")
+
+    # ==========================================
+    # 上游拉取
+    # ==========================================
+    async def _fetch_binance(self, symbol: str, interval: str, limit: int,
+                             start_ms: Optional[int] = None) -> np.ndarray:
+        params = {"symbol": symbol, "interval": interval, "limit": min(limit, BINANCE_MAX_LIMIT)}
+        if start_ms is not None:
+            params["startTime"] = start_ms
+        client = get_http_client(BINANCE_KLINES_URL)
+        resp = await client.get(BINANCE_KLINES_URL, params=params, timeout=endpoint_timeout(BINANCE_KLINES_URL))
+        resp.raise_for_status()
+        return _parse_binance(resp.json())
+
+    async def _fetch_taapi(self, series: _Series, limit: int) -> np.ndarray:
+        # Taapi 的 symbol 需要带斜杠 (BTCUSDT -> BTC/USDT)
+        symbol = series.symbol
+        if symbol.endswith("USDT"):
+            symbol = f"{symbol[:-4]}/USDT"
+        params = {"secret": settings.TAAPI_API_KEY, "exchange": "binance", "symbol": symbol,
+                  "interval": series.interval, "results": min(limit, TAAPI_MAX_RESULTS)}
+        client = get_http_client(TAAPI_CANDLES_URL)
+        resp = await client.get(TAAPI_CANDLES_URL, params=params, timeout=endpoint_timeout(TAAPI_CANDLES_URL))
+        resp.raise_for_status()
+        rows = resp.json()
+        if not isinstance(rows, list):
+            raise ValueError(f"Unexpected Taapi response: {str(rows)[:200]}")
+        return _parse_taapi(rows)
+
+    async def _refresh(self, series: _Series, limit: int):
+        """增量拉取：数据足够时只从最后一根开始拉，不足 (或缺口超过单次上限) 时拉取最近 limit 根"""
+        candles = series.candles
+        start_ms = None
+        want = max(limit, 2)
+        if len(candles) >= limit:
+            last_open = int(candles["open_time"][-1])
+            missing = (_now_ms() - last_open) // series.step + 1
+            if missing < BINANCE_MAX_LIMIT:
+                start_ms, want = last_open, missing + 1
+
+        try:
+            new = await self._fetch_binance(series.symbol, series.interval, want, start_ms)
+        except Exception as e:
+            if not settings.TAAPI_API_KEY:
+                raise
+            print(f"⚠️ [CandleStore] 币安 {series.symbol} {series.interval} 拉取失败 ({e})，改用 Taapi")
+            self.fallbacks += 1
+            new = await self._fetch_taapi(series, want)
+
+        self.fetches += 1
+        self.fetched_rows += len(new)
+        series.candles = merge_candles(series.candles, new, self.max_rows)
+        series.fetched_at = time.time()
+
+        if self.directory and len(series.candles):
+            closed = series.candles[:series.closed_count(_now_ms())]
+            if len(closed) and int(closed["open_time"][-1]) != series.persisted_closed:
+                await asyncio.to_thread(self._save, series, closed)
+
+    # ==========================================
+    # 读取
+    # ==========================================
+    async def get(self, symbol: str, interval: str, limit: int) -> np.ndarray:
+        """
+        返回最近 limit 根 K 线 (按时间正序的结构化数组，最后一根可能尚未收盘)。
+        上游不可用时返回已有数据 (可能少于 limit 根或为空)。
+        """
+        limit = max(1, min(limit, self.max_rows))
+        if not is_cacheable_interval(interval):
+            return await self._passthrough(symbol, interval, limit)
+        series = self._get_series(symbol, interval)
+        if series.is_fresh(limit, self.forming_refresh):
+            self.hits += 1
+            return series.candles[-limit:].copy()
+
+        async with series.lock:
+            if not series.loaded:
+                if self.directory:
+                    await asyncio.to_thread(self._load, series)
+                series.loaded = True
+            if series.is_fresh(limit, self.forming_refresh):
+                self.hits += 1
+            else:
+                try:
+                    await self._refresh(series, limit)
+                except Exception as e:
+                    self.errors += 1
+                    if len(series.candles):
+                        self.stale_served += 1
+                    print(f"⚠️ [CandleStore] Failed to fetch klines for {series.symbol} {series.interval}: {e}")
+            return series.candles[-limit:].copy()
+
+    async def _passthrough(self, symbol: str, interval: str, limit: int) -> np.ndarray:
+        """不缓存的周期 (如 "1M")：直接请求币安，失败时返回空数组"""
+        try:
+            candles = await self._fetch_binance(symbol.upper(), interval, limit)
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️ [CandleStore] Failed to fetch klines for {symbol} {interval}: {e}")
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        self.fetches += 1
+        self.fetched_rows += len(candles)
+        return candles
+
+    async def fetch_range(self, symbol: str, interval: str, start_ms: int, end_ms: int) -> np.ndarray:
+        """
+        分页拉取 [start_ms, end_ms) 内开盘的全部 K 线 (仅币安，不写入缓存序列)，供回放引擎录制历史语料。
+        """
+        series = _Series(self._get_series(symbol, interval).symbol, interval)  # 独立的临时序列
+        chunks = []
+        cursor = start_ms
+        while cursor < end_ms:
+            page = await self._fetch_binance(series.symbol, series.interval, BINANCE_MAX_LIMIT, cursor)
+            page = page[page["open_time"] < end_ms]
+            if len(page) == 0:
+                break
+            chunks.append(page)
+            cursor = int(page["open_time"][-1]) + series.step
+        self.fetches += len(chunks)
+        if not chunks:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        return np.concatenate(chunks)
+
+    async def klines(self, symbol: str, interval: str, limit: int) -> List[list]:
+        """币安行格式的 K 线 [open_time, open, high, low, close, volume]"""
+        return to_binance_rows(await self.get(symbol, interval, limit))
+
+    def stats(self) -> dict:
+        now_ms = _now_ms()
+        return {
+            "series": {
+                f"{s.symbol}:{s.interval}": {
+                    "rows": len(s.candles),
+                    "closed": s.closed_count(now_ms),
+                    "age_s": round(time.time() - s.fetched_at, 1) if s.fetched_at else None,
+                }
+                for s in self._series.values()
+            },
+            "memory_bytes": sum(s.candles.nbytes for s in self._series.values()),
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "fetched_rows": self.fetched_rows,
+            "taapi_fallbacks": self.fallbacks,
+            "errors": self.errors,
+            "stale_served": self.stale_served,
+        }
+
+
+candle_store = CandleStore(
+    directory=settings.CANDLE_STORE_DIR,
+    max_rows=settings.CANDLE_MAX_ROWS,
+    forming_refresh=settings.CANDLE_FORMING_REFRESH,
+)
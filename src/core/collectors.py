@@ -1,27 +1,38 @@
 # src/core/collectors.py
 import asyncio
-import httpx
 import time
 import traceback
-from typing import Set, List, Dict, Any
-from datetime import datetime, timezone, timedelta
+from typing import List, Dict, Any, Optional, Tuple
 
+from config.settings import settings
 # 导入可以直接调用的组件
 from src.agents.small_agents.pipeline import small_agent_graph
+from src.agents.small_agents.filter_agent import run_filter_batch, FILTER_BATCH_STATS
+from src.agents.small_agents.crawl_cache import crawl_cache
 from src.schemas.data_models import RawDataInput
+from src.core.dedup_store import create_dedup_store
+from src.core import news_store
+from src.core.news_store import parse_api_timestamp
+from src.core.near_dup import near_dup_index, news_text
+from src.core.write_verifier import write_verifier
+from src.core.update_outbox import update_outbox
+from src.core.retry_queue import retry_queue
+from src.utils.json_helper import extract_base_analysis
 
 # --- 配置 ---
-FETCH_API_URL = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto/fetchCryptoPanic"
-UPDATE_API_URL = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto/updatePanicNews"
-HEADERS = {'Content-Type': 'application/json'}
+# 既然每20分钟跑一次，查过去 12小时 足够了，不用查24小时，减少数据量
+COLLECT_WINDOW_HOURS = 12
 
-# 全局去重集合 (只要程序不重启，这个 set 一直有效)
-seen_object_ids: Set[str] = set()
+# 全局去重索引 (默认持久化到 DATABASE_URL，重启后依然有效，并按 TTL 自动过期)
+dedup_store = create_dedup_store()
+# 过期清理间隔 (秒)
+DEDUP_PURGE_INTERVAL = 3600
+_last_dedup_purge = 0.0
 
 
 async def mark_as_failed(obj_id: str, reason: str):
     """
-    [新增] 辅助函数：当处理出错时，将新闻标记为 Noise (Tag 4)，
+    [新增] 辅助函数：重试次数用尽时，将新闻标记为 Noise (Tag 4)，
     防止程序下次重启时卡在同一个错误的 ID 上。
     """
     payload = {
@@ -30,54 +41,234 @@ async def mark_as_failed(obj_id: str, reason: str):
         "summary": "Processing Failed",
         "analysis": f"System Error: {reason[:100]}"
     }
+    await update_outbox.enqueue(payload)
+    print(f"🚫 [ErrorHandler] 已将 ID {obj_id} 标记为 Tag 4 (Failed).")
+
+
+# ==========================================
+# 🧬 近重复新闻：复用 canonical 条目的结果
+# ==========================================
+def reusable_result(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    从 canonical 条目的本地副本中取出可复用的结果。
+    只复用已完成分析 (Tag 1/2/3) 或被判定为噪音的结果，处理失败的不复用。
+    analysis 只取基础分析 (Impact / Score)，大模型 Agent 追加的信号属于 canonical 自身，不复制。
+    """
+    if not payload:
+        return None
     try:
-        async with httpx.AsyncClient() as client:
-            await client.post(UPDATE_API_URL, json=payload, headers=HEADERS, timeout=5.0)
-            print(f"🚫 [ErrorHandler] 已将 ID {obj_id} 标记为 Tag 4 (Failed).")
-    except Exception as e:
-        print(f"❌ [ErrorHandler] 标记失败 ID {obj_id}: {e}")
+        tag = int(float(payload.get('newsTag') or payload.get('newTag') or payload.get('tag') or 0))
+    except (TypeError, ValueError):
+        return None
+    if tag in (1, 2, 3) or (tag == 4 and payload.get('analysis') == "Status:Ignored"):
+        return {
+            "tag": tag,
+            "newsTag": tag,
+            "newTag": tag,
+            "summary": payload.get('summary') or "",
+            "analysis": extract_base_analysis(payload.get('analysis') or ""),
+        }
+    return None
+
+
+async def write_duplicate_result(obj_id: str, canonical_id: str, result: Dict[str, Any]):
+    """把 canonical 条目的 Tag / 摘要 / 基础分析直接回写给近重复条目，不经过 Pipeline；canonical 记录在 dupOf 字段"""
+    payload = {"objectId": obj_id, **result, "dupOf": canonical_id}
+    await update_outbox.enqueue(payload, verify_tag=result['newsTag'])
+    print(f"🧬 [NearDup] ID {obj_id} 复用 {canonical_id} 的结果 (Tag {result['newsTag']})")
 
 
-async def fetch_crypto_news_from_api(client: httpx.AsyncClient, coin_type: int) -> List[Dict[str, Any]]:
+async def seed_near_dup_index(now: float):
+    """把窗口内已处理完成的新闻登记进索引，新来的改写稿可以直接命中历史结果"""
+    resolved = await news_store.query_range(
+        None, now - settings.NEAR_DUP_WINDOW_HOURS * 3600, now, tags=[1, 2, 3]
+    )
+    # 按时间正序登记，簇的 canonical 是最早出现的那条
+    for item in reversed(resolved):
+        obj_id = item.get('objectId')
+        if obj_id and not near_dup_index.contains(obj_id):
+            near_dup_index.add(obj_id, news_text(item))
+
+
+def split_near_duplicates(items: List[Dict[str, Any]]):
     """
-    调用 fetchCryptoPanic 接口获取新闻 (保留原有逻辑)
+    返回 (需要进入 Pipeline 的条目, [(近重复条目, canonical_id), ...])。
     """
-    end_time = datetime.utcnow()
-    # 既然每20分钟跑一次，查过去 12小时 足够了，不用查24小时，减少数据量
-    start_time = end_time - timedelta(hours=12)
+    unique_items, followers = [], []
+    for item in items:
+        obj_id = item.get('objectId')
+        canonical_id = near_dup_index.check_and_add(obj_id, news_text(item))
+        if canonical_id and canonical_id != obj_id:
+            followers.append((item, canonical_id))
+        else:
+            unique_items.append(item)
+    return unique_items, followers
 
-    start_str = start_time.strftime("%Y-%m-%dT%H:%M:%S")
-    end_str = end_time.strftime("%Y-%m-%dT%H:%M:%S")
 
-    json_data = {
-        "type": coin_type,
-        "startTime": start_str,
-        "endTime": end_str
-    }
+async def resolve_near_duplicates(followers: List[Tuple[Dict[str, Any], str]]):
+    """
+    对 canonical 已有结果的近重复条目直接回写，返回 (已复用的 ID, 尚未复用的 [(条目, canonical_id), ...])。
+    """
+    reused, leftovers = [], []
+    for item, canonical_id in followers:
+        result = reusable_result(await news_store.get_item(canonical_id))
+        if result:
+            await write_duplicate_result(item.get('objectId'), canonical_id, result)
+            reused.append(item.get('objectId'))
+        else:
+            leftovers.append((item, canonical_id))
+    return reused, leftovers
 
+
+async def handle_pipeline_failure(item: Dict[str, Any], reason: str):
+    """
+    Pipeline 出错时先进入重试队列 (指数退避)；重试次数用尽 (已移入死信表) 才标记为 Tag 4。
+    """
+    obj_id = item.get('objectId')
     try:
-        response = await client.post(FETCH_API_URL, headers=HEADERS, json=json_data, timeout=15.0)
-        if response.status_code != 200:
-            print(f"⚠️ [NewsCollector] API 请求失败 (Type {coin_type}) Code: {response.status_code}")
-            return []
-        return response.json()
+        if await retry_queue.schedule(item, reason):
+            return
     except Exception as e:
-        print(f"❌ [NewsCollector] 请求异常 (Type {coin_type}): {e}")
-        return []
+        print(f"⚠️ [RetryQueue] 登记重试失败 ID {obj_id}: {e}")
+    await mark_as_failed(obj_id, reason)
+
+
+async def take_retry_items(limit: int) -> List[Dict[str, Any]]:
+    """取出到期的重试；本地副本显示已被处理 (Tag 非 0) 的直接出队"""
+    items = []
+    for item in await retry_queue.take_due(limit):
+        obj_id = item.get('objectId')
+        current = await news_store.get_item(obj_id)
+        try:
+            tag = int(float((current or {}).get('newsTag') or 0))
+        except (TypeError, ValueError):
+            tag = 0
+        if tag:
+            await retry_queue.resolve(obj_id, recovered=False)
+            continue
+        items.append(item)
+    return items
 
 
-def parse_api_timestamp(time_str: str) -> float:
-    if not time_str: return time.time()
+async def purge_dedup_store_if_due():
+    global _last_dedup_purge
+    if time.time() - _last_dedup_purge < DEDUP_PURGE_INTERVAL:
+        return
+    _last_dedup_purge = time.time()
     try:
-        clean_str = time_str.replace("Z", "").strip()
-        if "T" in clean_str:
-            dt = datetime.strptime(clean_str, "%Y-%m-%dT%H:%M:%S")
-        else:
-            dt = datetime.strptime(clean_str, "%Y-%m-%d %H:%M:%S")
-        dt = dt.replace(tzinfo=timezone.utc)
-        return dt.timestamp()
-    except Exception:
-        return time.time()
+        removed = await dedup_store.purge_expired()
+        if removed:
+            print(f"🧹 [Collector] 去重索引清理过期条目: {removed}")
+    except Exception as e:
+        print(f"⚠️ [Collector] 去重索引清理失败: {e}")
+
+
+# ==========================================
+# ⚙️ 并发 Worker 池
+# ==========================================
+# 最近一轮采集的统计数据 (供 /api/system/metrics 查询)
+COLLECTOR_STATS: Dict[str, Any] = {
+    "last_cycle": None,
+    "total_processed": 0,
+    "total_failed": 0,
+}
+
+
+def build_raw_data(item: Dict[str, Any]) -> RawDataInput:
+    title = item.get('title') or "No Title"
+    return RawDataInput(
+        source=item.get('link') or "",
+        timestamp=parse_api_timestamp(item.get('time')),
+        content=f"Title: {title}\nDescription: {item.get('description') or ''}",
+        object_id=item.get('objectId')
+    )
+
+
+async def process_news_item(item: Dict[str, Any], filter_decision: Optional[bool] = None):
+    """
+    将单条新闻送入 Small Agent Pipeline，出错时进入重试队列。
+    filter_decision 为批量过滤的预判结果，传入时 Pipeline 跳过过滤 LLM。
+    返回 True 表示处理成功。
+    """
+    obj_id = item.get('objectId')
+    title = item.get('title') or "No Title"
+
+    print(f"⚙️ [Pipeline] Processing ID: {obj_id} | {title[:30]}...")
+
+    raw_data = build_raw_data(item)
+
+    try:
+        # 调用 LangGraph 进行清洗
+        await small_agent_graph.ainvoke({"raw_data": raw_data, "filter_decision": filter_decision})
+    except Exception as agent_e:
+        print(f"❌ [Pipeline Error] ID: {obj_id}")
+        traceback.print_exc()
+        # 先排队重试 (LLM / 爬虫超时多为临时故障)，用尽次数后才标记 Tag 4
+        await handle_pipeline_failure(item, str(agent_e) or type(agent_e).__name__)
+        return False
+
+    if obj_id in retry_queue.in_flight:
+        try:
+            await retry_queue.resolve(obj_id)
+            print(f"♻️ [RetryQueue] ID {obj_id} 重试成功")
+        except Exception as e:
+            print(f"⚠️ [RetryQueue] 出队失败 ID {obj_id}: {e}")
+    return True
+
+
+async def _collector_worker(queue: asyncio.Queue, cycle_stats: Dict[str, Any],
+                            filter_decisions: Dict[str, bool]):
+    """
+    Worker 从队列头部依次取任务 (队列按时间倒序入队，保证最新的新闻最先被派发)。
+    """
+    while True:
+        enqueued_at, item = await queue.get()
+        try:
+            wait = time.time() - enqueued_at
+            cycle_stats["queue_waits"].append(wait)
+
+            ok = await process_news_item(item, filter_decisions.get(item.get('objectId')))
+            if ok:
+                cycle_stats["processed"] += 1
+            else:
+                cycle_stats["failed"] += 1
+            # 成功 (结果已进发件箱) 或失败 (已进重试队列 / 标记 Tag 4) 都已有人接手
+            cycle_stats["done_ids"].append(item.get('objectId'))
+        finally:
+            queue.task_done()
+
+
+async def drain_with_worker_pool(items: List[Dict[str, Any]], max_workers: int,
+                                 filter_decisions: Dict[str, bool] = None) -> Dict[str, Any]:
+    """
+    用固定数量的 Worker 并行消费已排序的新闻列表。
+    LLM 层面的并发由 src.core.llm_limits 按模型单独限制。
+    """
+    filter_decisions = filter_decisions or {}
+    cycle_stats = {"processed": 0, "failed": 0, "queue_waits": [], "done_ids": []}
+    if not items:
+        return cycle_stats
+
+    queue: asyncio.Queue = asyncio.Queue()
+    now = time.time()
+    for item in items:
+        queue.put_nowait((now, item))
+
+    worker_count = max(1, min(max_workers, len(items)))
+    workers = [
+        asyncio.create_task(_collector_worker(queue, cycle_stats, filter_decisions))
+        for _ in range(worker_count)
+    ]
+    cycle_stats["workers"] = worker_count
+
+    try:
+        await queue.join()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    return cycle_stats
 
 
 # ==========================================
@@ -92,76 +283,141 @@ async def run_news_collector():
 
     # 记录本轮处理数量
     processed_count = 0
+    cycle_stats = None
+    # 本轮已被 Pipeline / 重试队列 / 近重复回写接手的 ID，结束时把去重租约延长到完整 TTL
+    owned_ids: List[str] = []
     loop_start = time.time()
 
     try:
-        async with httpx.AsyncClient() as client:
-            # 1. 拉取数据
-            btc_news = await fetch_crypto_news_from_api(client, 1)
-            eth_news = await fetch_crypto_news_from_api(client, 2)
-
-            all_news_items = []
-            if isinstance(btc_news, list): all_news_items.extend(btc_news)
-            if isinstance(eth_news, list): all_news_items.extend(eth_news)
-
-            if not all_news_items:
-                print("💓 [Collector] 本轮未获取到原始数据。")
-                return  # 直接结束
-
-            # 2. 排序
-            all_news_items.sort(
-                key=lambda x: parse_api_timestamp(x.get('time')),
-                reverse=True
-            )
-
-            # 3. 遍历处理
-            for item in all_news_items:
-                obj_id = item.get('objectId')
-                current_tag = item.get('newsTag')
-
-                # A. 过滤已处理的
-                if current_tag is not None and current_tag != 0:
-                    continue
-
-                # B. 内存去重 (依赖全局变量 seen_object_ids)
-                if obj_id in seen_object_ids:
-                    continue
-
-                if obj_id:
-                    seen_object_ids.add(obj_id)
-                    processed_count += 1
-
-                    # --- 准备 Pipeline ---
-                    title = item.get('title') or "No Title"
-                    target_url = item.get('link') or ""
-
-                    print(f"⚙️ [Pipeline] Processing ID: {obj_id} | {title[:30]}...")
-
-                    raw_data = RawDataInput(
-                        source=target_url,
-                        timestamp=parse_api_timestamp(item.get('time')),
-                        content=f"Title: {title}\nDescription: {item.get('description') or ''}",
-                        object_id=obj_id
-                    )
-
-                    try:
-                        # 调用 LangGraph 进行清洗
-                        # 这里依然是 await，保证必须清洗完这一条，才算完成
-                        await small_agent_graph.ainvoke({"raw_data": raw_data})
-
-                        # 短暂停顿，防止并发过高
-                        await asyncio.sleep(0.2)
-
-                    except Exception as agent_e:
-                        print(f"❌ [Pipeline Error] ID: {obj_id}")
-                        traceback.print_exc()
-                        # 出错标记，防止下次卡住
-                        await mark_as_failed(obj_id, str(agent_e))
+        # 1. 先让本地副本追上上游 (增量拉取)，再在本地查询未处理 (Tag 0) 的新闻
+        await news_store.sync()
+        now = time.time()
+        # 本地查询已按时间倒序 (最新的在前)
+        untagged_items = await news_store.query_range(
+            None, now - COLLECT_WINDOW_HOURS * 3600, now, tags=[0]
+        )
+
+        if not untagged_items:
+            print("💓 [Collector] 本轮没有新的待处理新闻。")
+
+        # 2. 去重：批量占用 (短租约)，只处理本轮新占用的 ID (已在重试队列中的由重试流程处理)
+        retrying_ids = await retry_queue.queued_ids(x.get('objectId') for x in untagged_items)
+        claimed_ids = await dedup_store.claim_many(
+            x.get('objectId') for x in untagged_items if x.get('objectId') not in retrying_ids)
+        pending_items = []
+        for item in untagged_items:
+            obj_id = item.get('objectId')
+            # 同一 objectId 可能同时出现在 BTC/ETH 两个列表中，只派发第一次出现
+            if obj_id in claimed_ids:
+                claimed_ids.discard(obj_id)
+                pending_items.append(item)
+
+        processed_count = len(pending_items)
+
+        # 3. 近重复检测：同一快讯的改写稿只让第一条进入 Pipeline
+        followers = []
+        near_dup_reused = 0
+        if settings.NEAR_DUP_ENABLED and pending_items:
+            await seed_near_dup_index(now)
+            pending_items, followers = split_near_duplicates(pending_items)
+            # canonical 已有结果 (历史条目) 的直接回写
+            reused_ids, followers = await resolve_near_duplicates(followers)
+            owned_ids.extend(reused_ids)
+            near_dup_reused = len(reused_ids)
+
+        # 4. 整轮积压一次性批量过滤 (调用次数随批数增长，而不是随条数)
+        filter_start = time.time()
+        filter_decisions = {}
+        if pending_items:
+            outputs = await run_filter_batch([build_raw_data(x) for x in pending_items])
+            filter_decisions = {oid: out.is_relevant for oid, out in outputs.items()}
+        filter_duration = time.time() - filter_start
+
+        # 5. Worker 池并行处理 (相关新闻走爬虫 + NLP，噪音直接标记)
+        cycle_stats = await drain_with_worker_pool(pending_items, settings.COLLECTOR_MAX_WORKERS, filter_decisions)
+        cycle_stats["filter_s"] = filter_duration
+        owned_ids.extend(cycle_stats["done_ids"])
+
+        # 6. canonical 在本轮刚处理完的近重复条目：复用结果；canonical 失败的单独走 Pipeline
+        if followers:
+            reused_ids, leftovers = await resolve_near_duplicates(followers)
+            owned_ids.extend(reused_ids)
+            near_dup_reused += len(reused_ids)
+            if leftovers:
+                extra = await drain_with_worker_pool([item for item, _ in leftovers], settings.COLLECTOR_MAX_WORKERS)
+                owned_ids.extend(extra["done_ids"])
+                cycle_stats["processed"] += extra["processed"]
+                cycle_stats["failed"] += extra["failed"]
+                cycle_stats["queue_waits"].extend(extra["queue_waits"])
+        cycle_stats["near_dup_reused"] = near_dup_reused
+
+        # 7. 新新闻处理完后，剩余容量留给到期的重试
+        retry_items = await take_retry_items(settings.RETRY_CYCLE_CAPACITY - processed_count)
+        if retry_items:
+            print(f"🔁 [Collector] 本轮重试 {len(retry_items)} 条此前失败的新闻")
+            extra = await drain_with_worker_pool(retry_items, settings.COLLECTOR_MAX_WORKERS)
+            cycle_stats["processed"] += extra["processed"]
+            cycle_stats["failed"] += extra["failed"]
+            cycle_stats["queue_waits"].extend(extra["queue_waits"])
+            cycle_stats["workers"] = max(cycle_stats.get("workers", 0), extra.get("workers", 0))
+            processed_count += len(retry_items)
+        cycle_stats["retried"] = len(retry_items)
 
     except Exception as e:
         print(f"🔥 [Collector Critical] 本轮采集发生严重错误: {e}")
         traceback.print_exc()
 
+    # 未被接手的 ID (本轮中途出错) 保持短租约，到期后下一轮重新处理
+    try:
+        await dedup_store.confirm_many(owned_ids)
+    except Exception as e:
+        print(f"⚠️ [Collector] 去重租约续期失败: {e}")
+
+    await purge_dedup_store_if_due()
+
+    # 发送本轮积压在发件箱中的写入，并对已送达的结果做一次批量回读 (后台循环也会定期执行，这里保证独立运行时同样生效)
+    try:
+        await update_outbox.flush_due()
+        await write_verifier.verify_pending()
+    except Exception as e:
+        print(f"⚠️ [Collector] 批量验证失败: {e}")
+
     duration = time.time() - loop_start
+
+    if cycle_stats is not None:
+        crawl_cache_cycle = crawl_cache.take_cycle_stats()
+        waits = cycle_stats["queue_waits"]
+        throughput = processed_count / duration if duration > 0 else 0.0
+        avg_wait = sum(waits) / len(waits) if waits else 0.0
+        max_wait = max(waits) if waits else 0.0
+
+        COLLECTOR_STATS["last_cycle"] = {
+            "finished_at": time.time(),
+            "items": processed_count,
+            "succeeded": cycle_stats["processed"],
+            "failed": cycle_stats["failed"],
+            "workers": cycle_stats.get("workers", 0),
+            "duration_s": round(duration, 3),
+            "throughput_items_per_s": round(throughput, 3),
+            "avg_queue_wait_s": round(avg_wait, 3),
+            "max_queue_wait_s": round(max_wait, 3),
+            "filter_s": round(cycle_stats.get("filter_s", 0.0), 3),
+            "near_dup_reused": cycle_stats.get("near_dup_reused", 0),
+            "retried": cycle_stats.get("retried", 0),
+            "crawl_cache": crawl_cache_cycle,
+            "filter_batches": dict(FILTER_BATCH_STATS),
+        }
+        COLLECTOR_STATS["total_processed"] += cycle_stats["processed"]
+        COLLECTOR_STATS["total_failed"] += cycle_stats["failed"]
+
+        if processed_count:
+            print(f"📊 [Collector] 吞吐: {throughput:.2f} items/s | "
+                  f"队列等待 avg {avg_wait:.2f}s / max {max_wait:.2f}s | Workers: {cycle_stats.get('workers', 0)}")
+            lookups = crawl_cache_cycle["hits"] + crawl_cache_cycle["revalidated"] + crawl_cache_cycle["misses"]
+            if lookups:
+                print(f"💾 [Collector] 爬虫缓存命中率: {crawl_cache_cycle['hit_ratio']:.0%} "
+                      f"({crawl_cache_cycle['hits']} 命中 / {crawl_cache_cycle['revalidated']} 304 续期 / "
+                      f"{crawl_cache_cycle['misses']} 未命中)")
+
     print(f"✅ [Collector] 本轮结束。新增处理: {processed_count} 条。耗时: {duration:.2f}s")
-    # 函数自然结束，返回控制权给 Master Scheduler
\ No newline at end of file
+    # 函数自然结束，返回控制权给 Master Scheduler
@@ -0,0 +1,549 @@
+# src/core/dashboard_snapshot.py
+"""
+Dashboard 数据接口 (/api/dashboard/data) 的预计算快照。
+
+原先缓存每 10 秒过期一次，每次过期都要对 72h 内的所有新闻重新解析 analysis JSON、
+重新用 strptime 转换时间、重新序列化整个响应，而每个打开的标签页每 15 秒轮询一次。
+现在只有本地新闻副本的数据版本 (news_store.data_version) 变化，或超过 DASHBOARD_SOFT_TTL
+(72h 窗口随时间滑动) 时才重建一次快照：
+- 快照里直接保存序列化好的响应字节，以及 gzip / brotli 压缩后的版本
+- 按数据内容计算哈希作为 ETag，客户端带 If-None-Match 且未变化时返回 304
+- 重建后内容哈希不变 (例如同步只刷新了时间戳) 时沿用旧快照，ETag 保持稳定
+
+列表只返回紧凑投影 (不含 analysis 原文、信号历史的 chain_of_thought 和正文)，完整内容按需从
+/api/news/{objectId} 获取；快照同时维护按 (币种, Tag) 分组、按时间排序的内存索引，支持
+coin / tag / start / end / page / limit 查询参数。索引使用列表展示的 Tag (_final_tag)：
+噪音 / 处理失败 (4) 与未分析一样归为 0，因此 tag 只接受 0~3。
+
+快照带有游标 (cursor = 构建时的数据版本)。前端拿到全量数据后改用增量：
+- /api/dashboard/delta?since=<cursor> 只返回游标之后新增 / 更新的条目和新信号
+- /api/dashboard/stream?since=<cursor> (SSE) 在采集器 / Agent 写入本地副本后立即推送增量
+"""
+import asyncio
+import bisect
+import gzip
+import hashlib
+import json
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from src.core import news_store
+from src.core.news_store import parse_api_timestamp
+
+try:
+    import brotli
+except ImportError:  # brotli 缺失时只提供 gzip
+    brotli = None
+
+# --- 配置 ---
+DASHBOARD_WINDOW_HOURS = 72
+COINS = [(1, "BTC"), (2, "ETH")]
+COIN_NAMES = dict(COINS)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# 带查询参数时的默认 / 最大每页条数
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+# 小于该大小的响应不压缩
+MIN_COMPRESS_BYTES = 1024
+# SSE：没有变化时的心跳间隔 (秒)；检测到变化后稍等片刻，把同一批写入合并成一次推送
+STREAM_KEEPALIVE = 15
+STREAM_COALESCE_DELAY = 0.25
+
+
+# ==========================================
+# 🧹 单条新闻的整理 (原 main.py 中的 fetch_coin_data 逻辑)
+# ==========================================
+def _final_tag(item: Dict[str, Any]) -> int:
+    candidate_keys = ['newsTag', 'newTag', 'tag', 'trendTag']
+    for key in candidate_keys:
+        raw_val = item.get(key)
+        if raw_val is None or raw_val == "null" or str(raw_val).strip() == "":
+            continue
+        try:
+            val_int = int(float(raw_val))
+            # 只关心有意义的 Tag
+            if val_int in [1, 2, 3]:
+                return val_int
+        except (ValueError, TypeError):
+            continue
+    return 0
+
+
+def _structured_analysis(raw_analysis: str):
+    """解析 analysis JSON，返回 (结构化对象, 最新 24H 趋势, 最新 1H 短线)"""
+    try:
+        if not raw_analysis.strip().startswith("{"):
+            raise ValueError("Not JSON")
+        structured = json.loads(raw_analysis)
+        # 取 trend_signals / short_term_signals 列表的最后一个元素
+        trend = structured.get("trend_signals")
+        short_term = structured.get("short_term_signals")
+        latest_trend = trend[-1] if isinstance(trend, list) and trend else None
+        latest_short = short_term[-1] if isinstance(short_term, list) and short_term else None
+        return structured, latest_trend, latest_short
+    except (json.JSONDecodeError, ValueError, TypeError, AttributeError):
+        # 兼容旧数据格式 (非 JSON)
+        return {
+            "base_analysis": raw_analysis,
+            "trend_signals": [],
+            "short_term_signals": []
+        }, None, None
+
+
+def to_beijing_time(raw_time) -> Any:
+    """上游 UTC 时间 ("2025-12-18T12:00:00Z" / "2025-12-18 12:00:00.123") 转为北京时间字符串，解析失败保留原样"""
+    if not raw_time or not isinstance(raw_time, str):
+        return raw_time
+    try:
+        clean_time = raw_time.replace("T", " ").replace("Z", "").strip()
+        if "." in clean_time:
+            clean_time = clean_time.split(".")[0]
+        dt_obj = datetime.strptime(clean_time, "%Y-%m-%d %H:%M:%S")
+        return (dt_obj + timedelta(hours=8)).strftime("%Y-%m-%d %H:%M:%S")
+    except Exception as e:
+        print(f"⚠️ 时间解析错误 [{raw_time}]: {e}")
+        return raw_time
+
+
+def clean_news_item(item: Dict[str, Any], coin_name: str) -> Dict[str, Any]:
+    """把本地副本中的一条新闻整理成 Dashboard 需要的格式 (原地修改并返回)"""
+    item['coin_type'] = coin_name
+    item['newsTag'] = _final_tag(item)
+    item['summary'] = item.get('summary') or ""
+    # 列表显示的简略内容
+    item['display_content'] = item.get('summary') or item.get('title')
+
+    raw_analysis = item.get('analysis') or ""
+    structured, latest_trend, latest_short = _structured_analysis(raw_analysis)
+    item['latest_trend'] = latest_trend  # 最新的 24H 趋势对象
+    item['latest_short_term'] = latest_short  # 最新的 1H 短线对象
+    # 结构化后的对象挂载到 item 上，方便前端调用详情；同时保留原始 string
+    item['structured_analysis'] = structured
+    item['analysis'] = raw_analysis
+    return item
+
+
+def prepare_items(pairs) -> List[Tuple[float, Dict[str, Any]]]:
+    """[(coin_name, 新闻字典), ...] -> 整理后按时间倒序的 [(UTC 时间戳, 条目)]，条目时间转换为北京时间"""
+    entries = [(parse_api_timestamp(item.get('time')), clean_news_item(item, coin_name)) for coin_name, item in pairs]
+    entries.sort(key=lambda x: x[0], reverse=True)
+    for _, item in entries:
+        item['time'] = to_beijing_time(item.get('time'))
+    return entries
+
+
+_SCORE_RE = re.compile(r"(?:Score|score)\s*[:=\s]\s*([-\d\.]+)")
+_IMPACT_RE = re.compile(r"(?:Impact|impact)\s*[:=\s]\s*([A-Z]+)", re.IGNORECASE)
+
+
+def _extract_score(analysis: str) -> str:
+    match = _SCORE_RE.search(analysis or "")
+    try:
+        return f"{float(match.group(1)):.2f}" if match else "-"
+    except ValueError:
+        return "-"
+
+
+def _extract_impact(analysis: str) -> str:
+    match = _IMPACT_RE.search(analysis or "")
+    return match.group(1).upper() if match else ""
+
+
+def _compact_signal(signal) -> Optional[Dict[str, Any]]:
+    """信号只保留方向 / 置信度 / 时间，reasoning 与 chain_of_thought 走详情接口"""
+    if not isinstance(signal, dict):
+        return None
+    return {k: signal.get(k) for k in ("timestamp", "direction", "confidence")}
+
+
+def _short_term_history(item: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """1H 预测历史 (只保留时间和方向，供前端的准确率回看图使用)"""
+    signals = item['structured_analysis'].get("short_term_signals")
+    history = [{"timestamp": s.get("timestamp"), "direction": s.get("direction")}
+               for s in signals if isinstance(s, dict) and s.get("timestamp") and s.get("direction")] \
+        if isinstance(signals, list) else []
+    # 兼容旧 String 格式：方向取自 【1H_PREDICTION】 片段，时间由前端取新闻时间
+    if not history and "【1H_PREDICTION】" in item['analysis']:
+        try:
+            parts = item['analysis'].split("【1H_PREDICTION】:")[1].split("||")[0].split("|")
+            history.append({"timestamp": None, "direction": parts[1].strip().upper()})
+        except IndexError:
+            pass
+    return history
+
+
+def compact_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """列表视图的紧凑投影"""
+    return {
+        "objectId": item.get('objectId'),
+        "coin_type": item['coin_type'],
+        "time": item.get('time'),
+        "newsTag": item['newsTag'],
+        "title": item.get('title'),
+        "summary": item['summary'],
+        "link": item.get('link'),
+        "impact": _extract_impact(item['analysis']),
+        "score": _extract_score(item['analysis']),
+        "latest_trend": _compact_signal(item['latest_trend']),
+        "latest_short_term": _compact_signal(item['latest_short_term']),
+        "st_signals": _short_term_history(item),
+    }
+
+
+def _beijing_clock() -> str:
+    return (datetime.utcnow() + timedelta(hours=8)).strftime("%H:%M:%S")
+
+
+# ==========================================
+# 📦 快照
+# ==========================================
+def _dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class NewsIndex:
+    """
+    紧凑条目的内存索引：条目按时间倒序排列并预先序列化，另按 (币种, Tag) 分组保存位置列表
+    (None 表示不限)，每组附带升序的 -时间戳 数组，时间范围用二分查找定位。
+    """
+
+    def __init__(self, epochs: List[float], items: List[Dict[str, Any]]):
+        self.fragments = [_dumps(item) for item in items]
+        self._groups: Dict[Tuple[Optional[str], Optional[int]], Tuple[List[float], List[int]]] = {}
+        for pos, (epoch, item) in enumerate(zip(epochs, items)):
+            coin, tag = item['coin_type'], item['newsTag']
+            for key in ((None, None), (coin, None), (None, tag), (coin, tag)):
+                neg_epochs, positions = self._groups.setdefault(key, ([], []))
+                neg_epochs.append(-epoch)
+                positions.append(pos)
+
+    def query(self, coin: Optional[str] = None, tag: Optional[int] = None,
+              start: Optional[float] = None, end: Optional[float] = None) -> List[int]:
+        """返回满足条件的条目位置 (时间倒序)"""
+        neg_epochs, positions = self._groups.get((coin, tag), ([], []))
+        lo = bisect.bisect_left(neg_epochs, -end) if end is not None else 0
+        hi = bisect.bisect_right(neg_epochs, -start) if start is not None else len(neg_epochs)
+        return positions[lo:hi]
+
+    def data_bytes(self, positions: List[int] = None) -> bytes:
+        fragments = self.fragments if positions is None else [self.fragments[p] for p in positions]
+        return b"[" + b",".join(fragments) + b"]"
+
+
+@dataclass
+class DashboardSnapshot:
+    data_version: int
+    built_at: float
+    etag: str
+    total_count: int
+    body: bytes
+    gzip_body: Optional[bytes]
+    br_body: Optional[bytes]
+    index: NewsIndex
+
+    def encoded(self, accept_encoding: str):
+        """按客户端的 Accept-Encoding 选择响应体，返回 (body, content_encoding)"""
+        return _pick_encoding(accept_encoding, self.body, self.gzip_body, self.br_body)
+
+    def render_page(self, coin: Optional[str], tag: Optional[int], start: Optional[float],
+                    end: Optional[float], page: int, limit: int) -> Tuple[str, bytes]:
+        """按查询参数从索引中取出一页，返回 (ETag, 响应字节)"""
+        positions = self.index.query(coin, tag, start, end)
+        offset = (page - 1) * limit
+        query_key = f"{self.etag}|{coin}|{tag}|{start}|{end}|{page}|{limit}"
+        etag = 'W/"' + hashlib.blake2b(query_key.encode("utf-8"), digest_size=12).hexdigest() + '"'
+        body = b"".join([
+            b'{"updated_at":', _dumps(_beijing_clock()),
+            b',"cursor":', str(self.data_version).encode("utf-8"),
+            b',"total_count":', str(len(positions)).encode("utf-8"),
+            b',"page":', str(page).encode("utf-8"),
+            b',"limit":', str(limit).encode("utf-8"),
+            b',"data":', self.index.data_bytes(positions[offset:offset + limit]), b"}",
+        ])
+        return etag, body
+
+
+def _accepted_encodings(accept_encoding: str) -> set:
+    return {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+
+
+def _pick_encoding(accept_encoding: str, body: bytes, gzip_body: Optional[bytes], br_body: Optional[bytes]):
+    accepted = _accepted_encodings(accept_encoding)
+    if "br" in accepted and br_body is not None:
+        return br_body, "br"
+    if "gzip" in accepted and gzip_body is not None:
+        return gzip_body, "gzip"
+    return body, None
+
+
+def encode_for(accept_encoding: str, body: bytes):
+    """即时压缩 (分页等临时生成的响应)，返回 (body, content_encoding)"""
+    if len(body) >= MIN_COMPRESS_BYTES and "gzip" in _accepted_encodings(accept_encoding):
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def _serialize(entries: List[Tuple[float, Dict[str, Any]]], data_version: int,
+               previous: Optional[DashboardSnapshot]):
+    """在线程中执行：生成紧凑投影和索引、序列化、计算内容哈希、压缩"""
+    epochs = [epoch for epoch, _ in entries]
+    index = NewsIndex(epochs, [compact_item(item) for _, item in entries])
+    data_bytes = index.data_bytes()
+    etag = 'W/"' + hashlib.blake2b(data_bytes, digest_size=12).hexdigest() + '"'
+    if previous is not None and previous.etag == etag:
+        return None  # 内容未变，沿用旧快照
+
+    body = b"".join([
+        b'{"updated_at":', _dumps(_beijing_clock()),
+        b',"cursor":', str(data_version).encode("utf-8"),
+        b',"total_count":', str(len(entries)).encode("utf-8"),
+        b',"data":', data_bytes, b"}",
+    ])
+    compress = len(body) >= MIN_COMPRESS_BYTES
+    return DashboardSnapshot(
+        data_version=data_version,
+        built_at=time.time(),
+        etag=etag,
+        total_count=len(entries),
+        body=body,
+        gzip_body=gzip.compress(body, compresslevel=GZIP_LEVEL) if compress else None,
+        br_body=brotli.compress(body, quality=BROTLI_QUALITY) if compress and brotli is not None else None,
+        index=index,
+    )
+
+
+class DashboardSnapshotStore:
+    """
+    快照的 stale-while-revalidate 缓存：
+    - 新鲜 (数据版本未变且未超过软过期 soft_ttl)：直接返回
+    - 已过期但未超过硬过期 hard_ttl：立即返回旧快照，同时触发一次后台刷新
+    - 没有快照或超过硬过期：等待刷新完成
+    任意时刻最多只有一个刷新任务 (single-flight)，所有请求共享它的结果。
+    """
+
+    def __init__(self, soft_ttl: float, hard_ttl: float, refresh_min_interval: float = 1.0):
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = max(hard_ttl, soft_ttl)
+        self.refresh_min_interval = refresh_min_interval
+        self.current: Optional[DashboardSnapshot] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+        self.builds = 0
+        self.unchanged_builds = 0
+        self.last_build_s = 0.0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._refresh_durations: List[float] = []
+        self.fresh_served = 0
+        self.stale_served = 0
+        self.waited = 0
+        self._stale_ages: List[float] = []
+
+    def _is_fresh(self) -> bool:
+        snapshot = self.current
+        return (snapshot is not None
+                and snapshot.data_version == news_store.data_version()
+                and time.time() - snapshot.built_at < self.soft_ttl)
+
+    def trigger_refresh(self) -> asyncio.Task:
+        """启动一次刷新；已有刷新在进行时返回同一个任务"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return self._refresh_task
+
+    async def _refresh(self) -> bool:
+        start = time.perf_counter()
+        try:
+            await self._rebuild()
+            return True
+        except Exception as e:
+            self.refresh_errors += 1
+            print(f"❌ [DashboardSnapshot] 刷新失败: {e}")
+            return False
+        finally:
+            self.refreshes += 1
+            self._refresh_durations = (self._refresh_durations + [time.perf_counter() - start])[-200:]
+
+    async def get(self) -> DashboardSnapshot:
+        snapshot = self.current
+        if snapshot is not None and self._is_fresh():
+            self.fresh_served += 1
+            return snapshot
+
+        task = self.trigger_refresh()
+        age = time.time() - snapshot.built_at if snapshot is not None else None
+        if age is not None and age < self.hard_ttl:
+            # 先返回旧快照，刷新在后台完成
+            self.stale_served += 1
+            self._stale_ages = (self._stale_ages + [age])[-200:]
+            return snapshot
+
+        # 没有快照或已超过硬过期：等待共享的刷新任务 (shield：请求取消不会打断刷新)
+        self.waited += 1
+        await asyncio.shield(task)
+        if self.current is None:
+            raise RuntimeError("dashboard snapshot unavailable")
+        return self.current
+
+    async def run_refresher(self):
+        """后台刷新 (由 main.py 的 lifespan 启动)：数据一变化就主动重建，请求几乎总能直接拿到新快照"""
+        while True:
+            try:
+                version = self.current.data_version if self.current else -1
+                await news_store.wait_for_change(version, timeout=self.soft_ttl)
+                if not self._is_fresh():
+                    ok = await asyncio.shield(self.trigger_refresh())
+                    # 同一批写入会连续改变版本，两次刷新之间至少间隔 refresh_min_interval
+                    await asyncio.sleep(self.refresh_min_interval if ok else max(self.refresh_min_interval, 5))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ [DashboardSnapshot] 后台刷新出错: {e}")
+                await asyncio.sleep(5)
+
+    async def _rebuild(self):
+        start = time.perf_counter()
+        data_version = news_store.data_version()
+        end_time = datetime.utcnow()
+        start_time = end_time - timedelta(hours=DASHBOARD_WINDOW_HOURS)
+
+        results = await asyncio.gather(*(news_store.query_range(ct, start_time, end_time) for ct, _ in COINS))
+        entries = prepare_items(
+            (coin_name, item) for (_, coin_name), items in zip(COINS, results) for item in items
+        )
+
+        snapshot = await asyncio.to_thread(_serialize, entries, data_version, self.current)
+        self.builds += 1
+        if snapshot is None:
+            # 内容没变：只刷新版本和构建时间，ETag 与响应字节保持不变
+            self.unchanged_builds += 1
+            self.current.data_version = data_version
+            self.current.built_at = time.time()
+        else:
+            self.current = snapshot
+        self.last_build_s = time.perf_counter() - start
+
+    def stats(self) -> dict:
+        snapshot = self.current
+        durations, stale_ages = self._refresh_durations, self._stale_ages
+        return {
+            "stream_clients": stream_clients,
+            "deltas_served": DELTA_STATS["served"],
+            "avg_delta_bytes": round(DELTA_STATS["bytes"] / DELTA_STATS["served"]) if DELTA_STATS["served"] else 0,
+            "builds": self.builds,
+            "unchanged_builds": self.unchanged_builds,
+            "last_build_s": round(self.last_build_s, 3),
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "refreshing": self._refresh_task is not None and not self._refresh_task.done(),
+            "avg_refresh_s": round(sum(durations) / len(durations), 3) if durations else 0.0,
+            "max_refresh_s": round(max(durations), 3) if durations else 0.0,
+            "fresh_served": self.fresh_served,
+            "stale_served": self.stale_served,
+            "waited": self.waited,
+            "avg_stale_age_s": round(sum(stale_ages) / len(stale_ages), 2) if stale_ages else 0.0,
+            "max_stale_age_s": round(max(stale_ages), 2) if stale_ages else 0.0,
+            "data_version": snapshot.data_version if snapshot else None,
+            "etag": snapshot.etag if snapshot else None,
+            "age_s": round(time.time() - snapshot.built_at, 1) if snapshot else None,
+            "items": snapshot.total_count if snapshot else 0,
+            "bytes": len(snapshot.body) if snapshot else 0,
+            "gzip_bytes": len(snapshot.gzip_body) if snapshot and snapshot.gzip_body else 0,
+            "br_bytes": len(snapshot.br_body) if snapshot and snapshot.br_body else 0,
+        }
+
+
+dashboard_snapshots = DashboardSnapshotStore(
+    soft_ttl=settings.DASHBOARD_SOFT_TTL,
+    hard_ttl=settings.DASHBOARD_HARD_TTL,
+)
+
+
+# ==========================================
+# 🔁 增量接口与 SSE 推送
+# ==========================================
+DELTA_STATS = {"served": 0, "bytes": 0}
+stream_clients = 0
+
+
+async def build_news_detail(object_id: str) -> Optional[Dict[str, Any]]:
+    """单条新闻的完整内容 (analysis 原文、结构化分析及全部信号历史、正文)，供详情接口按需加载"""
+    location = await news_store.get_item_location(object_id)
+    item = await news_store.get_item(object_id)
+    if item is None:
+        return None
+    coin_type = location["coin_type"] if location else None
+    (_, detail), = prepare_items([(COIN_NAMES.get(coin_type, str(coin_type)), item)])
+    return detail
+
+
+async def build_delta(since: int) -> Dict[str, Any]:
+    """
+    返回游标 since 之后新增 / 更新的条目 (与全量接口相同的紧凑投影) 和其中携带的最新信号。
+    since 大于当前版本 (服务端数据被重置) 时返回 reset=True，客户端应重新拉取全量。
+    """
+    cursor = news_store.data_version()
+    delta = {"updated_at": _beijing_clock(), "cursor": cursor, "reset": since > cursor, "items": [], "signals": []}
+    if since >= cursor:
+        return delta
+
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(hours=DASHBOARD_WINDOW_HOURS)
+    rows = await news_store.query_changed_since(since, start_time, end_time)
+    items = [compact_item(item) for _, item in
+             prepare_items((COIN_NAMES.get(ct, str(ct)), item) for ct, _, item in rows)]
+    delta["items"] = items
+    delta["signals"] = [
+        {
+            "objectId": item.get('objectId'),
+            "coin_type": item.get('coin_type'),
+            "latest_trend": item.get('latest_trend'),
+            "latest_short_term": item.get('latest_short_term'),
+        }
+        for item in items if item.get('latest_trend') or item.get('latest_short_term')
+    ]
+    return delta
+
+
+def encode_delta(delta: Dict[str, Any]) -> bytes:
+    body = json.dumps(delta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    DELTA_STATS["served"] += 1
+    DELTA_STATS["bytes"] += len(body)
+    return body
+
+
+async def delta_events(since: int, is_disconnected: Callable[[], Awaitable[bool]]) -> AsyncIterator[str]:
+    """
+    SSE 事件流：本地副本一有变化就推送一条 delta 事件 (id 为新游标，断线重连时通过 Last-Event-ID 续传)，
+    空闲时每 STREAM_KEEPALIVE 秒发送一次心跳注释。
+    """
+    global stream_clients
+    stream_clients += 1
+    cursor = since
+    try:
+        yield "retry: 3000\n\n"
+        while not await is_disconnected():
+            if not await news_store.wait_for_change(cursor, STREAM_KEEPALIVE):
+                yield ": keepalive\n\n"
+                continue
+            await asyncio.sleep(STREAM_COALESCE_DELAY)
+            delta = await build_delta(cursor)
+            cursor = delta["cursor"]
+            if delta["items"] or delta["reset"]:
+                yield f"id: {cursor}\nevent: delta\ndata: {encode_delta(delta).decode('utf-8')}\n\n"
+    finally:
+        stream_clients -= 1
@@ -1,4 +1,5 @@
 # src/core/database.py
+from sqlalchemy import inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from config.settings import settings
 from src.core.models import Base  # 导入你的模型 Base
@@ -20,6 +21,28 @@ async def close_db_pool():
     print("Closing SQLAlchemy Engine.")
     await engine.dispose()
 
+def _add_missing_columns(sync_conn):
+    """
+    create_all 不会给已存在的表补列：这里为旧库补上后来新增的可空列及其索引 (轻量迁移)
+    """
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        added = set()
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            col_type = column.type.compile(dialect=sync_conn.dialect)
+            sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+            added.add(column.name)
+            print(f"🛠️ [Database] {table.name} 新增列 {column.name}")
+        for index in table.indexes:
+            if added.intersection(c.name for c in index.columns):
+                index.create(sync_conn, checkfirst=True)
+
+
 async def create_tables():
     """
     (新) 在启动时创建所有 SQLAlchemy 模型对应的表
@@ -28,4 +51,19 @@ async def create_tables():
         # 这会查看所有继承自 Base 的类并创建它们
         # 'IF NOT EXISTS' 是隐式包含的
         await conn.run_sync(Base.metadata.create_all)
-    print("SQLAlchemy tables checked/created successfully.")
\ No newline at end of file
+        await conn.run_sync(_add_missing_columns)
+    print("SQLAlchemy tables checked/created successfully.")
+
+
+_tables_ready = False
+
+
+async def ensure_tables():
+    """
+    确保表已创建 (进程内只执行一次)，供脱离 FastAPI 独立运行的模块调用
+    """
+    global _tables_ready
+    if _tables_ready:
+        return
+    await create_tables()
+    _tables_ready = True
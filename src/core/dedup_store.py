@@ -0,0 +1,283 @@
+# src/core/dedup_store.py
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Iterable, List, Set
+
+from sqlalchemy import select, delete, update
+from sqlalchemy.exc import IntegrityError
+
+from config.settings import settings
+from src.core.database import async_session, ensure_tables
+from src.core.models import SeenNews
+
+# 单次 IN 查询的最大 ID 数，避免 SQL 语句过长
+_SQL_CHUNK_SIZE = 500
+
+
+class DedupStore(ABC):
+    """
+    去重索引接口。
+    claim_many 是原子的 "占用" 语义：返回本次新占用的 ID，
+    已被本进程或其他副本占用 (且未过期) 的 ID 不会出现在结果中。
+
+    占用分两步：claim_many 只拿一个短租约 (lease_seconds)，处理中途崩溃 / 重启 / 被取消时，
+    租约到期后这些 ID 会被重新占用处理；Pipeline 或重试队列接手之后再调用 confirm_many 延长到完整 TTL。
+    """
+
+    @abstractmethod
+    async def claim_many(self, object_ids: Iterable[str]) -> Set[str]:
+        ...
+
+    @abstractmethod
+    async def confirm_many(self, object_ids: Iterable[str]):
+        ...
+
+    @abstractmethod
+    async def contains(self, object_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def purge_expired(self) -> int:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryDedupStore(DedupStore):
+    """
+    进程内 LRU + TTL 去重集合，条目数不超过 capacity。
+    """
+
+    def __init__(self, ttl_seconds: float, capacity: int, lease_seconds: float = None):
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds or ttl_seconds
+        self.capacity = capacity
+        self._entries: "OrderedDict[str, float]" = OrderedDict()  # object_id -> expires_at
+        self.hits = 0
+        self.misses = 0
+
+    def remember(self, object_id: str, expires_at: float):
+        self._entries[object_id] = expires_at
+        self._entries.move_to_end(object_id)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def seen(self, object_id: str, now: float = None) -> bool:
+        now = now or time.time()
+        expires_at = self._entries.get(object_id)
+        if expires_at is None:
+            self.misses += 1
+            return False
+        if expires_at <= now:
+            del self._entries[object_id]
+            self.misses += 1
+            return False
+        self._entries.move_to_end(object_id)
+        self.hits += 1
+        return True
+
+    async def claim_many(self, object_ids: Iterable[str]) -> Set[str]:
+        now = time.time()
+        claimed = set()
+        for oid in object_ids:
+            if not oid or self.seen(oid, now):
+                continue
+            self.remember(oid, now + self.lease_seconds)
+            claimed.add(oid)
+        return claimed
+
+    async def confirm_many(self, object_ids: Iterable[str]):
+        expires_at = time.time() + self.ttl_seconds
+        for oid in object_ids:
+            if oid in self._entries:
+                self.remember(oid, expires_at)
+
+    async def contains(self, object_id: str) -> bool:
+        return self.seen(object_id)
+
+    async def purge_expired(self) -> int:
+        now = time.time()
+        expired = [oid for oid, exp in self._entries.items() if exp <= now]
+        for oid in expired:
+            del self._entries[oid]
+        return len(expired)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "lease_seconds": self.lease_seconds,
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class SQLDedupStore(DedupStore):
+    """
+    基于 SQLAlchemy (DATABASE_URL) 的持久化去重索引。
+    - 前置一个有界的进程内最近窗口，热数据 O(1) 命中，不访问数据库
+    - 未命中的 ID 每轮只需一次批量 IN 查询
+    - 多个采集副本指向同一数据库时，主键冲突保证同一条新闻只被一个副本占用
+    """
+
+    def __init__(self, session_factory, ttl_seconds: float, cache_capacity: int, lease_seconds: float = None):
+        self._session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds or ttl_seconds
+        self._recent = MemoryDedupStore(ttl_seconds, cache_capacity, self.lease_seconds)
+        self.db_errors = 0
+
+    async def claim_many(self, object_ids: Iterable[str]) -> Set[str]:
+        now = time.time()
+        candidates: List[str] = []
+        for oid in dict.fromkeys(object_ids):
+            if oid and not self._recent.seen(oid, now):
+                candidates.append(oid)
+        if not candidates:
+            return set()
+
+        claimed: Set[str] = set()
+        try:
+            await ensure_tables()
+            for i in range(0, len(candidates), _SQL_CHUNK_SIZE):
+                chunk = candidates[i:i + _SQL_CHUNK_SIZE]
+                claimed |= await self._claim_chunk(SeenNews, chunk, now)
+        except Exception as e:
+            # 数据库不可用时降级为进程内去重，保证采集不中断
+            self.db_errors += 1
+            print(f"⚠️ [DedupStore] DB 不可用，降级为内存去重: {e}")
+            fallback = await self._recent.claim_many(c for c in candidates if c not in claimed)
+            return claimed | fallback
+
+        for oid in claimed:
+            self._recent.remember(oid, now + self.lease_seconds)
+        return claimed
+
+    async def _claim_chunk(self, model, chunk: List[str], now: float) -> Set[str]:
+        expires_at = now + self.lease_seconds
+        async with self._session_factory() as session:
+            result = await session.execute(
+                select(model.object_id, model.expires_at).where(model.object_id.in_(chunk)))
+            existing = {oid: exp for oid, exp in result.all()}
+
+            attempted, claimed, inserts = [], set(), []
+            for oid in chunk:
+                row_expires_at = existing.get(oid)
+                if row_expires_at is None:
+                    inserts.append(oid)
+                elif row_expires_at <= now:
+                    attempted.append(oid)
+                    if await self._renew_expired(session, model, oid, now, expires_at):
+                        claimed.add(oid)
+                else:
+                    # 已被占用：同步到本地窗口，下次直接命中
+                    self._recent.remember(oid, row_expires_at)
+            # 先完成过期行的条件 UPDATE 再登记插入，避免 UPDATE 前的自动 flush 提前触发主键冲突
+            for oid in inserts:
+                session.add(model(object_id=oid, seen_at=now, expires_at=expires_at))
+                attempted.append(oid)
+                claimed.add(oid)
+
+            try:
+                await session.commit()
+                return claimed
+            except IntegrityError:
+                # 其他副本同时插入了部分 ID，回滚后逐条占用 (回滚也撤销了过期行的续期，需要重新走一遍)
+                await session.rollback()
+
+        return await self._claim_one_by_one(model, attempted, now)
+
+    @staticmethod
+    async def _renew_expired(session, model, oid: str, now: float, expires_at: float) -> bool:
+        """条件 UPDATE 重新占用已过期的行；多个副本同时续期时只有一个能改成功"""
+        result = await session.execute(
+            update(model)
+            .where(model.object_id == oid, model.expires_at <= now)
+            .values(seen_at=now, expires_at=expires_at)
+        )
+        return bool(result.rowcount)
+
+    async def _claim_one_by_one(self, model, object_ids: List[str], now: float) -> Set[str]:
+        expires_at = now + self.lease_seconds
+        claimed = set()
+        for oid in object_ids:
+            async with self._session_factory() as session:
+                # 先尝试续期已过期的行，行不存在时再插入
+                if await self._renew_expired(session, model, oid, now, expires_at):
+                    await session.commit()
+                    claimed.add(oid)
+                    continue
+                session.add(model(object_id=oid, seen_at=now, expires_at=expires_at))
+                try:
+                    await session.commit()
+                    claimed.add(oid)
+                except IntegrityError:
+                    await session.rollback()
+        return claimed
+
+    async def confirm_many(self, object_ids: Iterable[str]):
+        ids = [oid for oid in dict.fromkeys(object_ids) if oid]
+        if not ids:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        await self._recent.confirm_many(ids)
+        try:
+            await ensure_tables()
+            async with self._session_factory() as session:
+                for i in range(0, len(ids), _SQL_CHUNK_SIZE):
+                    chunk = ids[i:i + _SQL_CHUNK_SIZE]
+                    await session.execute(
+                        update(SeenNews).where(SeenNews.object_id.in_(chunk)).values(expires_at=expires_at))
+                await session.commit()
+        except Exception as e:
+            # 续期失败时租约到期后会被重新处理 (重复处理一次，不会丢失)
+            self.db_errors += 1
+            print(f"⚠️ [DedupStore] 租约续期失败: {e}")
+
+    async def contains(self, object_id: str) -> bool:
+        if self._recent.seen(object_id):
+            return True
+        await ensure_tables()
+        async with self._session_factory() as session:
+            row = await session.get(SeenNews, object_id)
+            if row is not None and row.expires_at > time.time():
+                self._recent.remember(object_id, row.expires_at)
+                return True
+        return False
+
+    async def purge_expired(self) -> int:
+        await self._recent.purge_expired()
+        await ensure_tables()
+        async with self._session_factory() as session:
+            result = await session.execute(delete(SeenNews).where(SeenNews.expires_at <= time.time()))
+            await session.commit()
+            return result.rowcount or 0
+
+    def stats(self) -> dict:
+        recent = self._recent.stats()
+        return {
+            "backend": "sql",
+            "lease_seconds": self.lease_seconds,
+            "recent_size": recent["size"],
+            "recent_capacity": recent["capacity"],
+            "recent_hits": recent["hits"],
+            "recent_misses": recent["misses"],
+            "db_errors": self.db_errors,
+        }
+
+
+def create_dedup_store(backend: str = None) -> DedupStore:
+    """
+    根据配置创建去重索引 (DEDUP_BACKEND: sql / memory)
+    """
+    backend = (backend or settings.DEDUP_BACKEND).lower()
+    ttl_seconds = settings.DEDUP_TTL_HOURS * 3600
+    lease_seconds = settings.DEDUP_LEASE_MINUTES * 60
+    if backend == "memory":
+        return MemoryDedupStore(ttl_seconds, settings.DEDUP_MEMORY_CAPACITY, lease_seconds)
+    if backend == "sql":
+        return SQLDedupStore(async_session, ttl_seconds, settings.DEDUP_MEMORY_CAPACITY, lease_seconds)
+    raise ValueError(f"Unknown DEDUP_BACKEND: {backend}")
@@ -0,0 +1,187 @@
+# src/core/http_client.py
+"""
+全局共享的 httpx 连接池。
+
+每个上游主机一个长连接 AsyncClient (keep-alive)，避免每次请求重新做 TCP/TLS 握手。
+由 main.py 的 lifespan 统一创建和关闭；脱离 FastAPI 独立运行时会在首次使用时懒加载。
+
+用法:
+    client = get_http_client(FETCH_API_URL)
+    resp = await client.post(FETCH_API_URL, json=..., timeout=endpoint_timeout(FETCH_API_URL))
+"""
+from typing import Callable, Dict
+from urllib.parse import urlsplit
+
+import httpx
+
+from config.settings import settings
+
+# --- 每个主机的连接池上限 ---
+CRAWL_CLIENT_KEY = "crawler"
+HOST_POOL_LIMITS: Dict[str, dict] = {
+    # dataCenter 主机 (默认 api.ibyteai.com，可通过 DATACENTER_BASE_URL 指向本地模拟服务)
+    urlsplit(settings.DATACENTER_BASE_URL).hostname: {"max_connections": 20, "max_keepalive_connections": 10},
+    "api.binance.com": {"max_connections": 10, "max_keepalive_connections": 5},
+    "api.taapi.io": {"max_connections": 4, "max_keepalive_connections": 2},
+    # 爬虫静态抓取共用一个客户端 (目标是任意新闻站点，不按主机拆分)
+    CRAWL_CLIENT_KEY: {"max_connections": 20, "max_keepalive_connections": 10},
+}
+DEFAULT_POOL_LIMITS = {"max_connections": 10, "max_keepalive_connections": 5}
+KEEPALIVE_EXPIRY = 30.0
+
+# --- 按接口路径 (URL 结尾) 配置超时 (秒) ---
+ENDPOINT_TIMEOUTS: Dict[str, float] = {
+    "/fetchCryptoPanic": 15.0,
+    "/updatePanicNews": 10.0,
+    "/api/v3/klines": 10.0,
+    "/candles": 10.0,
+}
+DEFAULT_TIMEOUT = 10.0
+
+
+def endpoint_timeout(url: str) -> httpx.Timeout:
+    path = urlsplit(url).path.rstrip("/")
+    seconds = DEFAULT_TIMEOUT
+    for suffix, value in ENDPOINT_TIMEOUTS.items():
+        if path.endswith(suffix):
+            seconds = value
+            break
+    # 连接超时单独收紧，池等待时间与读超时一致
+    return httpx.Timeout(seconds, connect=min(5.0, seconds))
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """响应体关闭时回调一次 (连接此时才归还给连接池)"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+class _CountingTransport(httpx.AsyncBaseTransport):
+    """
+    包在 AsyncHTTPTransport 外面，统计每个主机进行中的请求 (从发出到响应体关闭，包括等待连接池的时间)。
+    只依赖 httpx 的公开传输接口，不读取连接池内部状态。
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, registry: "HttpClientRegistry", host: str):
+        self._transport = transport
+        self._registry = registry
+        self._host = host
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._registry._request_started(self._host)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._registry._request_finished(self._host)
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, lambda: self._registry._request_finished(self._host)),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class HttpClientRegistry:
+    """
+    按主机维护 AsyncClient，并统计请求数与进行中的请求。
+    """
+
+    def __init__(self, http2: bool = False):
+        self.http2 = http2
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._request_counts: Dict[str, int] = {}
+        self._in_flight: Dict[str, int] = {}
+
+    def _request_started(self, host: str):
+        self._request_counts[host] = self._request_counts.get(host, 0) + 1
+        self._in_flight[host] = self._in_flight.get(host, 0) + 1
+
+    def _request_finished(self, host: str):
+        self._in_flight[host] = max(0, self._in_flight.get(host, 0) - 1)
+
+    def _create_client(self, host: str) -> httpx.AsyncClient:
+        limits = HOST_POOL_LIMITS.get(host, DEFAULT_POOL_LIMITS)
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(keepalive_expiry=KEEPALIVE_EXPIRY, **limits),
+            http2=self.http2,
+        )
+        return httpx.AsyncClient(
+            transport=_CountingTransport(transport, self, host),
+            timeout=DEFAULT_TIMEOUT,
+        )
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        host = urlsplit(url).hostname or "default"
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = self._create_client(host)
+            self._clients[host] = client
+        return client
+
+    def start(self):
+        """预先为已知主机建立客户端 (连接本身仍是按需建立的)"""
+        for host in HOST_POOL_LIMITS:
+            self.get(f"http://{host}/")
+        print(f"✅ [HttpClients] 已初始化 {len(self._clients)} 个连接池 (HTTP/2: {self.http2})")
+
+    async def aclose(self):
+        for client in self._clients.values():
+            try:
+                await client.aclose()
+            except Exception as e:
+                print(f"⚠️ [HttpClients] 关闭连接池失败: {e}")
+        self._clients.clear()
+
+    def stats(self) -> dict:
+        result = {}
+        for host in self._clients:
+            max_connections = HOST_POOL_LIMITS.get(host, DEFAULT_POOL_LIMITS)["max_connections"]
+            in_flight = self._in_flight.get(host, 0)
+            # 进行中的请求超过连接上限的部分在等待连接池 (HTTP/2 多路复用时只是近似值)
+            active = min(in_flight, max_connections)
+            result[host] = {
+                "max_connections": max_connections,
+                "in_flight": in_flight,
+                "active_connections": active,
+                "queued_requests": in_flight - active,
+                "utilization": round(active / max_connections, 3),
+                "requests_total": self._request_counts.get(host, 0),
+            }
+        return result
+
+
+http_clients = HttpClientRegistry(http2=settings.HTTP_ENABLE_HTTP2 and _http2_available())
+
+
+def get_http_client(url: str) -> httpx.AsyncClient:
+    return http_clients.get(url)
+
+
+def get_crawl_client() -> httpx.AsyncClient:
+    return http_clients.get(f"http://{CRAWL_CLIENT_KEY}/")
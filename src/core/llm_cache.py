@@ -0,0 +1,225 @@
+# src/core/llm_cache.py
+"""
+LLM 结构化输出的持久化缓存。
+
+同一条通稿常以不同 objectId 重复出现，mark_as_failed 之后也会被再次分析，
+按 (模型, 提示词版本, 归一化内容哈希) 缓存结构化输出，避免重复支付 LLM 的延迟和费用。
+
+- 前置一个进程内 LRU，热数据不访问数据库
+- 持久层使用 DATABASE_URL (表 llm_cache)，按 TTL 过期，总行数超过上限时淘汰最久未命中的条目
+- 数据库不可用时降级为纯内存缓存
+
+用法:
+    response = await llm_cache.cached_ainvoke(
+        chain, {"content": ..., "source": ...},
+        model=llm.model_name, prompt_version=PROMPT_VERSION,
+        cache_text=content, schema=FilterOutput,
+    )
+修改提示词或输出结构时请同时提升 prompt_version，旧缓存会自然失效。
+"""
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy import select, delete, func
+
+from config.settings import settings
+from src.core.database import async_session, ensure_tables
+from src.core.llm_limits import model_slot
+from src.core.models import LLMCacheEntry
+
+# 过期清理 / 行数淘汰的间隔 (秒)
+PURGE_INTERVAL = 3600
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_content(text: str) -> str:
+    """
+    归一化内容：全角转半角、统一小写、合并空白。
+    仅排版不同的同一篇通稿会得到相同的哈希。
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+def make_cache_key(model: str, prompt_version: str, text: str) -> str:
+    digest = hashlib.sha256(normalize_content(text).encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model}|{prompt_version}|{digest}".encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, session_factory, ttl_seconds: float, memory_capacity: int,
+                 max_rows: int, enabled: bool = True):
+        self._session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self.memory_capacity = memory_capacity
+        self.max_rows = max_rows
+        self.enabled = enabled
+        # cache_key -> (expires_at, response json)
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._last_purge = 0.0
+        self.stats_by_model: Dict[str, Dict[str, int]] = {}
+        self.db_errors = 0
+
+    # --- 统计 ---
+    def _count(self, model: str, field: str):
+        entry = self.stats_by_model.setdefault(
+            model, {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0})
+        entry[field] += 1
+
+    # --- 进程内 LRU ---
+    def _remember(self, key: str, expires_at: float, response_json: str):
+        self._memory[key] = (expires_at, response_json)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_capacity:
+            self._memory.popitem(last=False)
+
+    def _memory_get(self, key: str, now: float) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return entry[1]
+
+    # --- 读写 ---
+    async def get(self, model: str, prompt_version: str, text: str,
+                  schema: Type[BaseModel]) -> Optional[BaseModel]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        key = make_cache_key(model, prompt_version, text)
+
+        response_json = self._memory_get(key, now)
+        if response_json is not None:
+            self._count(model, "memory_hits")
+            return schema.model_validate_json(response_json)
+
+        try:
+            await ensure_tables()
+            async with self._session_factory() as session:
+                row = await session.get(LLMCacheEntry, key)
+                if row is not None and row.expires_at > now:
+                    row.hits += 1
+                    row.last_hit_at = now
+                    await session.commit()
+                    self._remember(key, row.expires_at, row.response)
+                    self._count(model, "db_hits")
+                    return schema.model_validate_json(row.response)
+        except Exception as e:
+            self.db_errors += 1
+            print(f"⚠️ [LLMCache] 读取失败，按未命中处理: {e}")
+
+        self._count(model, "misses")
+        return None
+
+    async def put(self, model: str, prompt_version: str, text: str,
+                  response: BaseModel, ttl_seconds: float = None):
+        if not self.enabled:
+            return
+        now = time.time()
+        key = make_cache_key(model, prompt_version, text)
+        expires_at = now + (ttl_seconds or self.ttl_seconds)
+        response_json = response.model_dump_json()
+        self._remember(key, expires_at, response_json)
+        self._count(model, "stores")
+
+        try:
+            await ensure_tables()
+            async with self._session_factory() as session:
+                row = await session.get(LLMCacheEntry, key)
+                if row is None:
+                    session.add(LLMCacheEntry(
+                        cache_key=key, model=model, prompt_version=prompt_version,
+                        response=response_json, created_at=now, last_hit_at=now,
+                        expires_at=expires_at, hits=0,
+                    ))
+                else:
+                    row.response = response_json
+                    row.expires_at = expires_at
+                    row.last_hit_at = now
+                await session.commit()
+        except Exception as e:
+            # 并发写入同一 key 或数据库不可用，内存中已保存，忽略即可
+            self.db_errors += 1
+            print(f"⚠️ [LLMCache] 写入失败: {e}")
+
+        await self.purge_if_due()
+
+    async def cached_ainvoke(self, chain, inputs: Dict[str, Any], *, model: str, prompt_version: str,
+                             cache_text: str, schema: Type[BaseModel], ttl_seconds: float = None):
+        """
+        先查缓存，未命中时在模型并发槽位内调用 chain，并把结果写回缓存。
+        cache_text 是决定输出的内容 (通常不含来源链接)，用于计算缓存键。
+        """
+        cached = await self.get(model, prompt_version, cache_text, schema)
+        if cached is not None:
+            return cached
+
+        async with model_slot(model):
+            response = await chain.ainvoke(inputs)
+
+        if isinstance(response, BaseModel):
+            await self.put(model, prompt_version, cache_text, response, ttl_seconds)
+        return response
+
+    # --- 淘汰 ---
+    async def purge_if_due(self):
+        now = time.time()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        try:
+            removed = await self.purge()
+            if removed:
+                print(f"🧹 [LLMCache] 清理过期/超额条目: {removed}")
+        except Exception as e:
+            print(f"⚠️ [LLMCache] 清理失败: {e}")
+
+    async def purge(self) -> int:
+        now = time.time()
+        for key in [k for k, (exp, _) in self._memory.items() if exp <= now]:
+            del self._memory[key]
+
+        await ensure_tables()
+        async with self._session_factory() as session:
+            result = await session.execute(delete(LLMCacheEntry).where(LLMCacheEntry.expires_at <= now))
+            removed = result.rowcount or 0
+
+            total = (await session.execute(select(func.count()).select_from(LLMCacheEntry))).scalar() or 0
+            overflow = total - self.max_rows
+            if overflow > 0:
+                # 超出行数上限：淘汰最久未命中的条目 (LRU)
+                oldest = select(LLMCacheEntry.cache_key).order_by(LLMCacheEntry.last_hit_at).limit(overflow)
+                result = await session.execute(delete(LLMCacheEntry).where(LLMCacheEntry.cache_key.in_(oldest)))
+                removed += result.rowcount or 0
+            await session.commit()
+        return removed
+
+    def stats(self) -> dict:
+        hits = sum(s["memory_hits"] + s["db_hits"] for s in self.stats_by_model.values())
+        lookups = hits + sum(s["misses"] for s in self.stats_by_model.values())
+        return {
+            "enabled": self.enabled,
+            "memory_size": len(self._memory),
+            "memory_capacity": self.memory_capacity,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "by_model": self.stats_by_model,
+            "db_errors": self.db_errors,
+        }
+
+
+llm_cache = LLMResponseCache(
+    async_session,
+    ttl_seconds=settings.LLM_CACHE_TTL_HOURS * 3600,
+    memory_capacity=settings.LLM_CACHE_MEMORY_CAPACITY,
+    max_rows=settings.LLM_CACHE_MAX_ROWS,
+    enabled=settings.LLM_CACHE_ENABLED,
+)
@@ -0,0 +1,60 @@
+# src/core/llm_limits.py
+import asyncio
+from typing import Dict
+
+from config.settings import settings
+
+
+class ModelSlot:
+    """
+    单个模型的并发槽位：信号量 + 占用 / 排队计数 (asyncio.Semaphore 没有公开的计数接口)。
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_use = 0
+        self.waiting = 0
+
+    async def __aenter__(self):
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_use += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_use -= 1
+        self._semaphore.release()
+
+
+# 每个模型一个槽位，保证同一模型的并发请求数不超过上限
+# (采集器的 Worker 数可以大于模型上限，多出来的请求会在这里排队)
+_model_slots: Dict[str, ModelSlot] = {}
+
+
+def get_model_limit(model_name: str) -> int:
+    return settings.LLM_MODEL_CONCURRENCY.get(model_name, settings.LLM_DEFAULT_CONCURRENCY)
+
+
+def model_slot(model_name: str) -> ModelSlot:
+    """
+    获取指定模型的并发槽位，用法: `async with model_slot(llm.model_name): ...`
+    """
+    slot = _model_slots.get(model_name)
+    if slot is None:
+        slot = ModelSlot(max(1, get_model_limit(model_name)))
+        _model_slots[model_name] = slot
+    return slot
+
+
+def get_model_slot_stats() -> dict:
+    """
+    返回各模型当前的槽位占用情况，用于监控接口。
+    """
+    return {
+        name: {"limit": slot.limit, "in_use": slot.in_use, "waiting": slot.waiting}
+        for name, slot in _model_slots.items()
+    }
@@ -1,6 +1,6 @@
 from mcp.server.fastmcp import FastMCP, Context
 import httpx
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 import os
 
@@ -15,6 +15,21 @@ API_KEY = os.getenv("NEWS_API_KEY")
 if not API_KEY:
     raise ValueError("NEWS_API_KEY not found in .env file")
 BASE_URL = "https://newsdata.io/api/1/crypto"
+REQUEST_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+
+# Standalone process: keep its own keep-alive client instead of importing the app-wide pool
+# (which would require every application setting just to launch this server)
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=2),
+            timeout=REQUEST_TIMEOUT,
+        )
+    return _client
 
 
 # Helper function to fetch news from the API with nextPage pagination
@@ -22,33 +37,34 @@ async def fetch_crypto_news(query: str = None, max_pages: int = 1) -> List[Dict[
     all_articles = []
     next_page = None  # Start with no page token for the first request
 
-    async with httpx.AsyncClient() as client:
-        params = {
-            "apikey": API_KEY,
-        }
-        if query:
-            params["q"] = query
+    # Shared keep-alive client of this server process
+    client = get_client()
+    params = {
+        "apikey": API_KEY,
+    }
+    if query:
+        params["q"] = query
 
-        # Fetch up to max_pages
-        for _ in range(max_pages):
-            if next_page:
-                params["page"] = next_page  # Use nextPage token from previous response
+    # Fetch up to max_pages
+    for _ in range(max_pages):
+        if next_page:
+            params["page"] = next_page  # Use nextPage token from previous response
 
-            response = await client.get(BASE_URL, params=params)
-            response.raise_for_status()  # Raise an exception for bad responses
+        response = await client.get(BASE_URL, params=params)
+        response.raise_for_status()  # Raise an exception for bad responses
 
-            data = response.json()
-            articles = data.get("results", [])
-            all_articles.extend(articles)
+        data = response.json()
+        articles = data.get("results", [])
+        all_articles.extend(articles)
 
-            # Get the nextPage token from the response
-            next_page = data.get("nextPage")
+        # Get the nextPage token from the response
+        next_page = data.get("nextPage")
 
-            # Stop if there’s no nextPage or no more articles
-            if not next_page or not articles:
-                break
+        # Stop if there’s no nextPage or no more articles
+        if not next_page or not articles:
+            break
 
-        return all_articles
+    return all_articles
 
 
 # Tool: Fetch the latest cryptocurrency news headlines
@@ -107,6 +123,7 @@ def summarize_news(query: str) -> str:
     )
 
 # [FIX] 添加 'if __name__ == "__main__"' 以便独立运行
+# 在项目根目录运行: python -m src.core.mcp_server.crypto_news_mcp
 if __name__ == "__main__":
     print("Starting News MCP Server on port 8001...")
     # 使用 SSE 传输协议在 8001 端口运行
@@ -1,10 +1,12 @@
 # src/core/mcp_server/crypto_sentiment_mcp.py
-import httpx  # <-- [FIX] 导入 httpx
 from mcp.server.fastmcp import FastMCP
 from datetime import datetime, timedelta, UTC
+from typing import Optional
 
+import httpx
 from dotenv import load_dotenv
 load_dotenv()
+
 # ---
 
 mcp = FastMCP("CryptoSentiment",port=8002)
@@ -18,6 +20,20 @@ if not SANTIMENT_API_KEY:
 
 SANTIMENT_API_URL = "https://api.santiment.net/graphql"
 HEADERS = {"Authorization": f"Apikey {SANTIMENT_API_KEY}"}
+REQUEST_TIMEOUT = httpx.Timeout(20.0, connect=5.0)
+
+# 独立进程运行：使用本进程自己的 keep-alive 客户端，不引入应用的全局连接池 (那会要求启动时提供全部应用配置)
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=2),
+            timeout=REQUEST_TIMEOUT,
+        )
+    return _client
 
 
 # --- [FIX] 重写为异步函数 ---
@@ -41,9 +57,8 @@ async def fetch_santiment_data(metric: str, asset: str, days: int) -> dict:
       }}
     }}
     """
-    # 使用 httpx.AsyncClient
-    async with httpx.AsyncClient() as client:
-        response = await client.post(SANTIMENT_API_URL, json={"query": query}, headers=HEADERS)
+    # 复用本进程的 keep-alive 连接
+    response = await get_client().post(SANTIMENT_API_URL, json={"query": query}, headers=HEADERS)
 
     result = response.json()
     if result.get("errors"):
@@ -67,9 +82,8 @@ async def fetch_trending_words(days: int = 7) -> dict:
       }}
     }}
     """
-    # 使用 httpx.AsyncClient
-    async with httpx.AsyncClient() as client:
-        response = await client.post(SANTIMENT_API_URL, json={"query": query}, headers=HEADERS)
+    # 复用本进程的 keep-alive 连接
+    response = await get_client().post(SANTIMENT_API_URL, json={"query": query}, headers=HEADERS)
 
     result = response.json()
     if result.get("errors"):
@@ -195,5 +209,6 @@ async def get_social_dominance(asset: str, days: int = 7) -> str:
         return f"Error fetching social dominance for {asset}: {str(e)}"
 
 #[FIX] 移除 mcp.run()。它在被 main.py 导入时不需要
+# 在项目根目录运行: python -m src.core.mcp_server.crypto_sentiment_mcp
 if __name__ == "__main__":
      mcp.run(transport="sse")
\ No newline at end of file
@@ -1,5 +1,5 @@
 # src/core/models.py
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, DateTime, func
+from sqlalchemy import create_engine, Column, Integer, String, Float, Text, DateTime, Index, func
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.ext.asyncio import create_async_engine
 
@@ -41,4 +41,105 @@ class TradingSignals(Base):
     trend_24h = Column(String(20))
     confidence = Column(Float)
     reasoning = Column(Text)
-    agent_type = Column(String(50))
\ No newline at end of file
+    agent_type = Column(String(50))
+
+
+class SeenNews(Base):
+    """采集器去重索引：记录已派发处理的 objectId 及其过期时间"""
+    __tablename__ = "seen_news"
+
+    object_id = Column(String(64), primary_key=True)
+    seen_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)
+
+
+
+class NewsItem(Base):
+    """fetchCryptoPanic 新闻的本地副本 (由 news_store 的后台同步器维护)"""
+    __tablename__ = "news_items"
+
+    object_id = Column(String(64), primary_key=True)
+    coin_type = Column(Integer, primary_key=True)  # 1=BTC, 2=ETH
+    epoch = Column(Float, nullable=False, index=True)  # 新闻时间 (UTC 时间戳)
+    news_tag = Column(Integer, nullable=False, default=0)
+    payload = Column(Text, nullable=False)  # 上游返回的原始 JSON
+    synced_at = Column(Float)
+    # 内容最近一次变化时的数据版本号 (单调递增)，Dashboard 增量接口按它做游标
+    updated_seq = Column(Integer, index=True)
+
+    __table_args__ = (
+        Index("ix_news_items_coin_epoch", "coin_type", "epoch"),
+    )
+
+
+class LLMCacheEntry(Base):
+    """LLM 结构化输出缓存 (由 src.core.llm_cache 维护)"""
+    __tablename__ = "llm_cache"
+
+    cache_key = Column(String(64), primary_key=True)  # sha256(模型|提示词版本|内容哈希)
+    model = Column(String(100), nullable=False)
+    prompt_version = Column(String(50), nullable=False)
+    response = Column(Text, nullable=False)  # 输出的 JSON
+    created_at = Column(Float, nullable=False)
+    last_hit_at = Column(Float, nullable=False, index=True)
+    expires_at = Column(Float, nullable=False, index=True)
+    hits = Column(Integer, nullable=False, default=0)
+
+
+class UpdateOutboxEntry(Base):
+    """updatePanicNews 的本地发件箱 (由 src.core.update_outbox 维护)，同一 objectId 只保留一条待发送记录"""
+    __tablename__ = "update_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    object_id = Column(String(64), nullable=False, index=True)
+    payload = Column(Text, nullable=False)  # 合并后的待写入字段 (JSON)
+    verify_tag = Column(Integer)  # 送达后需要回读确认的 Tag (可为空)
+    version = Column(Integer, nullable=False, default=1)  # 每次合并新修改 +1，防止发送期间的修改丢失
+    status = Column(String(16), nullable=False, default="pending", index=True)  # pending / dead
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+    next_attempt_at = Column(Float, nullable=False, index=True)
+    last_error = Column(Text)
+
+
+class RetryQueueEntry(Base):
+    """Pipeline 处理出错的新闻：按指数退避等待采集器重试"""
+    __tablename__ = "retry_queue"
+
+    object_id = Column(String(64), primary_key=True)
+    item = Column(Text, nullable=False)  # 原始新闻 (JSON)，重试时直接送入 Pipeline
+    attempts = Column(Integer, nullable=False, default=0)  # 已失败次数
+    first_failed_at = Column(Float, nullable=False)
+    next_attempt_at = Column(Float, nullable=False, index=True)
+    last_error = Column(Text)
+
+
+class DeadLetterEntry(Base):
+    """重试次数用尽的新闻 (同时已标记为 Tag 4)，保留错误信息供排查"""
+    __tablename__ = "dead_letters"
+
+    object_id = Column(String(64), primary_key=True)
+    item = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False)
+    first_failed_at = Column(Float, nullable=False)
+    dead_at = Column(Float, nullable=False, index=True)
+    last_error = Column(Text)
+
+
+class PredictionOutcome(Base):
+    """大模型 Agent 的每条方向预测及其回测结果 (目标 K 线收盘后结算)"""
+    __tablename__ = "prediction_outcomes"
+
+    id = Column(String(160), primary_key=True)  # objectId|周期|信号时间
+    object_id = Column(String(64), nullable=False)
+    coin_type = Column(Integer, nullable=False)
+    horizon = Column(String(8), nullable=False)  # "1h" (短线) / "24h" (趋势)
+    predicted_at = Column(Float, nullable=False, index=True)
+    direction = Column(String(16), nullable=False)
+    status = Column(String(16), nullable=False, default="pending", index=True)  # pending / resolved / expired
+    start_price = Column(Float)
+    end_price = Column(Float)
+    actual = Column(String(16))
+    correct = Column(Integer)  # 1 / 0；NEUTRAL 预测不计入考核，为空
+    resolved_at = Column(Float)
@@ -0,0 +1,246 @@
+# src/core/near_dup.py
+"""
+近重复新闻检测 (SimHash + LSH 分段索引)。
+
+聚合站经常对同一条快讯做细微改写后重复发布 (例如 "ETH 跌破 4,500 USDT" 的各种变体)，
+objectId 不同，去重索引拦不住。这里只对标题计算 64 位 SimHash (描述常是各条共用的模板文字，
+会把方向相反的快讯拉到阈值以内)，汉明距离不超过阈值的视为同一簇，簇内只让第一条 (canonical) 进入 Pipeline，
+其余条目直接复用它的 Tag / 摘要 / 分析结果。
+
+SimHash 对一两个字的差异不敏感 ("跌破" / "突破" 只差一个字)，因此命中前还要求两条标题的
+关键签名一致：数字集合与方向词 (涨 / 跌 / 突破 / 跌破 / surge / plunge ...) 的多空方向都相同。
+
+LSH: 把 64 位指纹切成 (阈值 + 1) 段，按抽屉原理，距离不超过阈值的两个指纹至少有一段完全相同，
+因此只需比较落在同一个桶里的候选，不用全量两两比较。
+"""
+import hashlib
+import re
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from config.settings import settings
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+# 归一化后短于该长度的文本不参与检测 (信息量太少，容易误判)
+MIN_TEXT_LENGTH = 12
+
+_NUMBER_SEP_RE = re.compile(r"(?<=\d)[,，](?=\d)")
+_NON_WORD_RE = re.compile(r"[\W_]+")
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+_WORD_RE = re.compile(r"[a-z]+")
+
+# 方向词：中文按子串匹配 ("跌破" 含 "跌")，英文按整词匹配
+UP_KEYWORDS_ZH = ("涨", "突破", "升破", "站上", "飙升", "拉升", "反弹", "走高", "新高")
+DOWN_KEYWORDS_ZH = ("跌", "失守", "下挫", "回落", "走低", "跳水", "新低")
+UP_WORDS = {
+    "surge", "surges", "surged", "surging", "soar", "soars", "soared", "soaring",
+    "rally", "rallies", "rallied", "jump", "jumps", "jumped", "rise", "rises", "rose", "rising",
+    "climb", "climbs", "climbed", "gain", "gains", "gained", "spike", "spikes", "spiked",
+    "rebound", "rebounds", "rebounded", "pump", "pumps", "pumped", "above", "higher", "up",
+}
+DOWN_WORDS = {
+    "plunge", "plunges", "plunged", "plunging", "plummet", "plummets", "plummeted",
+    "drop", "drops", "dropped", "fall", "falls", "fell", "falling", "crash", "crashes", "crashed",
+    "slump", "slumps", "slumped", "tumble", "tumbles", "tumbled", "sink", "sinks", "sank",
+    "dip", "dips", "dipped", "slide", "slides", "slid", "dump", "dumps", "dumped", "below", "lower", "down",
+}
+
+Signature = Tuple[FrozenSet[str], FrozenSet[str]]
+
+
+def normalize_text(text: str) -> str:
+    """全角转半角、小写、去掉数字千分位和所有标点空白"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _NUMBER_SEP_RE.sub("", text)
+    return _NON_WORD_RE.sub("", text)
+
+
+def news_text(item: dict) -> str:
+    """参与指纹计算的文本：只用标题"""
+    return item.get('title') or ""
+
+
+def key_signature(text: str) -> Signature:
+    """(数字集合, 多空方向集合)，两条新闻的签名不同则不视为近重复"""
+    text = _NUMBER_SEP_RE.sub("", unicodedata.normalize("NFKC", text or "").lower())
+    numbers = frozenset(_NUMBER_RE.findall(text))
+    words = set(_WORD_RE.findall(text))
+    directions = set()
+    if words & UP_WORDS or any(k in text for k in UP_KEYWORDS_ZH):
+        directions.add("up")
+    if words & DOWN_WORDS or any(k in text for k in DOWN_KEYWORDS_ZH):
+        directions.add("down")
+    return numbers, frozenset(directions)
+
+
+def simhash(normalized: str) -> int:
+    """基于字符 3-gram 的 64 位 SimHash (对中英文混排都适用)"""
+    if len(normalized) <= SHINGLE_SIZE:
+        shingles = Counter([normalized])
+    else:
+        shingles = Counter(normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1))
+
+    weights = [0] * SIMHASH_BITS
+    for shingle, count in shingles.items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if (h >> bit) & 1 else -count
+
+    value = 0
+    for bit in range(SIMHASH_BITS):
+        if weights[bit] > 0:
+            value |= 1 << bit
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDupIndex:
+    """
+    进程内的近重复索引，只保留最近 window_seconds 内的条目，总数不超过 capacity。
+    """
+
+    def __init__(self, max_hamming: int, window_seconds: float, capacity: int):
+        self.max_hamming = max_hamming
+        self.window_seconds = window_seconds
+        self.capacity = capacity
+
+        bands = max_hamming + 1
+        width = SIMHASH_BITS // bands
+        # 每段 (起始位, 位宽)，余数并入最后一段
+        self._bands: List[Tuple[int, int]] = [
+            (i * width, width if i < bands - 1 else SIMHASH_BITS - i * width)
+            for i in range(bands)
+        ]
+        self._buckets: List[Dict[int, Set[str]]] = [{} for _ in self._bands]
+        # object_id -> (指纹, 加入时间, canonical_id, 关键签名)
+        self._entries: "OrderedDict[str, Tuple[int, float, str, Signature]]" = OrderedDict()
+
+        # --- 调参用的统计 ---
+        self.cluster_sizes: Counter = Counter()  # canonical_id -> 跟随条数
+        self.match_distances: Counter = Counter()  # 命中时的汉明距离分布
+        self.near_miss_distances: Counter = Counter()  # 同桶但超过阈值的距离分布 (阈值 ~ 2 倍阈值)
+        self.signature_conflicts = 0  # 距离在阈值内但数字 / 方向不一致而被拒绝的次数
+        self.checked = 0
+        self.duplicates = 0
+
+    def _band_keys(self, value: int):
+        for i, (start, width) in enumerate(self._bands):
+            yield i, (value >> start) & ((1 << width) - 1)
+
+    def _evict(self, now: float):
+        while self._entries:
+            oid, (value, added_at, _, _) = next(iter(self._entries.items()))
+            if added_at > now - self.window_seconds and len(self._entries) <= self.capacity:
+                break
+            self._remove(oid, value)
+
+    def _remove(self, object_id: str, value: int):
+        self._entries.pop(object_id, None)
+        for i, key in self._band_keys(value):
+            bucket = self._buckets[i].get(key)
+            if bucket is not None:
+                bucket.discard(object_id)
+                if not bucket:
+                    del self._buckets[i][key]
+        self.cluster_sizes.pop(object_id, None)
+
+    def contains(self, object_id: str) -> bool:
+        return object_id in self._entries
+
+    def find(self, text: str) -> Optional[Tuple[str, int]]:
+        """
+        返回 (canonical_id, 汉明距离)，没有近重复时返回 None。
+        """
+        normalized = normalize_text(text)
+        if len(normalized) < MIN_TEXT_LENGTH:
+            return None
+        return self._find(simhash(normalized), key_signature(text))
+
+    def _find(self, value: int, signature: Signature) -> Optional[Tuple[str, int]]:
+        best = None
+        seen: Set[str] = set()
+        for i, key in self._band_keys(value):
+            for oid in self._buckets[i].get(key, ()):
+                if oid in seen:
+                    continue
+                seen.add(oid)
+                distance = hamming(value, self._entries[oid][0])
+                if distance <= self.max_hamming:
+                    if self._entries[oid][3] != signature:
+                        self.signature_conflicts += 1
+                        continue
+                    if best is None or distance < best[1]:
+                        best = (self._entries[oid][2], distance)
+                elif distance <= self.max_hamming * 2:
+                    self.near_miss_distances[distance] += 1
+        return best
+
+    def add(self, object_id: str, text: str, canonical_id: str = None):
+        normalized = normalize_text(text)
+        if len(normalized) < MIN_TEXT_LENGTH or object_id in self._entries:
+            return
+        self._insert(object_id, simhash(normalized), canonical_id or object_id, key_signature(text))
+
+    def _insert(self, object_id: str, value: int, canonical_id: str, signature: Signature):
+        now = time.time()
+        self._entries[object_id] = (value, now, canonical_id, signature)
+        for i, key in self._band_keys(value):
+            self._buckets[i].setdefault(key, set()).add(object_id)
+        self._evict(now)
+
+    def check_and_add(self, object_id: str, text: str) -> Optional[str]:
+        """
+        检测并登记一条新闻。返回它所属簇的 canonical_id；自身成为新簇时返回 None。
+        """
+        normalized = normalize_text(text)
+        if len(normalized) < MIN_TEXT_LENGTH:
+            return None
+        if object_id in self._entries:
+            canonical_id = self._entries[object_id][2]
+            return None if canonical_id == object_id else canonical_id
+
+        self.checked += 1
+        value = simhash(normalized)
+        signature = key_signature(text)
+        match = self._find(value, signature)
+        if match is None:
+            self._insert(object_id, value, object_id, signature)
+            return None
+
+        canonical_id, distance = match
+        self._insert(object_id, value, canonical_id, signature)
+        self.duplicates += 1
+        self.match_distances[distance] += 1
+        self.cluster_sizes[canonical_id] += 1
+        return canonical_id
+
+    def stats(self) -> dict:
+        clusters = {cid: size for cid, size in self.cluster_sizes.items() if size > 0}
+        return {
+            "max_hamming": self.max_hamming,
+            "indexed": len(self._entries),
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+            "duplicate_rate": round(self.duplicates / self.checked, 4) if self.checked else 0.0,
+            "clusters": len(clusters),
+            "largest_clusters": [
+                {"canonical_id": cid, "followers": size}
+                for cid, size in Counter(clusters).most_common(5)
+            ],
+            "match_distances": dict(sorted(self.match_distances.items())),
+            "near_miss_distances": dict(sorted(self.near_miss_distances.items())),
+            "signature_conflicts": self.signature_conflicts,
+        }
+
+
+near_dup_index = NearDupIndex(
+    max_hamming=settings.NEAR_DUP_MAX_HAMMING,
+    window_seconds=settings.NEAR_DUP_WINDOW_HOURS * 3600,
+    capacity=settings.NEAR_DUP_CAPACITY,
+)
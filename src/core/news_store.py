@@ -0,0 +1,524 @@
+# src/core/news_store.py
+"""
+fetchCryptoPanic 新闻的本地同步副本。
+
+- 唯一的后台同步器 (run_news_syncer) 基于高水位增量拉取上游，写入本地表 news_items
+- 采集器、各 Agent 与 Dashboard 都通过 query_range / get_item 在本地做范围查询
+- 本系统自己的回写 (updatePanicNews) 通过 apply_update 同步写入本地，保证读到最新状态
+- 查询范围超出本地已同步窗口时，自动回源 (read-through) 并写入本地
+"""
+import asyncio
+import json
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import httpx
+from sqlalchemy import select, delete, func
+
+from config.settings import settings
+from src.core.database import async_session, ensure_tables
+from src.core.models import NewsItem
+from src.core.http_client import get_http_client, endpoint_timeout
+
+# --- 配置 ---
+FETCH_API_URL = f"{settings.DATACENTER_BASE_URL}/fetchCryptoPanic"
+HEADERS = {'Content-Type': 'application/json'}
+COIN_TYPES = [1, 2]  # 1=BTC, 2=ETH
+
+SYNC_WINDOW_HOURS = 72  # 全量同步窗口 (覆盖 Dashboard 的 72h 视图)
+INCREMENTAL_OVERLAP_MINUTES = 10  # 增量请求向水位之前重叠的时长，兜住上游写入延迟
+FULL_RESYNC_INTERVAL = 1800  # 每隔多久强制全量同步一次 (秒)，兜住迟到的旧新闻和外部修改
+SYNC_INTERVAL = 30  # 后台同步间隔 (秒)
+RETENTION_HOURS = 96  # 本地保留时长，超出的会被清理
+PRUNE_INTERVAL = 3600
+
+# 单次 IN 查询的最大 ID 数
+_SQL_CHUNK_SIZE = 500
+
+# 每个币种的高水位: {coin_type: {"time": 最新新闻时间戳, "object_id": 对应 ID, "last_full_sync": 上次全量时间}}
+news_watermarks: Dict[int, Dict[str, Any]] = {}
+# 每个币种最近一次拉取的窗口、条数、载荷大小和解析耗时
+FETCH_STATS: Dict[int, Dict[str, Any]] = {}
+STORE_STATS: Dict[str, Any] = {
+    "syncs": 0,
+    "full_syncs": 0,
+    "last_sync_at": None,
+    "upserted": 0,
+    "local_queries": 0,
+    "read_through": 0,
+    "write_through": 0,
+    "delta_queries": 0,
+}
+
+# 尚未送达上游的本地修改 (由 update_outbox 维护): {objectId: 待写入的字段}
+# 同步时上游仍是旧值，需要把这些字段叠加回去，避免本地状态被回滚
+_pinned_updates: Dict[str, Dict[str, Any]] = {}
+
+# 本地副本的数据版本：内容发生变化 (同步写入 / 写穿 / 清理) 时递增，Dashboard 快照据此判断是否需要重建。
+# 变化的行同时记下 updated_seq = 新版本号，作为增量接口的游标；启动时从库里的最大 updated_seq 恢复
+_data_version = 0
+_version_loaded = False
+# 串行化 "分配版本号 -> 提交 -> 发布版本号"，保证读到版本 v 时所有 updated_seq <= v 的行都已提交
+_write_lock = asyncio.Lock()
+# 版本变化时唤醒等待者 (SSE 推送)；每次变化后换一个新的 Event
+_change_event = asyncio.Event()
+
+_sync_lock = asyncio.Lock()
+_last_prune = 0.0
+
+TimeLike = Union[datetime, float, int]
+
+
+def parse_api_timestamp(time_str: str) -> float:
+    if not time_str: return time.time()
+    try:
+        clean_str = time_str.replace("Z", "").strip()
+        if "." in clean_str: clean_str = clean_str.split(".")[0]
+        if "T" in clean_str:
+            dt = datetime.strptime(clean_str, "%Y-%m-%dT%H:%M:%S")
+        else:
+            dt = datetime.strptime(clean_str, "%Y-%m-%d %H:%M:%S")
+        dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    except Exception:
+        return time.time()
+
+
+def _to_epoch(value: TimeLike) -> float:
+    """datetime (无时区视为 UTC) 或时间戳 -> UTC 时间戳"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+
+def _normalize_tag(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+# ==========================================
+# 📡 上游拉取 (高水位增量)
+# ==========================================
+async def fetch_crypto_news_from_api(client: httpx.AsyncClient, coin_type: int,
+                                     start_time: datetime = None, end_time: datetime = None) -> List[Dict[str, Any]] | None:
+    """
+    调用 fetchCryptoPanic 接口获取新闻。
+    不传时间窗口时默认查询过去 SYNC_WINDOW_HOURS 小时 (UTC)。
+    请求失败时返回 None (与 "窗口内没有数据" 的空列表区分开)。
+    """
+    end_time = end_time or datetime.utcnow()
+    start_time = start_time or end_time - timedelta(hours=SYNC_WINDOW_HOURS)
+
+    json_data = {
+        "type": coin_type,
+        "startTime": start_time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "endTime": end_time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+
+    try:
+        response = await client.post(FETCH_API_URL, headers=HEADERS, json=json_data,
+                                     timeout=endpoint_timeout(FETCH_API_URL))
+        if response.status_code != 200:
+            print(f"⚠️ [NewsStore] API 请求失败 (Type {coin_type}) Code: {response.status_code}")
+            return None
+
+        parse_start = time.perf_counter()
+        items = response.json()
+        FETCH_STATS[coin_type] = {
+            "window_s": round((end_time - start_time).total_seconds()),
+            "items": len(items) if isinstance(items, list) else 0,
+            "bytes": len(response.content),
+            "parse_ms": round((time.perf_counter() - parse_start) * 1000, 2),
+        }
+        return items if isinstance(items, list) else []
+    except Exception as e:
+        print(f"❌ [NewsStore] 请求异常 (Type {coin_type}): {e}")
+        return None
+
+
+def _advance_watermark(coin_type: int, items: List[Dict[str, Any]], full_sync: bool):
+    wm = news_watermarks.setdefault(coin_type, {"time": 0.0, "object_id": None, "last_full_sync": 0.0})
+    if full_sync:
+        # 全量同步以上游当前数据为准，重新确定水位
+        wm.update({"time": 0.0, "object_id": None, "last_full_sync": time.time()})
+        STORE_STATS["full_syncs"] += 1
+    for item in items:
+        ts = parse_api_timestamp(item.get('time'))
+        if item.get('objectId') and ts >= wm["time"]:
+            wm["time"] = ts
+            wm["object_id"] = item.get('objectId')
+
+
+async def fetch_crypto_news_incremental(client: httpx.AsyncClient, coin_type: int) -> List[Dict[str, Any]] | None:
+    """
+    基于高水位的增量拉取：
+    - 稳态下只请求 (水位 - 重叠窗口, 现在] 这一小段
+    - 首次运行 / 距上次全量超过 FULL_RESYNC_INTERVAL / 水位过旧 / 检测到断档时，回退为全量窗口
+    断档判定：重叠窗口内本应包含水位那条新闻，如果没返回，说明上游数据有变化或请求不完整。
+    """
+    now = time.time()
+    wm = news_watermarks.get(coin_type)
+
+    needs_full = (
+        wm is None
+        or wm["object_id"] is None
+        or now - wm["last_full_sync"] > FULL_RESYNC_INTERVAL
+        or now - wm["time"] > SYNC_WINDOW_HOURS * 3600
+    )
+
+    if not needs_full:
+        start_time = datetime.utcfromtimestamp(wm["time"]) - timedelta(minutes=INCREMENTAL_OVERLAP_MINUTES)
+        items = await fetch_crypto_news_from_api(client, coin_type, start_time=start_time)
+        if items is None:
+            return None
+        if any(x.get('objectId') == wm["object_id"] for x in items):
+            _advance_watermark(coin_type, items, full_sync=False)
+            return items
+        print(f"⚠️ [NewsStore] Type {coin_type} 增量窗口未命中水位 {wm['object_id']}，回退全量同步...")
+
+    items = await fetch_crypto_news_from_api(client, coin_type)
+    if items is None:
+        return None
+    _advance_watermark(coin_type, items, full_sync=True)
+    return items
+
+
+# ==========================================
+# 💾 本地读写
+# ==========================================
+def data_version() -> int:
+    return _data_version
+
+
+def _bump_version():
+    global _data_version, _change_event
+    _data_version += 1
+    event, _change_event = _change_event, asyncio.Event()
+    event.set()
+
+
+async def _ensure_ready():
+    """建表，并在首次使用时从库里恢复数据版本 (重启后游标继续递增)"""
+    global _data_version, _version_loaded
+    await ensure_tables()
+    if _version_loaded:
+        return
+    async with async_session() as session:
+        max_seq = await session.scalar(select(func.max(NewsItem.updated_seq)))
+    _data_version = max(_data_version, max_seq or 0)
+    _version_loaded = True
+
+
+async def wait_for_change(since: int, timeout: float) -> bool:
+    """等待数据版本超过 since，最多等 timeout 秒。返回是否有变化"""
+    if _data_version > since:
+        return True
+    try:
+        await asyncio.wait_for(_change_event.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
+    return _data_version > since
+
+
+def pin(object_id: str, fields: Dict[str, Any]):
+    """固定一条尚未送达上游的修改，后续同步不会用上游旧值覆盖这些字段"""
+    _pinned_updates[str(object_id)] = {k: v for k, v in fields.items() if k != 'objectId'}
+
+
+def unpin(object_id: str):
+    _pinned_updates.pop(str(object_id), None)
+
+
+async def upsert_items(coin_type: int, items: List[Dict[str, Any]]) -> int:
+    """将上游条目写入本地 (按 objectId + coin_type 覆盖，已固定的本地修改会叠加在上游值之上)"""
+    by_id = {str(x.get('objectId')): x for x in items if x.get('objectId')}
+    if not by_id:
+        return 0
+
+    await _ensure_ready()
+    now = time.time()
+    ids = list(by_id.keys())
+    changed = 0
+    async with _write_lock, async_session() as session:
+        seq = _data_version + 1
+        for i in range(0, len(ids), _SQL_CHUNK_SIZE):
+            chunk = ids[i:i + _SQL_CHUNK_SIZE]
+            result = await session.execute(
+                select(NewsItem).where(NewsItem.coin_type == coin_type, NewsItem.object_id.in_(chunk))
+            )
+            existing = {row.object_id: row for row in result.scalars()}
+
+            for oid in chunk:
+                item = by_id[oid]
+                if oid in _pinned_updates:
+                    item = {**item, **_pinned_updates[oid]}
+                payload = json.dumps(item, ensure_ascii=False)
+                epoch = parse_api_timestamp(item.get('time'))
+                tag = _normalize_tag(item.get('newsTag'))
+                row = existing.get(oid)
+                if row is None:
+                    session.add(NewsItem(object_id=oid, coin_type=coin_type, epoch=epoch,
+                                         news_tag=tag, payload=payload, synced_at=now, updated_seq=seq))
+                    changed += 1
+                else:
+                    if row.payload != payload:
+                        row.updated_seq = seq
+                        changed += 1
+                    row.epoch = epoch
+                    row.news_tag = tag
+                    row.payload = payload
+                    row.synced_at = now
+        await session.commit()
+        if changed:
+            _bump_version()
+
+    STORE_STATS["upserted"] += len(ids)
+    return len(ids)
+
+
+async def sync(force_full: bool = False):
+    """
+    对所有币种执行一次增量同步。
+    如果已有同步在进行中，等待它完成后直接返回 (不重复请求上游)。
+    """
+    if _sync_lock.locked():
+        async with _sync_lock:
+            return
+
+    async with _sync_lock:
+        client = get_http_client(FETCH_API_URL)
+        for coin_type in COIN_TYPES:
+            if force_full:
+                news_watermarks.pop(coin_type, None)
+            items = await fetch_crypto_news_incremental(client, coin_type)
+            if items is None:
+                continue
+            try:
+                await upsert_items(coin_type, items)
+            except Exception as e:
+                print(f"❌ [NewsStore] 写入本地失败 (Type {coin_type}): {e}")
+                # 本地写入失败时丢弃水位，下一轮全量重试
+                news_watermarks.pop(coin_type, None)
+                continue
+
+        STORE_STATS["syncs"] += 1
+        STORE_STATS["last_sync_at"] = time.time()
+
+
+def _synced_since(coin_type: int) -> Optional[float]:
+    """本地副本对该币种已覆盖的最早时间 (本进程内最近一次全量同步的窗口起点)"""
+    wm = news_watermarks.get(coin_type)
+    if not wm or not wm["last_full_sync"]:
+        return None
+    return wm["last_full_sync"] - SYNC_WINDOW_HOURS * 3600
+
+
+async def _read_through(coin_type: int, start_ts: float, end_ts: float):
+    client = get_http_client(FETCH_API_URL)
+    items = await fetch_crypto_news_from_api(
+        client, coin_type,
+        start_time=datetime.utcfromtimestamp(start_ts),
+        end_time=datetime.utcfromtimestamp(end_ts),
+    )
+    if items:
+        await upsert_items(coin_type, items)
+    STORE_STATS["read_through"] += 1
+
+
+async def query_range(coin_type: Optional[int], start: TimeLike, end: TimeLike,
+                      tags: Iterable[int] = None) -> List[Dict[str, Any]]:
+    """
+    本地范围查询，按时间倒序返回上游格式的新闻字典。
+    coin_type 为 None 时查询所有币种；tags 不为空时只返回对应 newsTag 的条目 (0 表示未处理)。
+    """
+    start_ts, end_ts = _to_epoch(start), _to_epoch(end)
+    coin_types = COIN_TYPES if coin_type is None else [coin_type]
+
+    for ct in coin_types:
+        covered = _synced_since(ct)
+        if covered is None:
+            # 本进程尚未同步过：先做一次同步 (通常只在启动初期发生)
+            await sync()
+            covered = _synced_since(ct)
+        if covered is not None and start_ts < covered:
+            try:
+                await _read_through(ct, start_ts, min(end_ts, covered))
+            except Exception as e:
+                print(f"⚠️ [NewsStore] 回源失败 (Type {ct}): {e}")
+
+    await _ensure_ready()
+    stmt = select(NewsItem).where(NewsItem.epoch >= start_ts, NewsItem.epoch <= end_ts)
+    if coin_type is not None:
+        stmt = stmt.where(NewsItem.coin_type == coin_type)
+    if tags is not None:
+        stmt = stmt.where(NewsItem.news_tag.in_(list(tags)))
+    stmt = stmt.order_by(NewsItem.epoch.desc())
+
+    async with async_session() as session:
+        result = await session.execute(stmt)
+        rows = result.scalars().all()
+
+    STORE_STATS["local_queries"] += 1
+    return [json.loads(row.payload) for row in rows]
+
+
+async def query_changed_since(since_seq: int, start: TimeLike, end: TimeLike) -> List[Tuple[int, int, Dict[str, Any]]]:
+    """
+    增量查询：返回 updated_seq > since_seq 且新闻时间在范围内的条目 [(coin_type, updated_seq, 新闻字典)]，按时间倒序。
+    """
+    await _ensure_ready()
+    stmt = (select(NewsItem)
+            .where(NewsItem.updated_seq > since_seq,
+                   NewsItem.epoch >= _to_epoch(start), NewsItem.epoch <= _to_epoch(end))
+            .order_by(NewsItem.epoch.desc()))
+    async with async_session() as session:
+        rows = (await session.execute(stmt)).scalars().all()
+    STORE_STATS["delta_queries"] += 1
+    return [(row.coin_type, row.updated_seq, json.loads(row.payload)) for row in rows]
+
+
+async def get_item(object_id: str) -> Optional[Dict[str, Any]]:
+    await _ensure_ready()
+    async with async_session() as session:
+        result = await session.execute(select(NewsItem).where(NewsItem.object_id == str(object_id)).limit(1))
+        row = result.scalars().first()
+    return json.loads(row.payload) if row else None
+
+
+async def get_item_location(object_id: str) -> Optional[Dict[str, Any]]:
+    """返回本地记录的币种与时间，用于缩小回源查询范围"""
+    await _ensure_ready()
+    async with async_session() as session:
+        result = await session.execute(select(NewsItem).where(NewsItem.object_id == str(object_id)).limit(1))
+        row = result.scalars().first()
+    return {"coin_type": row.coin_type, "epoch": row.epoch} if row else None
+
+
+async def apply_update(payload: Dict[str, Any]):
+    """
+    写穿 (write-through)：本系统向 updatePanicNews 写入成功后，把同样的字段合并到本地副本，
+    保证后续本地查询立刻读到最新状态。
+    """
+    obj_id = payload.get('objectId')
+    if not obj_id:
+        return
+    try:
+        await _ensure_ready()
+        async with _write_lock, async_session() as session:
+            seq = _data_version + 1
+            result = await session.execute(select(NewsItem).where(NewsItem.object_id == str(obj_id)))
+            rows = result.scalars().all()
+            for row in rows:
+                row.updated_seq = seq
+                item = json.loads(row.payload)
+                item.update({k: v for k, v in payload.items() if k != 'objectId'})
+                row.payload = json.dumps(item, ensure_ascii=False)
+                if 'newsTag' in payload:
+                    row.news_tag = _normalize_tag(payload.get('newsTag'))
+            await session.commit()
+            if rows:
+                _bump_version()
+        STORE_STATS["write_through"] += 1
+    except Exception as e:
+        print(f"⚠️ [NewsStore] 本地写穿失败 ID {obj_id}: {e}")
+
+
+async def get_item_locations(object_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """批量版 get_item_location: {objectId: {"coin_type", "epoch"}}"""
+    ids = [str(x) for x in dict.fromkeys(object_ids) if x]
+    locations: Dict[str, Dict[str, Any]] = {}
+    if not ids:
+        return locations
+    await _ensure_ready()
+    async with async_session() as session:
+        for i in range(0, len(ids), _SQL_CHUNK_SIZE):
+            chunk = ids[i:i + _SQL_CHUNK_SIZE]
+            result = await session.execute(select(NewsItem).where(NewsItem.object_id.in_(chunk)))
+            for row in result.scalars():
+                locations.setdefault(row.object_id, {"coin_type": row.coin_type, "epoch": row.epoch})
+    return locations
+
+
+async def fetch_upstream_items(object_ids: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    直接从上游读取多条新闻的当前状态 (用于回读验证，不写入本地)。
+    按币种分组，每个币种只请求一次覆盖所有目标新闻时间 (前后各留 1 分钟) 的窗口。
+    返回 {objectId: 上游条目}；请求失败的 ID 不出现在结果中，上游没有的 ID 对应 None。
+    """
+    locations = await get_item_locations(object_ids)
+    by_coin: Dict[int, List[str]] = {}
+    for oid, location in locations.items():
+        by_coin.setdefault(location["coin_type"], []).append(oid)
+
+    found: Dict[str, Optional[Dict[str, Any]]] = {}
+    for coin_type, ids in by_coin.items():
+        epochs = [locations[oid]["epoch"] for oid in ids]
+        client = get_http_client(FETCH_API_URL)
+        items = await fetch_crypto_news_from_api(
+            client, coin_type,
+            start_time=datetime.utcfromtimestamp(min(epochs)) - timedelta(minutes=1),
+            end_time=datetime.utcfromtimestamp(max(epochs)) + timedelta(minutes=1),
+        )
+        if items is None:
+            continue
+        upstream = {str(x.get('objectId')): x for x in items}
+        for oid in ids:
+            found[oid] = upstream.get(oid)
+    return found
+
+
+async def fetch_upstream_item(object_id: str) -> Optional[Dict[str, Any]]:
+    """单条版 fetch_upstream_items (只请求该新闻前后 1 分钟的小窗口)"""
+    found = await fetch_upstream_items([object_id])
+    return found.get(str(object_id))
+
+
+async def prune() -> int:
+    await _ensure_ready()
+    cutoff = time.time() - RETENTION_HOURS * 3600
+    async with _write_lock, async_session() as session:
+        result = await session.execute(delete(NewsItem).where(NewsItem.epoch < cutoff))
+        await session.commit()
+        removed = result.rowcount or 0
+        if removed:
+            _bump_version()
+    return removed
+
+
+# ==========================================
+# 🔄 后台同步器
+# ==========================================
+async def run_news_syncer():
+    """
+    由 main.py 的 lifespan 启动，常驻后台保持本地副本与上游同步。
+    """
+    global _last_prune
+    print(f"🔄 [NewsStore] 同步器已启动 (间隔 {SYNC_INTERVAL}s)")
+    while True:
+        try:
+            await sync()
+            if time.time() - _last_prune > PRUNE_INTERVAL:
+                _last_prune = time.time()
+                removed = await prune()
+                if removed:
+                    print(f"🧹 [NewsStore] 清理过期新闻: {removed}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ [NewsStore] 同步出错: {e}")
+        await asyncio.sleep(SYNC_INTERVAL)
+
+
+def get_store_stats() -> dict:
+    return {
+        **STORE_STATS,
+        "pinned": len(_pinned_updates),
+        "data_version": _data_version,
+        "watermarks": news_watermarks,
+        "last_fetch": FETCH_STATS,
+    }
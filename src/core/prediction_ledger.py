@@ -0,0 +1,375 @@
+# src/core/prediction_ledger.py
+"""
+大模型 Agent 方向预测的持久化结算账本 (替代短线 Agent 每次运行时的全量回测)。
+
+原先 generate_feedback_report 每次运行都重新查询 24 小时新闻、拉取 100 根 K 线、逐条 json.loads analysis，
+再按精确时间戳查字典对齐 K 线，对应 K 线缺失的预测被直接丢弃。现在：
+- Agent 写入信号时登记一条预测 (prediction_outcomes 表)，首次使用时从本地新闻副本补登最近的历史预测
+- 后台每隔 RESOLVE_INTERVAL 秒结算目标 K 线已收盘的预测：同一 (币种, 周期) 的全部待结算预测
+  一次 searchsorted 对齐到共享 K 线存储中的序列 (取包含该时间点的 K 线，不要求时间戳精确存在)
+- 早于可用 K 线范围的预测标记为 expired，不会一直挂起
+- 每个 (币种, 周期) 在内存里维护最近 FEEDBACK_WINDOW_HOURS 小时的结算结果和计数，Prompt 读取准确率为 O(1)
+"""
+import asyncio
+import bisect
+import json
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, delete, func
+
+from src.core import news_store
+from src.core.candle_store import candle_store, interval_ms
+from src.core.database import async_session, ensure_tables
+from src.core.models import PredictionOutcome
+
+# --- 配置 ---
+# 预测周期 -> (结算用的 K 线周期, 周期秒数, analysis 中的信号列表名)
+HORIZONS = {
+    "1h": ("15m", 3600, "short_term_signals"),
+    "24h": ("1h", 86400, "trend_signals"),
+}
+COIN_SYMBOLS = {1: "BTCUSDT", 2: "ETHUSDT"}
+FEEDBACK_WINDOW_HOURS = 24  # 滚动准确率的统计窗口 (按预测时间)
+RESOLVE_INTERVAL = 60  # 后台结算间隔 (秒)
+RETENTION_DAYS = 30  # 账本保留天数
+INSERT_CHUNK_SIZE = 500  # IN 查询单批的 ID 数
+
+
+def _parse_signal_time(value) -> Optional[float]:
+    """信号 / 新闻时间 (UTC 字符串) -> 时间戳"""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        clean_str = value.replace("T", " ").replace("Z", "").strip().split(".")[0]
+        return datetime.strptime(clean_str, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+def extract_predictions(item: Dict[str, Any], horizon: str) -> List[Tuple[str, float, str]]:
+    """从新闻的 analysis 中取出该周期的全部预测 [(信号时间原文, 时间戳, 方向)]"""
+    analysis = item.get('analysis') or ""
+    if not analysis:
+        return []
+    signal_key = HORIZONS[horizon][2]
+    predictions = []
+    try:
+        data = json.loads(analysis)
+        signals = data.get(signal_key, []) if isinstance(data, dict) else []
+        for sig in signals if isinstance(signals, list) else []:
+            if not isinstance(sig, dict):
+                continue
+            ts = _parse_signal_time(sig.get("timestamp"))
+            if ts is not None and sig.get("direction"):
+                predictions.append((sig["timestamp"], ts, str(sig["direction"]).upper()))
+    except (json.JSONDecodeError, TypeError):
+        # 兼容旧 String 格式 (只有 1H 预测)：没有单独的预测时间，近似使用新闻发布时间
+        if horizon == "1h" and "【1H_PREDICTION】" in analysis:
+            try:
+                pred_part = analysis.split("【1H_PREDICTION】:")[1].split("||")[0]
+                ts = _parse_signal_time(item.get('time'))
+                if ts is not None:
+                    predictions.append((item.get('time'), ts, pred_part.split("|")[1].strip().upper()))
+            except IndexError:
+                pass
+    return predictions
+
+
+def _actual_direction(start_price: float, end_price: float) -> str:
+    if end_price > start_price:
+        return "BULLISH"
+    if end_price < start_price:
+        return "BEARISH"
+    return "NEUTRAL"
+
+
+def align_outcomes(open_times: np.ndarray, predicted_ms: np.ndarray, step_ms: int, horizon_ms: float,
+                   now_ms: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    把一批预测时间对齐到 K 线序列 (线上结算与回放引擎共用)，返回 (起始 K 线下标, 目标 K 线下标, 可结算)。
+    取包含该时间点的 K 线 (最后一根 open_time <= 目标时间)，K 线有缺口时也能对齐；
+    起始下标为 -1 表示预测早于 K 线范围。
+    """
+    start_open = (predicted_ms // step_ms) * step_ms
+    target_open = start_open + horizon_ms
+    start_idx = np.searchsorted(open_times, start_open, side="right") - 1
+    target_idx = np.searchsorted(open_times, target_open, side="right") - 1
+    # 目标时间之后已有 K 线 (目标 K 线本身缺失时取其前一根) 且该 K 线已收盘
+    ready = (open_times[-1] >= target_open) & (open_times[np.clip(target_idx, 0, None)] + step_ms <= now_ms)
+    return start_idx, target_idx, ready
+
+
+class _RollingAccuracy:
+    """最近 window 秒 (按预测时间) 的结算结果：计数随写入 / 过期增量维护"""
+
+    def __init__(self, window: float):
+        self.window = window
+        self.entries = deque()  # (predicted_at, id, correct)，按预测时间有序
+        self.ids = set()
+        self.evaluated = 0
+        self.correct = 0
+
+    def add(self, predicted_at: float, outcome_id: str, correct: int):
+        if outcome_id in self.ids or predicted_at < time.time() - self.window:
+            return
+        entry = (predicted_at, outcome_id, correct)
+        if self.entries and predicted_at < self.entries[-1][0]:
+            bisect.insort(self.entries, entry)  # 少见：补登的旧预测
+        else:
+            self.entries.append(entry)
+        self.ids.add(outcome_id)
+        self.evaluated += 1
+        self.correct += correct
+
+    def read(self) -> Tuple[int, int]:
+        cutoff = time.time() - self.window
+        while self.entries and self.entries[0][0] < cutoff:
+            _, outcome_id, correct = self.entries.popleft()
+            self.ids.discard(outcome_id)
+            self.evaluated -= 1
+            self.correct -= correct
+        return self.evaluated, self.correct
+
+
+class PredictionLedger:
+    def __init__(self, session_factory, window_hours: float):
+        self._session_factory = session_factory
+        self.window = window_hours * 3600
+        self._rolling: Dict[Tuple[int, str], _RollingAccuracy] = {}
+        self._loaded = False
+        self._backfilled = False
+        self._lock = asyncio.Lock()
+
+        self.recorded = 0
+        self.resolved = 0
+        self.expired = 0
+        self.last_resolve_s = 0.0
+
+    def _window_for(self, coin_type: int, horizon: str) -> _RollingAccuracy:
+        key = (coin_type, horizon)
+        if key not in self._rolling:
+            self._rolling[key] = _RollingAccuracy(self.window)
+        return self._rolling[key]
+
+    async def _ensure_loaded(self):
+        """启动后首次使用：建表，并把窗口内已结算的结果载入内存计数"""
+        if self._loaded:
+            return
+        await ensure_tables()
+        async with self._session_factory() as session:
+            result = await session.execute(
+                select(PredictionOutcome.coin_type, PredictionOutcome.horizon, PredictionOutcome.predicted_at,
+                       PredictionOutcome.id, PredictionOutcome.correct)
+                .where(PredictionOutcome.status == "resolved",
+                       PredictionOutcome.correct.is_not(None),
+                       PredictionOutcome.predicted_at >= time.time() - self.window)
+                .order_by(PredictionOutcome.predicted_at))
+            for coin_type, horizon, predicted_at, outcome_id, correct in result.all():
+                self._window_for(coin_type, horizon).add(predicted_at, outcome_id, correct)
+        self._loaded = True
+
+    # ==========================================
+    # 登记
+    # ==========================================
+    async def _insert(self, rows: Iterable[Dict[str, Any]]) -> int:
+        rows = {row["id"]: row for row in rows}
+        if not rows:
+            return 0
+        ids = list(rows)
+        async with self._session_factory() as session:
+            existing = set()
+            for i in range(0, len(ids), INSERT_CHUNK_SIZE):
+                existing.update((await session.execute(
+                    select(PredictionOutcome.id).where(PredictionOutcome.id.in_(ids[i:i + INSERT_CHUNK_SIZE])))).scalars())
+            new_rows = [row for outcome_id, row in rows.items() if outcome_id not in existing]
+            session.add_all(PredictionOutcome(status="pending", **row) for row in new_rows)
+            await session.commit()
+        self.recorded += len(new_rows)
+        return len(new_rows)
+
+    async def record(self, object_id: str, horizon: str, signal_time: str, direction: str,
+                     coin_type: Optional[int] = None):
+        """Agent 写入信号后登记一条预测 (coin_type 为空时按本地副本中的新闻币种，查不到则不登记)"""
+        predicted_at = _parse_signal_time(signal_time)
+        if predicted_at is None or not direction:
+            return
+        try:
+            await self._ensure_loaded()
+            if coin_type is None:
+                location = await news_store.get_item_location(object_id)
+                if location is None:
+                    # 猜错币种会按另一个币种的 K 线结算并计入其准确率，宁可不登记
+                    print(f"⚠️ [PredictionLedger] ID {object_id} 不在本地副本中，无法确定币种，跳过登记")
+                    return
+                coin_type = location["coin_type"]
+            await self._insert([{
+                "id": f"{object_id}|{horizon}|{signal_time}", "object_id": str(object_id),
+                "coin_type": coin_type, "horizon": horizon, "predicted_at": predicted_at,
+                "direction": direction.upper(),
+            }])
+        except Exception as e:
+            print(f"⚠️ [PredictionLedger] 登记预测失败 ID {object_id}: {e}")
+
+    async def record_from_analysis(self, object_id: str, horizon: str, analysis_json: str,
+                                   coin_type: Optional[int] = None):
+        """从刚追加完信号的 analysis JSON 中取最后一条信号登记"""
+        signals = extract_predictions({"analysis": analysis_json}, horizon)
+        if signals:
+            signal_time, _, direction = signals[-1]
+            await self.record(object_id, horizon, signal_time, direction, coin_type)
+
+    async def backfill(self):
+        """首次使用时从本地新闻副本补登最近的历史预测 (之后的新预测由 Agent 写入时登记)"""
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - timedelta(hours=FEEDBACK_WINDOW_HOURS + 24)
+        rows = []
+        for coin_type in COIN_SYMBOLS:
+            for item in await news_store.query_range(coin_type, start_time, end_time):
+                for horizon in HORIZONS:
+                    for signal_time, predicted_at, direction in extract_predictions(item, horizon):
+                        rows.append({
+                            "id": f"{item.get('objectId')}|{horizon}|{signal_time}",
+                            "object_id": str(item.get('objectId')), "coin_type": coin_type,
+                            "horizon": horizon, "predicted_at": predicted_at, "direction": direction,
+                        })
+        added = await self._insert(rows)
+        if added:
+            print(f"📒 [PredictionLedger] 补登历史预测 {added} 条")
+
+    # ==========================================
+    # 结算
+    # ==========================================
+    async def resolve_due(self) -> int:
+        """结算所有目标 K 线已收盘的预测，返回本次结算 (含过期) 的条数"""
+        async with self._lock:
+            await self._ensure_loaded()
+            if not self._backfilled:
+                await self.backfill()
+                self._backfilled = True
+
+            start = time.perf_counter()
+            now = time.time()
+            done = 0
+            for horizon, (interval, horizon_s, _) in HORIZONS.items():
+                step_s = interval_ms(interval) / 1000
+                async with self._session_factory() as session:
+                    # 目标 K 线 (预测所在 K 线 + 周期) 收盘后才能结算
+                    result = await session.execute(
+                        select(PredictionOutcome)
+                        .where(PredictionOutcome.status == "pending",
+                               PredictionOutcome.horizon == horizon,
+                               PredictionOutcome.predicted_at <= now - horizon_s - step_s))
+                    pending = list(result.scalars())
+                    by_coin: Dict[int, List[PredictionOutcome]] = {}
+                    for row in pending:
+                        by_coin.setdefault(row.coin_type, []).append(row)
+                    for coin_type, rows in by_coin.items():
+                        done += await self._resolve_rows(coin_type, horizon, interval, horizon_s, rows, now)
+                    await session.commit()
+            self.last_resolve_s = time.perf_counter() - start
+            return done
+
+    async def _resolve_rows(self, coin_type: int, horizon: str, interval: str, horizon_s: float,
+                            rows: List[PredictionOutcome], now: float) -> int:
+        symbol = COIN_SYMBOLS.get(coin_type)
+        step_ms = interval_ms(interval)
+        if symbol is None:
+            return 0
+        # 需要覆盖最早一条待结算预测所在的 K 线 (超出存储上限的会被标记为 expired)
+        oldest = min(row.predicted_at for row in rows)
+        needed = int((now - oldest) * 1000 // step_ms) + 2
+        candles = await candle_store.get(symbol, interval, needed)
+        if len(candles) == 0:
+            return 0
+
+        predicted_ms = np.array([row.predicted_at * 1000 for row in rows])
+        start_idx, target_idx, target_ready = align_outcomes(
+            candles["open_time"], predicted_ms, step_ms, horizon_s * 1000, now * 1000)
+        # 拿到了要求的全部 K 线仍早于范围的预测才判定为过期 (上游临时失败时下次再试)
+        complete = len(candles) >= min(needed, candle_store.max_rows)
+
+        done = 0
+        window = self._window_for(coin_type, horizon)
+        for row, si, ti, ready in zip(rows, start_idx, target_idx, target_ready):
+            if si < 0:
+                if not complete:
+                    continue
+                row.status = "expired"  # 早于可用 K 线范围，无法结算
+                row.resolved_at = now
+                self.expired += 1
+                done += 1
+                continue
+            if ti <= si or not ready:
+                continue
+            start_price = float(candles["open"][si])
+            end_price = float(candles["close"][ti])
+            actual = _actual_direction(start_price, end_price)
+            row.start_price, row.end_price, row.actual = start_price, end_price, actual
+            row.status = "resolved"
+            row.resolved_at = now
+            # 只有当预测不是 NEUTRAL 时才计入考核 (NEUTRAL 很难界定对错)
+            if row.direction != "NEUTRAL":
+                row.correct = int(row.direction == actual)
+                window.add(row.predicted_at, row.id, row.correct)
+            self.resolved += 1
+            done += 1
+        return done
+
+    async def prune(self):
+        cutoff = time.time() - RETENTION_DAYS * 86400
+        async with self._session_factory() as session:
+            await session.execute(delete(PredictionOutcome).where(PredictionOutcome.predicted_at < cutoff))
+            await session.commit()
+
+    async def run(self):
+        """后台结算循环 (由 main.py 的 lifespan 启动)"""
+        last_prune = 0.0
+        while True:
+            try:
+                await self.resolve_due()
+                if time.time() - last_prune > 3600:
+                    await self.prune()
+                    last_prune = time.time()
+            except Exception as e:
+                print(f"⚠️ [PredictionLedger] 结算失败: {e}")
+            await asyncio.sleep(RESOLVE_INTERVAL)
+
+    # ==========================================
+    # 读取
+    # ==========================================
+    def accuracy(self, coin_type: int, horizon: str = "1h") -> Tuple[int, int]:
+        """最近 FEEDBACK_WINDOW_HOURS 小时内 (评估次数, 正确次数)"""
+        return self._window_for(coin_type, horizon).read()
+
+    async def stats(self) -> dict:
+        rolling = {}
+        for (coin_type, horizon), window in self._rolling.items():
+            evaluated, correct = window.read()
+            rolling[f"{COIN_SYMBOLS.get(coin_type, coin_type)}:{horizon}"] = {
+                "evaluated": evaluated,
+                "accuracy": round(correct / evaluated, 3) if evaluated else None,
+            }
+        counts = {}
+        try:
+            await ensure_tables()
+            async with self._session_factory() as session:
+                result = await session.execute(
+                    select(PredictionOutcome.status, func.count()).group_by(PredictionOutcome.status))
+                counts = dict(result.all())
+        except Exception as e:
+            counts["error"] = str(e)
+        return {
+            "rolling": rolling,
+            "rows": counts,
+            "recorded": self.recorded,
+            "resolved": self.resolved,
+            "expired": self.expired,
+            "last_resolve_s": round(self.last_resolve_s, 3),
+        }
+
+
+prediction_ledger = PredictionLedger(async_session, window_hours=FEEDBACK_WINDOW_HOURS)
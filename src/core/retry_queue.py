@@ -0,0 +1,174 @@
+# src/core/retry_queue.py
+"""
+Pipeline 失败新闻的本地重试队列 (带死信表)。
+
+原先 Pipeline 只要抛出异常，采集器就立即把新闻标记为 Tag 4，一次 LLM / 爬虫超时就会丢掉一条真实新闻。
+现在失败的新闻先进入本地表 retry_queue：
+- 第 n 次失败后等待 RETRY_BASE_DELAY * 2^(n-1) 秒 (上限 RETRY_MAX_DELAY，带随机抖动) 再重试
+- 采集器每轮先处理新新闻，剩余容量 (RETRY_CYCLE_CAPACITY) 再取出到期的重试
+- 失败次数达到 RETRY_MAX_ATTEMPTS 才移入死信表 dead_letters (保留错误信息)，由采集器标记为 Tag 4
+"""
+import json
+import random
+import time
+from typing import Any, Dict, Iterable, List, Set
+
+from sqlalchemy import select, delete, func
+
+from config.settings import settings
+from src.core.database import async_session, ensure_tables
+from src.core.models import RetryQueueEntry, DeadLetterEntry
+
+
+class RetryQueue:
+    def __init__(self, session_factory, max_attempts: int, base_delay: float, max_delay: float):
+        self._session_factory = session_factory
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # 本进程已取出、正在重试的 objectId (成功后据此从队列删除)
+        self.in_flight: Set[str] = set()
+        self._ready = False
+
+        self.scheduled = 0
+        self.retried = 0
+        self.recovered = 0
+        self.dead = 0
+
+    async def _ensure(self):
+        if not self._ready:
+            await ensure_tables()
+            self._ready = True
+
+    def backoff_delay(self, attempts: int) -> float:
+        """第 attempts 次失败后的等待时间 (秒)，乘以 0.8~1.2 的随机抖动，避免同一批失败同时重试"""
+        delay = min(self.max_delay, self.base_delay * (2 ** max(0, attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    async def schedule(self, item: Dict[str, Any], error: str) -> bool:
+        """
+        登记一次处理失败。返回 True 表示已安排重试；False 表示重试次数用尽，已移入死信表。
+        """
+        await self._ensure()
+        obj_id = str(item.get('objectId'))
+        now = time.time()
+        self.in_flight.discard(obj_id)
+        error = (error or "")[:1000]
+
+        async with self._session_factory() as session:
+            row = await session.get(RetryQueueEntry, obj_id)
+            if row is None:
+                row = RetryQueueEntry(object_id=obj_id, item=json.dumps(item, ensure_ascii=False),
+                                      attempts=0, first_failed_at=now, next_attempt_at=now)
+                session.add(row)
+            row.attempts += 1
+            row.last_error = error
+
+            if row.attempts >= self.max_attempts:
+                await session.merge(DeadLetterEntry(
+                    object_id=obj_id, item=row.item, attempts=row.attempts,
+                    first_failed_at=row.first_failed_at, dead_at=now, last_error=error,
+                ))
+                await session.delete(row)
+                await session.commit()
+                self.dead += 1
+                print(f"💀 [RetryQueue] ID {obj_id} 失败 {self.max_attempts} 次，移入死信表: {error[:100]}")
+                return False
+
+            delay = self.backoff_delay(row.attempts)
+            row.next_attempt_at = now + delay
+            await session.commit()
+
+        self.scheduled += 1
+        print(f"🔁 [RetryQueue] ID {obj_id} 第 {row.attempts} 次失败，{int(delay)}s 后重试")
+        return True
+
+    async def take_due(self, limit: int) -> List[Dict[str, Any]]:
+        """
+        取出最多 limit 条到期的重试 (最早到期的优先)。
+        取出的记录把下次时间推后 RETRY_MAX_DELAY 作为租约：进程中途退出时不会丢失，租约到期后再次重试。
+        """
+        if limit <= 0:
+            return []
+        await self._ensure()
+        now = time.time()
+        items = []
+        async with self._session_factory() as session:
+            result = await session.execute(
+                select(RetryQueueEntry)
+                .where(RetryQueueEntry.next_attempt_at <= now)
+                .order_by(RetryQueueEntry.next_attempt_at)
+                .limit(limit))
+            for row in result.scalars():
+                row.next_attempt_at = now + self.max_delay
+                self.in_flight.add(row.object_id)
+                items.append(json.loads(row.item))
+            await session.commit()
+        self.retried += len(items)
+        return items
+
+    async def resolve(self, object_id: str, recovered: bool = True):
+        """重试成功 (或新闻已被其它途径处理) 后从队列删除"""
+        await self._ensure()
+        object_id = str(object_id)
+        self.in_flight.discard(object_id)
+        async with self._session_factory() as session:
+            await session.execute(delete(RetryQueueEntry).where(RetryQueueEntry.object_id == object_id))
+            await session.commit()
+        if recovered:
+            self.recovered += 1
+
+    async def queued_ids(self, object_ids: Iterable[str]) -> Set[str]:
+        """返回 object_ids 中已在重试队列里的 ID (这些新闻由重试流程处理，本轮不重复派发)"""
+        ids = [str(x) for x in object_ids if x]
+        if not ids:
+            return set()
+        await self._ensure()
+        async with self._session_factory() as session:
+            result = await session.execute(
+                select(RetryQueueEntry.object_id).where(RetryQueueEntry.object_id.in_(ids)))
+            return set(result.scalars())
+
+    async def stats(self) -> dict:
+        now = time.time()
+        data = {
+            "depth": 0,
+            "due": 0,
+            "in_flight": len(self.in_flight),
+            "oldest_failure_age_s": 0.0,
+            "attempts": {},
+            "dead_letters": 0,
+            "scheduled": self.scheduled,
+            "retried": self.retried,
+            "recovered": self.recovered,
+            "dead": self.dead,
+        }
+        try:
+            await self._ensure()
+            async with self._session_factory() as session:
+                depth, due, oldest = (await session.execute(select(
+                    func.count(),
+                    func.count().filter(RetryQueueEntry.next_attempt_at <= now),
+                    func.min(RetryQueueEntry.first_failed_at),
+                ).select_from(RetryQueueEntry))).one()
+                attempts = (await session.execute(
+                    select(RetryQueueEntry.attempts, func.count()).group_by(RetryQueueEntry.attempts))).all()
+                dead_letters = await session.scalar(select(func.count()).select_from(DeadLetterEntry))
+            data.update({
+                "depth": depth,
+                "due": due,
+                "oldest_failure_age_s": round(now - oldest, 1) if oldest else 0.0,
+                "attempts": {str(a): c for a, c in attempts},
+                "dead_letters": dead_letters or 0,
+            })
+        except Exception as e:
+            data["error"] = str(e)
+        return data
+
+
+retry_queue = RetryQueue(
+    async_session,
+    max_attempts=settings.RETRY_MAX_ATTEMPTS,
+    base_delay=settings.RETRY_BASE_DELAY,
+    max_delay=settings.RETRY_MAX_DELAY,
+)
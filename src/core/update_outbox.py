@@ -0,0 +1,263 @@
+# src/core/update_outbox.py
+"""
+updatePanicNews 的写后 (write-behind) 发件箱。
+
+所有回写上游的地方 (Pipeline 写入 / 噪音标记 / 失败标记 / 三个大模型 Agent 的信号) 只调用
+`await update_outbox.enqueue(payload)`：修改先持久化到本地表 update_outbox 并立即写穿到本地新闻副本，
+调用方不再等待上游写入延迟。后台 flusher 负责真正发送：
+- 同一 objectId 的多次修改合并成一条记录 (字段按先后顺序覆盖)，只发一次请求
+- 失败按指数退避 + 随机抖动重试，超过 OUTBOX_MAX_ATTEMPTS 次标记为 dead 保留在表中
+- 记录在数据库里，进程重启后继续发送
+- 尚未送达的修改会固定 (pin) 在本地副本上，后台同步不会用上游旧值覆盖
+"""
+import asyncio
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select, func
+
+from config.settings import settings
+from src.core import news_store
+from src.core.database import async_session, ensure_tables
+from src.core.http_client import get_http_client, endpoint_timeout
+from src.core.models import UpdateOutboxEntry
+
+# --- 配置 ---
+UPDATE_API_URL = f"{settings.DATACENTER_BASE_URL}/updatePanicNews"
+HEADERS = {'Content-Type': 'application/json'}
+
+FLUSH_INTERVAL = 1.0  # 没有新入队时的轮询间隔 (秒)
+FLUSH_BATCH_SIZE = 50  # 单次取出的最大记录数
+BACKOFF_BASE = 2.0
+BACKOFF_CAP = 600.0
+
+DeliveredCallback = Callable[[Dict[str, Any], Optional[int]], None]
+
+
+def backoff_delay(attempts: int) -> float:
+    """第 attempts 次失败后的等待时间：指数退避，上限 BACKOFF_CAP，乘以 0.5~1.5 的随机抖动"""
+    return min(BACKOFF_CAP, BACKOFF_BASE * (2 ** max(0, attempts - 1))) * random.uniform(0.5, 1.5)
+
+
+class UpdateOutbox:
+    def __init__(self, session_factory, concurrency: int, max_attempts: int):
+        self._session_factory = session_factory
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max_attempts
+        self._enqueue_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._listeners: List[DeliveredCallback] = []
+        self._loaded = False
+
+        self.enqueued = 0
+        self.coalesced = 0
+        self.delivered = 0
+        self.failures = 0
+        self.dead = 0
+        self.inline_fallbacks = 0
+        self._send_latencies: List[float] = []
+
+    def on_delivered(self, callback: DeliveredCallback):
+        """注册送达回调 callback(payload, verify_tag)，例如登记回读验证"""
+        self._listeners.append(callback)
+
+    async def _load_pins(self):
+        """启动后首次使用时，把库里尚未送达的修改重新固定到本地副本"""
+        if self._loaded:
+            return
+        await ensure_tables()
+        async with self._session_factory() as session:
+            result = await session.execute(
+                select(UpdateOutboxEntry).where(UpdateOutboxEntry.status == "pending"))
+            for row in result.scalars():
+                news_store.pin(row.object_id, json.loads(row.payload))
+        self._loaded = True
+
+    # ==========================================
+    # 入队
+    # ==========================================
+    async def enqueue(self, payload: Dict[str, Any], verify_tag: int = None):
+        """
+        持久化一条待写入的修改 (与同一 objectId 尚未发送的修改合并)，并立即写穿到本地副本。
+        数据库不可用时退化为直接发送。
+        """
+        obj_id = str(payload.get('objectId') or "")
+        if not obj_id:
+            return
+        now = time.time()
+
+        try:
+            await self._load_pins()
+            async with self._enqueue_lock:
+                async with self._session_factory() as session:
+                    result = await session.execute(
+                        select(UpdateOutboxEntry).where(UpdateOutboxEntry.object_id == obj_id,
+                                                        UpdateOutboxEntry.status == "pending"))
+                    row = result.scalars().first()
+                    if row is None:
+                        merged = dict(payload)
+                        session.add(UpdateOutboxEntry(
+                            object_id=obj_id, payload=json.dumps(merged, ensure_ascii=False),
+                            verify_tag=verify_tag, version=1, status="pending", attempts=0,
+                            created_at=now, updated_at=now, next_attempt_at=now,
+                        ))
+                    else:
+                        merged = {**json.loads(row.payload), **payload}
+                        row.payload = json.dumps(merged, ensure_ascii=False)
+                        row.version += 1
+                        row.updated_at = now
+                        if verify_tag is not None:
+                            row.verify_tag = verify_tag
+                        if row.attempts == 0:
+                            row.next_attempt_at = now
+                        self.coalesced += 1
+                    await session.commit()
+        except Exception as e:
+            print(f"⚠️ [Outbox] 入队失败，改为直接发送 ID {obj_id}: {e}")
+            self.inline_fallbacks += 1
+            ok, _ = await self._send(payload)
+            if ok:
+                await news_store.apply_update(payload)
+                self._notify(payload, verify_tag)
+            return
+
+        self.enqueued += 1
+        news_store.pin(obj_id, merged)
+        await news_store.apply_update(payload)
+        self._wake.set()
+
+    # ==========================================
+    # 发送
+    # ==========================================
+    async def _send(self, payload: Dict[str, Any]):
+        start = time.perf_counter()
+        try:
+            client = get_http_client(UPDATE_API_URL)
+            response = await client.post(UPDATE_API_URL, json=payload, headers=HEADERS,
+                                         timeout=endpoint_timeout(UPDATE_API_URL))
+            if response.status_code == 200:
+                return True, None
+            return False, f"API Code {response.status_code}"
+        except Exception as e:
+            return False, str(e) or type(e).__name__
+        finally:
+            self._send_latencies = (self._send_latencies + [time.perf_counter() - start])[-200:]
+
+    def _notify(self, payload: Dict[str, Any], verify_tag: Optional[int]):
+        for callback in self._listeners:
+            try:
+                callback(payload, verify_tag)
+            except Exception as e:
+                print(f"⚠️ [Outbox] 送达回调失败: {e}")
+
+    async def flush_due(self) -> int:
+        """发送所有到期的记录，返回成功送达的条数"""
+        async with self._flush_lock:
+            await self._load_pins()
+            now = time.time()
+            async with self._session_factory() as session:
+                result = await session.execute(
+                    select(UpdateOutboxEntry)
+                    .where(UpdateOutboxEntry.status == "pending", UpdateOutboxEntry.next_attempt_at <= now)
+                    .order_by(UpdateOutboxEntry.next_attempt_at)
+                    .limit(FLUSH_BATCH_SIZE))
+                snapshots = [(row.id, row.version, json.loads(row.payload), row.verify_tag)
+                             for row in result.scalars()]
+            if not snapshots:
+                return 0
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def send_one(payload):
+                async with semaphore:
+                    return await self._send(payload)
+
+            outcomes = await asyncio.gather(*(send_one(p) for _, _, p, _ in snapshots))
+
+            delivered = 0
+            now = time.time()
+            # 持有入队锁，避免处理结果期间有新修改合并进来却被当作已送达删除
+            async with self._enqueue_lock, self._session_factory() as session:
+                for (row_id, version, payload, verify_tag), (ok, error) in zip(snapshots, outcomes):
+                    row = await session.get(UpdateOutboxEntry, row_id)
+                    if row is None:
+                        continue
+                    if ok:
+                        delivered += 1
+                        self.delivered += 1
+                        self._notify(payload, verify_tag)
+                        if row.version == version:
+                            await session.delete(row)
+                            news_store.unpin(row.object_id)
+                        else:
+                            # 发送期间又合并了新的修改，保留记录，立即再发一次
+                            row.attempts = 0
+                            row.next_attempt_at = now
+                        continue
+
+                    self.failures += 1
+                    row.attempts += 1
+                    row.last_error = (error or "")[:500]
+                    row.updated_at = now
+                    if row.attempts >= self.max_attempts:
+                        row.status = "dead"
+                        self.dead += 1
+                        news_store.unpin(row.object_id)
+                        print(f"☠️ [Outbox] ID {row.object_id} 重试 {row.attempts} 次仍失败，标记为 dead: {error}")
+                    else:
+                        row.next_attempt_at = now + backoff_delay(row.attempts)
+                await session.commit()
+
+            print(f"📤 [Outbox] 发送 {len(snapshots)} 条: 成功 {delivered}, 失败 {len(snapshots) - delivered}")
+            return delivered
+
+    async def run(self):
+        """后台 flusher (由 main.py 的 lifespan 启动)"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush_due()
+            except Exception as e:
+                print(f"⚠️ [Outbox] 发送失败: {e}")
+                await asyncio.sleep(FLUSH_INTERVAL)
+
+    async def stats(self) -> dict:
+        counts, oldest = {}, None
+        try:
+            await ensure_tables()
+            async with self._session_factory() as session:
+                result = await session.execute(
+                    select(UpdateOutboxEntry.status, func.count(), func.min(UpdateOutboxEntry.created_at))
+                    .group_by(UpdateOutboxEntry.status))
+                for status, count, created in result.all():
+                    counts[status] = count
+                    if status == "pending":
+                        oldest = created
+        except Exception as e:
+            counts["error"] = str(e)
+        latencies = self._send_latencies
+        return {
+            "pending": counts.get("pending", 0),
+            "dead": counts.get("dead", 0),
+            "oldest_pending_s": round(time.time() - oldest, 1) if oldest else 0.0,
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "delivered": self.delivered,
+            "failures": self.failures,
+            "inline_fallbacks": self.inline_fallbacks,
+            "avg_send_s": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        }
+
+
+update_outbox = UpdateOutbox(
+    async_session,
+    concurrency=settings.OUTBOX_CONCURRENCY,
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+)
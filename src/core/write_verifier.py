@@ -0,0 +1,141 @@
+# src/core/write_verifier.py
+"""
+updatePanicNews 写入后的批量回读验证。
+
+原先每条写入成功后都要 sleep 2 秒，再单独回读上游确认 Tag，Pipeline 每条新闻都为此多等几秒。
+现在发件箱 (update_outbox) 送达一条写入后只登记一条 "待验证" 记录，后台每隔 VERIFY_INTERVAL 秒把所有到期的待验证 ID
+按币种合并成一次窗口查询批量确认：
+- Tag 与预期一致：确认完成
+- 超过 VERIFY_REWRITE_AFTER 秒仍未生效：重新写入 (最多 VERIFY_MAX_REWRITES 次)
+- 重写次数用尽：放弃并记录，供 /api/system/metrics 排查
+"""
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from src.core import news_store
+from src.core.update_outbox import update_outbox
+
+# --- 配置 ---
+VERIFY_INTERVAL = 5  # 后台批量验证间隔 (秒)
+VERIFY_DELAY = 2.0  # 写入后至少等待多久再验证 (上游写入延迟)
+VERIFY_REWRITE_AFTER = 60.0  # 写入后超过该时长仍未生效，则重新写入
+VERIFY_MAX_REWRITES = 2
+# 最近放弃的 ID 保留条数 (供排查)
+GAVE_UP_HISTORY = 50
+
+
+def _actual_tag(item: Dict[str, Any]) -> int:
+    value = item.get('newsTag') or item.get('newTag') or item.get('tag')
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+class WriteVerifier:
+    def __init__(self):
+        # object_id -> {"expected_tag", "payload", "written_at", "rewrites"}
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+        self.confirmed = 0
+        self.rewrites = 0
+        self.bulk_fetches = 0
+        self.gave_up: List[Dict[str, Any]] = []  # 最近 GAVE_UP_HISTORY 条
+        self.gave_up_total = 0
+        self._confirm_latencies: List[float] = []
+
+    def record(self, object_id: str, expected_tag: int, payload: Dict[str, Any]):
+        """写入成功后登记待验证 (不阻塞调用方)"""
+        existing = self.pending.get(object_id)
+        self.pending[object_id] = {
+            "expected_tag": expected_tag,
+            "payload": payload,
+            "written_at": time.time(),
+            "rewrites": existing["rewrites"] if existing else 0,
+        }
+
+    async def verify_pending(self) -> Dict[str, int]:
+        """
+        对所有到期的待验证 ID 做一次批量回读。返回本次的 确认 / 重写 / 放弃 数量。
+        """
+        async with self._lock:
+            now = time.time()
+            due = [oid for oid, p in self.pending.items() if now - p["written_at"] >= VERIFY_DELAY]
+            result = {"checked": len(due), "confirmed": 0, "rewritten": 0, "gave_up": 0}
+            if not due:
+                return result
+
+            upstream = await news_store.fetch_upstream_items(due)
+            self.bulk_fetches += 1
+
+            for oid in due:
+                entry = self.pending.get(oid)
+                if entry is None:
+                    continue
+                item = upstream.get(oid)
+                if item is not None and _actual_tag(item) == entry["expected_tag"]:
+                    del self.pending[oid]
+                    self.confirmed += 1
+                    result["confirmed"] += 1
+                    self._confirm_latencies = (self._confirm_latencies + [now - entry["written_at"]])[-200:]
+                    continue
+
+                if now - entry["written_at"] < VERIFY_REWRITE_AFTER:
+                    continue  # 还在等待上游生效 (或本次回读失败)，下一轮再查
+
+                if entry["rewrites"] >= VERIFY_MAX_REWRITES:
+                    del self.pending[oid]
+                    self.gave_up = (self.gave_up + [{"objectId": oid, "expected_tag": entry["expected_tag"],
+                                                     "at": now}])[-GAVE_UP_HISTORY:]
+                    result["gave_up"] += 1
+                    self.gave_up_total += 1
+                    print(f"💊 [WriteVerifier] ID {oid} 重写 {entry['rewrites']} 次仍未生效，放弃验证")
+                    continue
+
+                entry["rewrites"] += 1
+                entry["written_at"] = now
+                self.rewrites += 1
+                result["rewritten"] += 1
+                # 通过发件箱重新写入，送达后会再次登记验证 (保留已重写次数)
+                await update_outbox.enqueue(entry["payload"], verify_tag=entry["expected_tag"])
+
+            if any(result[k] for k in ("confirmed", "rewritten", "gave_up")):
+                print(f"🔎 [WriteVerifier] 批量验证 {result['checked']} 条: 确认 {result['confirmed']}, "
+                      f"重写 {result['rewritten']}, 放弃 {result['gave_up']}, 剩余 {len(self.pending)}")
+            return result
+
+    async def run(self):
+        """后台循环 (由 main.py 的 lifespan 启动)"""
+        while True:
+            await asyncio.sleep(VERIFY_INTERVAL)
+            try:
+                await self.verify_pending()
+            except Exception as e:
+                print(f"⚠️ [WriteVerifier] 批量验证失败: {e}")
+
+    def stats(self) -> dict:
+        now = time.time()
+        ages = [now - p["written_at"] for p in self.pending.values()]
+        latencies = self._confirm_latencies
+        return {
+            "pending": len(self.pending),
+            "oldest_pending_s": round(max(ages), 1) if ages else 0.0,
+            "confirmed": self.confirmed,
+            "rewrites": self.rewrites,
+            "bulk_fetches": self.bulk_fetches,
+            "avg_confirm_s": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            "gave_up": self.gave_up[-10:],
+            "gave_up_total": self.gave_up_total,
+        }
+
+
+write_verifier = WriteVerifier()
+
+
+def _on_outbox_delivered(payload: Dict[str, Any], verify_tag):
+    if verify_tag is not None and payload.get('objectId'):
+        write_verifier.record(str(payload['objectId']), verify_tag, payload)
+
+
+update_outbox.on_delivered(_on_outbox_delivered)
@@ -2,15 +2,13 @@
 import sys
 import os
 import asyncio
-import time
-import json
 import uvicorn
 from contextlib import asynccontextmanager
-from datetime import datetime, timedelta
-import httpx
+from typing import Optional
+from datetime import datetime
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Form, Response
-from fastapi.responses import RedirectResponse, HTMLResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Form, Response, Query
+from fastapi.responses import RedirectResponse, HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -23,21 +21,28 @@ from src.schemas.data_models import RawDataInput
 from src.agents.large_agents.trend_agent import run_trend_analysis
 from src.agents.large_agents.anomaly_agent import run_anomaly_detection
 from src.agents.large_agents.short_term_agent import run_short_term_analysis
-from src.core.collectors import run_news_collector
+from src.core.collectors import run_news_collector, COLLECTOR_STATS, dedup_store
+from src.core import news_store
+from src.core.database import ensure_tables
+from src.core.http_client import http_clients
+from src.core.llm_limits import get_model_slot_stats
+from src.core.llm_cache import llm_cache
+from src.core.near_dup import near_dup_index
+from src.agents.small_agents.browser_pool import browser_pool
+from src.agents.small_agents.crawler_agent import get_crawler_tier_stats
+from src.agents.small_agents.crawl_cache import crawl_cache
+from src.agents.small_agents.crawl_scheduler import crawl_scheduler
+from src.core.write_verifier import write_verifier
+from src.core.candle_store import candle_store
+from src.core.prediction_ledger import prediction_ledger
+from src.core.update_outbox import update_outbox
+from src.core.retry_queue import retry_queue
+from src.core.dashboard_snapshot import (dashboard_snapshots, etag_matches, encode_for, build_delta, encode_delta,
+                                         delta_events, build_news_detail, DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT)
 
 # --- 配置 ---
 ACCESS_PASSWORD = "admin"
 COOKIE_NAME = "mas_quant_session"
-FETCH_API_URL = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto/fetchCryptoPanic"
-HEADERS = {'Content-Type': 'application/json'}
-
-# 缓存配置
-GLOBAL_DATA_CACHE = {
-    "data": [],
-    "last_updated": 0,
-    "lock": asyncio.Lock()
-}
-CACHE_DURATION = 10
 
 if sys.platform.startswith("win"):
     try:
@@ -51,6 +56,10 @@ if sys.platform.startswith("win"):
 # ==========================================
 # 🧠 [修改] 中央主控调度器 (Master Orchestrator)
 # ==========================================
+# 调度器在周期末尾派生的任务 (异常检测)，应用关闭时与其他后台任务一并取消
+_spawned_tasks = set()
+
+
 async def master_scheduler():
     """
     负责严格按照时间轴调度任务：
@@ -121,7 +130,9 @@ async def master_scheduler():
                     print(f"❌ 24H Agent出错: {e}")
 
             # --- 阶段 4: 异常检测 (挂在周期末尾) ---
-            asyncio.create_task(run_anomaly_detection())
+            anomaly_task = asyncio.create_task(run_anomaly_detection())
+            _spawned_tasks.add(anomaly_task)
+            anomaly_task.add_done_callback(_spawned_tasks.discard)
 
             print(f"✅ [Cycle End] 本轮任务全部完成。等待下一周期...")
 
@@ -138,12 +149,57 @@ async def master_scheduler():
 async def lifespan(app: FastAPI):
     print("Application starting up...")
 
+    # 初始化全局共享 HTTP 连接池
+    http_clients.start()
+
+    # 初始化本地数据库表 (去重索引、新闻副本等)
+    try:
+        await ensure_tables()
+    except Exception as e:
+        print(f"⚠️ [Lifespan] 数据库初始化失败: {e}")
+
+    # 所有后台循环的句柄，关闭时先取消并等待它们退出，再释放其使用的资源
+    background_tasks = []
+
+    # 启动本地新闻副本的后台同步器 (所有模块都从本地副本读取新闻)
+    background_tasks.append(asyncio.create_task(news_store.run_news_syncer()))
+
+    # 启动 updatePanicNews 发件箱的后台发送 (重启前未送达的修改会继续发送)
+    background_tasks.append(asyncio.create_task(update_outbox.run()))
+
+    # 启动 Dashboard 快照的后台刷新 (数据变化后主动重建，接口只返回现成的快照)
+    background_tasks.append(asyncio.create_task(dashboard_snapshots.run_refresher()))
+
+    # 启动写入结果的批量回读验证
+    background_tasks.append(asyncio.create_task(write_verifier.run()))
+
+    # 启动预测账本的后台结算 (目标 K 线收盘后结算，供短线 Agent 读取滚动准确率)
+    background_tasks.append(asyncio.create_task(prediction_ledger.run()))
+
+    # 启动常驻的爬虫浏览器池 (失败时首次抓取会再尝试启动)
+    try:
+        await browser_pool.start()
+    except Exception as e:
+        print(f"⚠️ [Lifespan] 浏览器池启动失败: {e}")
+    background_tasks.append(asyncio.create_task(browser_pool.run_health_checks()))
+
     # 启动唯一的主控调度器，不再分别启动多个后台任务
-    asyncio.create_task(master_scheduler())
+    background_tasks.append(asyncio.create_task(master_scheduler()))
 
     print("✅ [Lifespan] Master Scheduler 已启动。")
     yield
     print("Application shutting down...")
+    background_tasks.extend(_spawned_tasks)
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    # 尽量把已到期的回写发出去，剩余的留在表里下次启动继续
+    try:
+        await update_outbox.flush_due()
+    except Exception as e:
+        print(f"⚠️ [Lifespan] 发件箱发送失败: {e}")
+    await browser_pool.close()
+    await http_clients.aclose()
 
 
 app = FastAPI(title="MAS-Quant Pro Dashboard", version="2.3.0", lifespan=lifespan)
@@ -240,208 +296,91 @@ async def dashboard_view(request: Request):
 
 
 # ==========================================
-# 📡 数据接口 (修复了时间转换逻辑 + 增加缓存 + JSON结构化解析)
+# 📡 数据接口 (预计算快照 + ETag，整理逻辑见 src/core/dashboard_snapshot.py)
 # ==========================================
 
-async def fetch_coin_data(client: httpx.AsyncClient, coin_type: int, coin_name: str):
-    # 【修改后】使用 UTC 时间，并添加 'T' 分隔符
-    end_time = datetime.utcnow()  # 建议统一用 UTC 请求
-    start_time = end_time - timedelta(hours=72)
-
-    json_data = {
-        "type": coin_type,
-        "startTime": start_time.strftime("%Y-%m-%dT%H:%M:%S"),
-        "endTime": end_time.strftime("%Y-%m-%dT%H:%M:%S")
-    }
-    try:
-        response = await client.post(FETCH_API_URL, headers=HEADERS, json=json_data, timeout=15.0)
-        if response.status_code == 200:
-            data = response.json()
-            cleaned_data = []
-            found_tags_count = 0
-
-            for item in data:
-                # --- 1. Tag 过滤逻辑 ---
-                final_tag = 0
-                candidate_keys = ['newsTag', 'newTag', 'tag', 'trendTag']
-                for key in candidate_keys:
-                    raw_val = item.get(key)
-                    if raw_val is None or raw_val == "null" or str(raw_val).strip() == "": continue
-                    try:
-                        val_int = int(float(raw_val))
-                        # 假设我们只关心有意义的 Tag (根据你的业务逻辑调整)
-                        if val_int in [1, 2, 3]:
-                            final_tag = val_int
-                            break
-                    except (ValueError, TypeError):
-                        continue
-
-                # 如果有有效 Tag，计数加一
-                if final_tag != 0: found_tags_count += 1
-
-                # --- 2. 基础字段赋值 ---
-                item['coin_type'] = coin_name
-                item['newsTag'] = final_tag
-                item['summary'] = item.get('summary') or ""
-
-                # 设置列表显示的简略内容
-                content_display = item.get('summary')
-                if not content_display: content_display = item.get('title')
-                item['display_content'] = content_display
-
-                # --- 3. Analysis 字段 JSON 解析与提取 (核心修改) ---
-                raw_analysis = item.get('analysis') or ""
-                structured_analysis = {}
-                item['latest_trend'] = None  # 存放最新的 24H 趋势对象
-                item['latest_short_term'] = None  # 存放最新的 1H 短线对象
-
-                try:
-                    # 尝试解析 JSON
-                    if raw_analysis.strip().startswith("{"):
-                        structured_analysis = json.loads(raw_analysis)
-                    else:
-                        raise ValueError("Not JSON")
-
-                    # A. 提取最新的 24h 趋势 (Trend Agent)
-                    # 逻辑：取 trend_signals 列表的最后一个元素
-                    if "trend_signals" in structured_analysis and \
-                            isinstance(structured_analysis["trend_signals"], list) and \
-                            len(structured_analysis["trend_signals"]) > 0:
-                        item['latest_trend'] = structured_analysis["trend_signals"][-1]
-
-                    # B. 提取最新的 1h 短线 (Short Term Agent)
-                    # 逻辑：取 short_term_signals 列表的最后一个元素
-                    if "short_term_signals" in structured_analysis and \
-                            isinstance(structured_analysis["short_term_signals"], list) and \
-                            len(structured_analysis["short_term_signals"]) > 0:
-                        item['latest_short_term'] = structured_analysis["short_term_signals"][-1]
-
-                except (json.JSONDecodeError, ValueError, TypeError):
-                    # 兼容旧数据格式 (非 JSON)
-                    structured_analysis = {
-                        "base_analysis": raw_analysis,
-                        "trend_signals": [],
-                        "short_term_signals": []
-                    }
-
-                # 将结构化后的对象挂载到 item 上，方便前端调用详情
-                item['structured_analysis'] = structured_analysis
-                # 保留原始 string 以备不时之需
-                item['analysis'] = raw_analysis
-
-                cleaned_data.append(item)
-
-            if found_tags_count > 0:
-                print(f"✅ [API] {coin_name}: Fetched {found_tags_count} valid Tags")
-            return cleaned_data
-        else:
-            print(f"API Error fetching {coin_name}: Status {response.status_code}")
-    except Exception as e:
-        print(f"Error fetching {coin_name}: {e}")
-    return []
-
-
 @app.get("/api/dashboard/data")
-async def get_dashboard_data(response: Response, request: Request):
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
-
-    current_time = time.time()
-
-    # ========================================================
-    # 🛡️ 缓存检查层 (Cache Layer)
-    # ========================================================
-    async with GLOBAL_DATA_CACHE["lock"]:  # 加锁
-        # 如果距离上次更新不足 CACHE_DURATION 秒，且缓存里有数据
-        if current_time - GLOBAL_DATA_CACHE["last_updated"] < CACHE_DURATION:
-            if GLOBAL_DATA_CACHE["data"]:
-                # 直接返回缓存的数据，不请求外部 API
-                # print("🛡️ [Cache] Serving cached data (Skipping API call)")
-
-                # 计算当前的显示时间 (UTC+8)
-                utc_now = datetime.utcnow()
-                beijing_time = utc_now + timedelta(hours=8)
-
-                return {
-                    "updated_at": beijing_time.strftime("%H:%M:%S"),
-                    "total_count": len(GLOBAL_DATA_CACHE["data"]),
-                    "data": GLOBAL_DATA_CACHE["data"]
-                }
-    # ========================================================
-
-    # 如果缓存过期或为空，执行真实的 API 请求
-    # print("🔄 [API] Cache expired, fetching new data...")
-
+async def get_dashboard_data(request: Request,
+                             coin: Optional[str] = Query(None, description="BTC / ETH"),
+                             tag: Optional[int] = Query(None, ge=0, le=3,
+                                                        description="1 利好 / 2 中性 / 3 利空 / 0 未分析 (含噪音与处理失败)"),
+                             start: Optional[float] = Query(None, description="起始时间 (UTC 秒级时间戳)"),
+                             end: Optional[float] = Query(None, description="结束时间 (UTC 秒级时间戳)"),
+                             page: Optional[int] = Query(None, ge=1),
+                             limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT)):
+    """
+    返回新闻列表的紧凑投影 (完整分析见 /api/news/{objectId})，支持 ETag / 304 与 gzip / brotli。
+    - 不带参数：直接返回预计算快照的响应字节 (只在新闻数据变化时重建)
+    - 带 coin / tag / start / end / page / limit：从快照的内存索引中筛选并分页
+    """
     try:
-        async with httpx.AsyncClient() as client:
-            results = await asyncio.gather(
-                fetch_coin_data(client, 1, "BTC"),
-                fetch_coin_data(client, 2, "ETH")
-            )
-
-        all_news = []
-        for res in results:
-            if res: all_news.extend(res)
-
-        all_news.sort(key=lambda x: str(x.get('time', '0')), reverse=True)
-
-        # --- 【增强版】调试与多格式兼容时间转换 ---
-        # print(f"DEBUG: Processing {len(all_news)} items...")  # 调试信息
-
-        for item in all_news:
-            raw_time = item.get('time')
-            if raw_time and isinstance(raw_time, str):
-                try:
-                    # 1. 预处理：不管是 "2025-12-18T12:00:00Z" 还是 "2025-12-18 12:00:00"
-                    # 先把 T 换成空格，把 Z 去掉，这样下面 strptime 就能统一用空格格式处理
-                    clean_time = raw_time.replace("T", " ").replace("Z", "").strip()
-
-                    # 2. 去除毫秒
-                    if "." in clean_time:
-                        clean_time = clean_time.split(".")[0]
-
-                    # 3. 解析 (因为上面replace了T，这里只用匹配空格格式即可)
-                    dt_obj = datetime.strptime(clean_time, "%Y-%m-%d %H:%M:%S")
+        snapshot = await dashboard_snapshots.get()
+    except Exception as e:
+        print(f"❌ [Dashboard Error] {e}")
+        # 重建失败时返回旧快照兜底，防止前端白屏
+        snapshot = dashboard_snapshots.current
+        if snapshot is None:
+            return JSONResponse({"updated_at": "Error", "total_count": 0, "data": []})
+
+    headers = {
+        "ETag": snapshot.etag,
+        # 允许浏览器缓存，但每次都要带 If-None-Match 回来验证
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    accept_encoding = request.headers.get("accept-encoding", "")
+    if all(v is None for v in (coin, tag, start, end, page, limit)):
+        if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+            return Response(status_code=304, headers=headers)
+        body, encoding = snapshot.encoded(accept_encoding)
+    else:
+        etag, body = snapshot.render_page(coin.upper() if coin else None, tag, start, end,
+                                          page or 1, limit or DEFAULT_PAGE_LIMIT)
+        headers["ETag"] = etag
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        body, encoding = encode_for(accept_encoding, body)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/news/{object_id}")
+async def get_news_detail(object_id: str):
+    """
+    单条新闻详情：analysis 原文、结构化分析 (含全部信号的 reasoning / chain_of_thought)，由前端按需加载。
+    """
+    detail = await build_news_detail(object_id)
+    if detail is None:
+        return JSONResponse({"error": "News not found", "objectId": object_id}, status_code=404)
+    return JSONResponse(detail)
 
-                    # 4. 加上 8 小时 (UTC -> 北京时间)
-                    dt_bj = dt_obj + timedelta(hours=8)
 
-                    # 5. 存回
-                    item['time'] = dt_bj.strftime("%Y-%m-%d %H:%M:%S")
+@app.get("/api/dashboard/delta")
+async def get_dashboard_delta(since: int = 0):
+    """
+    增量接口：只返回游标 since (全量接口或上次增量返回的 cursor) 之后新增 / 更新的条目和新信号。
+    """
+    delta = await build_delta(since)
+    return Response(content=encode_delta(delta), media_type="application/json",
+                    headers={"Cache-Control": "no-store"})
 
-                except Exception as e:
-                    # 如果解析失败，保留原样，方便调试
-                    print(f"⚠️ 时间解析错误 [{raw_time}]: {e}")
-                    pass
-        # --------------------------------------------------------
-
-        # ========================================================
-        # 💾 更新缓存 (Update Cache)
-        # ========================================================
-        async with GLOBAL_DATA_CACHE["lock"]:
-            GLOBAL_DATA_CACHE["data"] = all_news
-            GLOBAL_DATA_CACHE["last_updated"] = time.time()
-        # ========================================================
-
-        # Header 上次更新时间 (UTC+8)
-        utc_now = datetime.utcnow()
-        beijing_time = utc_now + timedelta(hours=8)
-
-        return {
-            "updated_at": beijing_time.strftime("%H:%M:%S"),
-            "total_count": len(all_news),
-            "data": all_news
-        }
 
-    except Exception as e:
-        print(f"❌ [Dashboard Error] {e}")
-        # 如果 API 请求失败，尝试返回旧的缓存兜底，防止前端白屏
-        return {
-            "updated_at": "Error (Cache Served)",
-            "total_count": len(GLOBAL_DATA_CACHE["data"]),
-            "data": GLOBAL_DATA_CACHE["data"]
-        }
+@app.get("/api/dashboard/stream")
+async def stream_dashboard(request: Request, since: Optional[int] = None):
+    """
+    SSE 推送：本地新闻副本一有写入 (采集器 / Agent 回写) 就推送增量，断线重连时按 Last-Event-ID 续传。
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    if since is None:
+        since = news_store.data_version()
+    return StreamingResponse(
+        delta_events(since, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.websocket("/ws/data_ingest")
@@ -467,33 +406,55 @@ async def http_endpoint(raw_data: RawDataInput):
 @app.get("/api/market/history")
 async def get_market_history(symbol: str = "BTCUSDT", interval: str = "1h", limit: int = 24):
     """
-    代理币安 K 线数据，用于前端绘制价格走势图
+    代理币安 K 线数据，用于前端绘制价格走势图 (读取共享 K 线存储，不再每次请求币安)
     """
-    binance_url = "https://api.binance.com/api/v3/klines"
-    params = {"symbol": symbol, "interval": interval, "limit": limit}
-
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(binance_url, params=params, timeout=10.0)
-            if resp.status_code == 200:
-                raw_data = resp.json()
-                # 简化数据，只返回 [时间戳(ms), 开盘, 最高, 最低, 收盘]
-                # 币安返回格式: [Open time, Open, High, Low, Close, Volume, ...]
-                cleaned = []
-                for item in raw_data:
-                    cleaned.append({
-                        "time": item[0],
-                        "open": float(item[1]),
-                        "high": float(item[2]),
-                        "low": float(item[3]),
-                        "close": float(item[4])
-                    })
-                return {"symbol": symbol, "data": cleaned}
-            else:
-                return {"error": "Binance API Error", "data": []}
-    except Exception as e:
-        print(f"❌ [MarketAPI] Error: {e}")
+        candles = await candle_store.get(symbol, interval, limit)
+    except ValueError as e:
         return {"error": str(e), "data": []}
+    if len(candles) == 0:
+        return {"error": "Binance API Error", "data": []}
+    # 简化数据，只返回 [时间戳(ms), 开盘, 最高, 最低, 收盘]
+    cleaned = [
+        {
+            "time": int(c["open_time"]),
+            "open": float(c["open"]),
+            "high": float(c["high"]),
+            "low": float(c["low"]),
+            "close": float(c["close"])
+        }
+        for c in candles
+    ]
+    return {"symbol": symbol, "data": cleaned}
+
+
+# ==========================================
+# 📊 [新增] 运行状态监控接口
+# ==========================================
+@app.get("/api/system/metrics")
+async def get_system_metrics():
+    """
+    返回采集器吞吐、队列等待以及 LLM 并发槽位占用等运行指标
+    """
+    return {
+        "collector": COLLECTOR_STATS,
+        "llm_slots": get_model_slot_stats(),
+        "dedup": dedup_store.stats(),
+        "news_store": news_store.get_store_stats(),
+        "llm_cache": llm_cache.stats(),
+        "near_dup": near_dup_index.stats(),
+        "browser_pool": browser_pool.stats(),
+        "crawler_tiers": get_crawler_tier_stats(),
+        "crawl_cache": crawl_cache.stats(),
+        "crawl_hosts": crawl_scheduler.stats(),
+        "write_verify": write_verifier.stats(),
+        "outbox": await update_outbox.stats(),
+        "retry_queue": await retry_queue.stats(),
+        "dashboard_snapshot": dashboard_snapshots.stats(),
+        "candles": candle_store.stats(),
+        "predictions": await prediction_ledger.stats(),
+        "http_pools": http_clients.stats(),
+    }
 
 
 if __name__ == "__main__":
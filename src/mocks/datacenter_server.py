@@ -0,0 +1,370 @@
+# src/mocks/datacenter_server.py
+"""
+dataCenter 接口 (fetchCryptoPanic / updatePanicNews) 的本地模拟服务，用于离线压测采集、回写与验证链路。
+
+把 DATACENTER_BASE_URL 指向本服务 (默认 http://127.0.0.1:15008/10Ai/dataCenter/crypto) 即可；
+create_app() 也可以通过 httpx.ASGITransport 在进程内使用。
+
+- 内存中的类 Mongo 文档库：按币种 (type) 维护按时间排序的索引，窗口查询为二分查找
+- 保留上游的字段习惯：
+  未处理的新闻不带 newsTag / summary / analysis 字段 (Mongo 不返回未写入的字段)；
+  updatePanicNews 的 tag 存为 newsTag，其余字段 (newsTag / newTag / trendTag / summary / analysis / content) 原样 $set，
+  analysis 同时写入 comment；部分新闻的 newsTag 是字符串 ("2")；
+  time 大多为 "2025-01-01T12:00:00.000Z"，部分为 "2025-01-01 12:00:00"；startTime / endTime 两种格式都接受
+- 可注入：接口延迟 (基础延迟 + 按返回条数计的序列化耗时，带抖动)、500 错误率、写入后延迟可见 (读到旧值)
+- 合成新闻生成器：启动时预填 seed_hours 小时的历史，之后按 feed_rate_per_min (每个币种每分钟条数，泊松到达)
+  在每次查询时补齐到当前时间，可把上游放大到线上的 10~100 倍
+- 运行统计见 GET /mock/stats；POST /mock/config 调整参数，POST /mock/seed 追加历史新闻
+
+updatePanicNews 的响应体格式 ({"code": 200, "msg": "success", "data": {...}}) 为推测值，本系统只检查 HTTP 状态码。
+
+用法:
+    python -m src.mocks.datacenter_server --port 15008 --feed-rate-per-min 50 --write-visibility-delay 2
+    DATACENTER_BASE_URL=http://127.0.0.1:15008/10Ai/dataCenter/crypto python -m src.main
+"""
+import argparse
+import asyncio
+import bisect
+import heapq
+import json
+import random
+import time
+from dataclasses import dataclass, asdict, fields
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+# --- 配置 ---
+API_PREFIX = "/10Ai/dataCenter/crypto"
+COIN_NAMES = {1: "BTC", 2: "ETH"}
+REQUEST_TIME_FORMATS = ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S")
+CONTENT_FIELDS = ("tag", "summary", "analysis", "content")  # updatePanicNews 至少要带其中一个
+
+EVENTS = [
+    ("price surges past key resistance as shorts get squeezed", 1),
+    ("spot ETF records another day of strong net inflows", 1),
+    ("whales accumulate as exchange balances hit multi-year low", 1),
+    ("network upgrade goes live on mainnet without issues", 1),
+    ("slides as traders brace for hawkish Fed minutes", 3),
+    ("large holder moves coins to exchanges, sparking sell-off fears", 3),
+    ("regulator delays decision on new fund applications", 3),
+    ("futures open interest climbs while funding stays neutral", 2),
+    ("trades sideways ahead of CPI release", 2),
+    ("analysts split on the next move after a quiet weekend", 2),
+]
+NOISE_TITLES = [
+    "Top 5 altcoins to watch this week",
+    "New meme coin presale raises millions in hours",
+    "How to set up a hardware wallet in 10 minutes",
+]
+SOURCES = ["coindesk.com", "cointelegraph.com", "theblock.co", "decrypt.co", "bitcoinist.com"]
+
+
+@dataclass
+class MockDataCenterConfig:
+    fetch_latency_ms: float = 80.0  # fetchCryptoPanic 基础延迟
+    fetch_ms_per_item: float = 0.02  # 按返回条数计的额外耗时
+    update_latency_ms: float = 40.0
+    latency_jitter: float = 0.3  # 延迟上下浮动比例
+    error_rate: float = 0.0  # 随机返回 500 的比例
+    write_visibility_delay: float = 0.0  # 写入后多少秒才能读到 (模拟上游写入延迟)
+    seed_hours: float = 72.0  # 启动时预填的历史时长
+    seed_per_hour: float = 20.0  # 预填历史中每个币种每小时的条数
+    feed_rate_per_min: float = 0.5  # 每个币种每分钟新到的新闻条数
+    tagged_ratio: float = 0.6  # 预填历史中已处理 (带 newsTag / summary / analysis) 的比例
+    noise_ratio: float = 0.2  # 与 BTC/ETH 无关的噪音新闻比例
+    string_tag_ratio: float = 0.1  # newsTag 以字符串保存的比例
+    space_time_ratio: float = 0.2  # time 使用 "YYYY-MM-DD HH:MM:SS" 格式的比例
+    seed: int = 0
+
+    def update(self, data: Dict[str, Any]):
+        known = {f.name for f in fields(self)}
+        for key, value in data.items():
+            if key not in known:
+                raise ValueError(f"Unknown config field: {key}")
+            setattr(self, key, type(getattr(self, key))(value))
+
+
+def parse_request_time(value: Any) -> float:
+    """startTime / endTime (UTC，两种格式) -> 时间戳"""
+    for fmt in REQUEST_TIME_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), fmt).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"invalid time: {value}")
+
+
+# ==========================================
+# 合成新闻
+# ==========================================
+class NewsGenerator:
+    def __init__(self, config: MockDataCenterConfig, rng: random.Random):
+        self.config = config
+        self.rng = rng
+        self.counter = 0
+
+    def make(self, coin_type: int, epoch: float, tagged: bool) -> Dict[str, Any]:
+        rng = self.rng
+        self.counter += 1
+        coin = COIN_NAMES.get(coin_type, "BTC")
+        if rng.random() < self.config.noise_ratio:
+            title, sentiment = rng.choice(NOISE_TITLES), 4
+        else:
+            event, sentiment = rng.choice(EVENTS)
+            title = f"{coin} {event}"
+        dt = datetime.fromtimestamp(epoch, timezone.utc)
+        if rng.random() < self.config.space_time_ratio:
+            time_str = dt.strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            time_str = dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+        slug = title.lower().replace(",", "").replace(" ", "-")[:60]
+        doc = {
+            "objectId": f"{rng.getrandbits(96):024x}",
+            "title": title,
+            "description": f"{title}. Market participants are watching {coin} closely (mock #{self.counter}).",
+            "link": f"https://cryptopanic.com/news/{self.counter}/{slug}",
+            "domain": rng.choice(SOURCES),
+            "time": time_str,
+        }
+        if tagged:
+            tag = sentiment if sentiment != 4 or rng.random() < 0.5 else 2
+            doc["newsTag"] = str(tag) if rng.random() < self.config.string_tag_ratio else tag
+            doc["summary"] = f"[mock] {title}"
+            doc["analysis"] = "Status:Ignored" if tag == 4 else \
+                f"Impact:{rng.choice(['HIGH', 'MEDIUM', 'LOW'])}|Score:{rng.uniform(-1, 1):.2f}"
+        return doc
+
+
+# ==========================================
+# 文档库
+# ==========================================
+class DocumentStore:
+    def __init__(self, config: MockDataCenterConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.generator = NewsGenerator(config, self.rng)
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        # 每个币种: (按时间正序的时间戳列表, 对应的 objectId 列表)
+        self.index: Dict[int, Tuple[List[float], List[str]]] = {ct: ([], []) for ct in COIN_NAMES}
+        self._next_arrival: Dict[int, float] = {}
+        self._invisible: List[Tuple[float, int, str, Dict[str, Any]]] = []  # (可见时间, 序号, objectId, 字段)
+        self._write_seq = 0
+
+    def insert(self, coin_type: int, doc: Dict[str, Any], epoch: float):
+        epochs, ids = self.index.setdefault(coin_type, ([], []))
+        pos = bisect.bisect_right(epochs, epoch)
+        epochs.insert(pos, epoch)
+        ids.insert(pos, doc["objectId"])
+        self.docs[doc["objectId"]] = doc
+
+    def seed(self, hours: float, per_hour: float, tagged_ratio: float, end: float = None,
+             coin_types: List[int] = None) -> int:
+        """在 [end - hours, end] 内按均匀随机时间生成历史新闻 (批量生成后一次排序合并进索引)"""
+        end = end or time.time()
+        count = 0
+        for coin_type in coin_types or list(COIN_NAMES):
+            epochs, ids = self.index.setdefault(coin_type, ([], []))
+            pairs = list(zip(epochs, ids))
+            for _ in range(int(hours * per_hour)):
+                epoch = end - self.rng.uniform(0, hours * 3600)
+                doc = self.generator.make(coin_type, epoch, self.rng.random() < tagged_ratio)
+                self.docs[doc["objectId"]] = doc
+                pairs.append((epoch, doc["objectId"]))
+                count += 1
+            pairs.sort(key=lambda p: p[0])
+            epochs[:] = [p[0] for p in pairs]
+            ids[:] = [p[1] for p in pairs]
+        return count
+
+    def feed(self, now: float) -> int:
+        """按泊松到达补齐到 now 的新新闻 (未处理，不带 newsTag)"""
+        rate = self.config.feed_rate_per_min / 60
+        if rate <= 0:
+            self._next_arrival.clear()
+            return 0
+        count = 0
+        for coin_type in COIN_NAMES:
+            arrival = self._next_arrival.get(coin_type) or now + self.rng.expovariate(rate)
+            while arrival <= now:
+                self.insert(coin_type, self.generator.make(coin_type, arrival, False), arrival)
+                arrival += self.rng.expovariate(rate)
+                count += 1
+            self._next_arrival[coin_type] = arrival
+        return count
+
+    def _apply_visible(self, now: float):
+        while self._invisible and self._invisible[0][0] <= now:
+            _, _, object_id, changes = heapq.heappop(self._invisible)
+            self.docs[object_id].update(changes)
+
+    def query(self, coin_type: int, start: float, end: float, now: float) -> List[Dict[str, Any]]:
+        """[start, end] 内的新闻，按时间倒序"""
+        self._apply_visible(now)
+        epochs, ids = self.index.get(coin_type, ([], []))
+        lo = bisect.bisect_left(epochs, start)
+        hi = bisect.bisect_right(epochs, end)
+        return [self.docs[object_id] for object_id in reversed(ids[lo:hi])]
+
+    def update(self, payload: Dict[str, Any], now: float) -> Dict[str, int]:
+        """类 Mongo 的 $set：tag 存为 newsTag，analysis 同时写入 comment，其余字段原样保存"""
+        object_id = str(payload.get("objectId"))
+        if object_id not in self.docs:
+            return {"matchedCount": 0, "modifiedCount": 0}
+        changes = {k: v for k, v in payload.items() if k not in ("objectId", "tag") and v is not None}
+        if payload.get("tag") is not None:
+            changes["newsTag"] = payload["tag"]
+        if "analysis" in changes:
+            changes["comment"] = changes["analysis"]
+        if self.config.write_visibility_delay > 0:
+            self._write_seq += 1
+            heapq.heappush(self._invisible, (now + self.config.write_visibility_delay, self._write_seq,
+                                             object_id, changes))
+        else:
+            self.docs[object_id].update(changes)
+        return {"matchedCount": 1, "modifiedCount": 1}
+
+    def stats(self) -> dict:
+        tagged = sum(1 for doc in self.docs.values() if "newsTag" in doc)
+        return {
+            "docs": {COIN_NAMES[ct]: len(ids) for ct, (_, ids) in self.index.items() if ct in COIN_NAMES},
+            "tagged": tagged,
+            "untagged": len(self.docs) - tagged,
+            "pending_visibility": len(self._invisible),
+        }
+
+
+def _error(status: int, message: str) -> JSONResponse:
+    return JSONResponse(status_code=status, content={"code": status, "msg": message, "data": None})
+
+
+# ==========================================
+# 服务
+# ==========================================
+def create_app(config: MockDataCenterConfig = None, store: DocumentStore = None) -> FastAPI:
+    """创建模拟服务并预填历史新闻 (也可以通过 httpx.ASGITransport 在进程内使用)"""
+    config = config or MockDataCenterConfig()
+    store = store or DocumentStore(config)
+    if not store.docs and config.seed_hours > 0:
+        store.seed(config.seed_hours, config.seed_per_hour, config.tagged_ratio)
+    app = FastAPI(title="Mock dataCenter API")
+    app.state.mock_config = config
+    app.state.mock_store = store
+    stats = {"fetches": 0, "fetched_items": 0, "updates": 0, "unmatched_updates": 0,
+             "errors": 0, "bad_requests": 0, "fetch_time_total": 0.0, "update_time_total": 0.0}
+
+    def delay(base_ms: float) -> float:
+        jitter = config.latency_jitter
+        return max(0.0, base_ms * store.rng.uniform(1 - jitter, 1 + jitter)) / 1000
+
+    @app.post(f"{API_PREFIX}/fetchCryptoPanic")
+    async def fetch_crypto_panic(request: Request):
+        started = time.perf_counter()
+        try:
+            body = await request.json()
+            coin_type = int(body["type"])
+            start, end = parse_request_time(body["startTime"]), parse_request_time(body["endTime"])
+        except (ValueError, KeyError, TypeError) as e:
+            stats["bad_requests"] += 1
+            return _error(400, f"invalid request: {e}")
+
+        now = time.time()
+        store.feed(now)
+        docs = store.query(coin_type, start, end, now)
+        # 在延迟之前序列化，之后的写入不会影响本次响应 (与真实上游一致)
+        content = json.dumps(docs, ensure_ascii=False)
+        await asyncio.sleep(delay(config.fetch_latency_ms) + len(docs) * config.fetch_ms_per_item / 1000)
+        if store.rng.random() < config.error_rate:
+            stats["errors"] += 1
+            return _error(500, "Internal Server Error")
+
+        stats["fetches"] += 1
+        stats["fetched_items"] += len(docs)
+        stats["fetch_time_total"] += time.perf_counter() - started
+        return Response(content=content, media_type="application/json")
+
+    @app.post(f"{API_PREFIX}/updatePanicNews")
+    async def update_panic_news(request: Request):
+        started = time.perf_counter()
+        try:
+            payload = await request.json()
+        except ValueError:
+            stats["bad_requests"] += 1
+            return _error(400, "invalid json")
+        if not isinstance(payload, dict) or not payload.get("objectId"):
+            stats["bad_requests"] += 1
+            return _error(400, "objectId is required")
+        if not any(payload.get(field) not in (None, "") for field in CONTENT_FIELDS):
+            stats["bad_requests"] += 1
+            return _error(400, "one of tag / summary / analysis / content is required")
+
+        await asyncio.sleep(delay(config.update_latency_ms))
+        if store.rng.random() < config.error_rate:
+            stats["errors"] += 1
+            return _error(500, "Internal Server Error")
+
+        result = store.update(payload, time.time())
+        stats["updates"] += 1
+        stats["unmatched_updates"] += result["matchedCount"] == 0
+        stats["update_time_total"] += time.perf_counter() - started
+        return {"code": 200, "msg": "success", "data": result}
+
+    @app.get("/mock/stats")
+    async def mock_stats():
+        return {
+            **{k: v for k, v in stats.items() if not k.endswith("_total")},
+            "avg_fetch_s": round(stats["fetch_time_total"] / stats["fetches"], 4) if stats["fetches"] else None,
+            "avg_update_s": round(stats["update_time_total"] / stats["updates"], 4) if stats["updates"] else None,
+            "store": store.stats(),
+            "config": asdict(config),
+        }
+
+    @app.post("/mock/config")
+    async def mock_config(request: Request):
+        try:
+            config.update(await request.json())
+        except (ValueError, TypeError) as e:
+            return _error(400, str(e))
+        return asdict(config)
+
+    @app.post("/mock/seed")
+    async def mock_seed(request: Request):
+        body = await request.json()
+        try:
+            added = store.seed(float(body.get("hours", 1)), float(body.get("per_hour", config.seed_per_hour)),
+                               float(body.get("tagged_ratio", config.tagged_ratio)),
+                               coin_types=[int(body["type"])] if body.get("type") else None)
+        except (ValueError, TypeError) as e:
+            return _error(400, str(e))
+        return {"added": added, "store": store.stats()}
+
+    @app.get("/mock/docs/{object_id}")
+    async def mock_doc(object_id: str):
+        doc = store.docs.get(object_id)
+        return doc if doc is not None else _error(404, "not found")
+
+    return app
+
+
+def main(argv: Optional[List[str]] = None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock dataCenter fetchCryptoPanic / updatePanicNews server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=15008)
+    defaults = MockDataCenterConfig()
+    for f in fields(MockDataCenterConfig):
+        parser.add_argument("--" + f.name.replace("_", "-"), type=type(getattr(defaults, f.name)),
+                            default=getattr(defaults, f.name))
+    args = parser.parse_args(argv)
+
+    config = MockDataCenterConfig(**{f.name: getattr(args, f.name) for f in fields(MockDataCenterConfig)})
+    app = create_app(config)
+    print(f"🧪 [MockDataCenter] http://{args.host}:{args.port}{API_PREFIX} | {app.state.mock_store.stats()}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
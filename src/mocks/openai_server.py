@@ -0,0 +1,334 @@
+# src/mocks/openai_server.py
+"""
+本地 OpenAI 兼容的模拟 LLM 服务 (chat completions + function calling)，用于离线压测采集器 / Pipeline / 调度器的吞吐。
+
+所有 Agent 都通过 ChatOpenAI(base_url=settings.OPENAI_BASE_URL) 调用模型，且都使用
+with_structured_output(method="function_calling")：请求里带有工具的 JSON Schema。本服务按该 Schema
+生成合法的参数 (FilterOutput / FilterBatchOutput / NLPAnalysisOutput / TradingSignal 均适用，新增的输出结构无需修改)：
+- 枚举随机取值，数值落在 Schema 的范围内 (long_short_score 为 -1~1，confidence 为 0~1，timestamp 为当前时间)
+- is_relevant 按 relevant_ratio 的概率为 True
+- 批量过滤的 object_id 从输入中的 [objectId] 行原样取回，每条输入对应一条结果
+- 同一请求内容在同一 seed 下生成相同的结果，便于复现
+
+可模拟的上游行为：延迟分布 (fixed / uniform / lognormal，另加按输出 token 计的生成耗时)、
+随机 500 错误、随机 429 限流以及超过 max_concurrency 的并发请求直接返回 429 (带 Retry-After)。
+运行统计见 GET /mock/stats，POST /mock/config 可在运行中调整参数。
+
+用法:
+    python -m src.mocks.openai_server --port 8100 --latency-ms 800 --latency-dist lognormal --error-rate 0.02
+    然后设置 OPENAI_BASE_URL=http://127.0.0.1:8100/v1 再启动服务或压测脚本
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass, asdict, fields
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# --- 配置 ---
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+OBJECT_ID_RE = re.compile(r"^\[([^\[\]\s]+)\]\s*$", re.MULTILINE)
+# 按字段名给出更贴近真实输出的取值范围 (Schema 中没有写明范围的字段)
+NUMBER_RANGES = {
+    "long_short_score": (-1.0, 1.0),
+    "confidence": (0.0, 1.0),
+}
+# 长文本字段的大致长度 (字符)
+TEXT_LENGTHS = {
+    "summary": 120,
+    "reason": 30,
+    "reasoning": 180,
+    "chain_of_thought": 300,
+}
+FILLER_TEXT = "模拟输出：市场情绪与价格动能的综合判断，仅用于离线压测。"
+
+
+@dataclass
+class MockLLMConfig:
+    latency_dist: str = "lognormal"  # fixed / uniform / lognormal
+    latency_ms: float = 800.0  # fixed 为固定值；uniform 为均值；lognormal 为中位数
+    latency_spread: float = 0.5  # uniform 为上下浮动比例；lognormal 为 sigma
+    ms_per_output_token: float = 0.0  # 额外的生成耗时 (按输出 token 计)
+    error_rate: float = 0.0  # 随机返回 500 的比例
+    rate_limit_rate: float = 0.0  # 随机返回 429 的比例
+    max_concurrency: int = 0  # 同时处理的请求上限，超出直接 429 (0 表示不限制)
+    retry_after: float = 1.0  # 429 响应的 Retry-After (秒)
+    relevant_ratio: float = 0.7  # is_relevant 为 True 的概率
+    seed: int = 0
+
+    def update(self, data: Dict[str, Any]):
+        known = {f.name for f in fields(self)}
+        for key, value in data.items():
+            if key not in known:
+                raise ValueError(f"Unknown config field: {key}")
+            setattr(self, key, type(getattr(self, key))(value))
+        if self.latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency_dist: {self.latency_dist}")
+
+
+def estimate_tokens(text: str) -> int:
+    """与 filter_agent.estimate_tokens 相同的粗略估算 (非 ASCII 约 1 token/字，ASCII 约 4 字符/token)"""
+    if not text:
+        return 0
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii) // 4 + 1
+
+
+def sample_latency(config: MockLLMConfig, rng: random.Random) -> float:
+    """按配置的分布抽取一次基础延迟 (秒)"""
+    base = max(config.latency_ms, 0.0) / 1000
+    if config.latency_dist == "uniform":
+        spread = base * config.latency_spread
+        return max(0.0, rng.uniform(base - spread, base + spread))
+    if config.latency_dist == "lognormal" and base > 0:
+        return rng.lognormvariate(math.log(base), max(config.latency_spread, 0.0))
+    return base
+
+
+# ==========================================
+# 按 JSON Schema 生成参数
+# ==========================================
+def _resolve(schema: Dict[str, Any], root: Dict[str, Any]) -> Dict[str, Any]:
+    """展开 $ref 与 anyOf / allOf (取第一个非 null 的分支)"""
+    while True:
+        if "$ref" in schema:
+            target = root
+            for part in schema["$ref"].lstrip("#/").split("/"):
+                target = target.get(part, {})
+            schema = target
+        elif "anyOf" in schema or "oneOf" in schema:
+            options = [s for s in schema.get("anyOf") or schema.get("oneOf") if s.get("type") != "null"]
+            schema = options[0] if options else {"type": "null"}
+        elif "allOf" in schema:
+            schema = schema["allOf"][0]
+        else:
+            return schema
+
+
+class SchemaFaker:
+    def __init__(self, rng: random.Random, config: MockLLMConfig, object_ids: List[str]):
+        self.rng = rng
+        self.config = config
+        self.object_ids = object_ids
+
+    def value(self, schema: Dict[str, Any], root: Dict[str, Any], name: str = "") -> Any:
+        schema = _resolve(schema, root)
+        if "enum" in schema:
+            return self.rng.choice(schema["enum"])
+        if "const" in schema:
+            return schema["const"]
+        kind = schema.get("type", "object" if "properties" in schema else "string")
+
+        if kind == "object":
+            properties = schema.get("properties", {})
+            return {key: self.value(sub, root, key) for key, sub in properties.items()}
+        if kind == "array":
+            items = _resolve(schema.get("items", {}), root)
+            # 批量输出：每个输入的 objectId 对应一条结果
+            if self.object_ids and "object_id" in items.get("properties", {}):
+                results = []
+                for object_id in self.object_ids:
+                    entry = self.value(items, root)
+                    entry["object_id"] = object_id
+                    results.append(entry)
+                return results
+            count = max(schema.get("minItems", 1), 1)
+            return [self.value(items, root, name) for _ in range(count)]
+        if kind == "boolean":
+            if name == "is_relevant":
+                return self.rng.random() < self.config.relevant_ratio
+            return self.rng.random() < 0.5
+        if kind in ("number", "integer"):
+            if name == "timestamp":
+                return time.time() if kind == "number" else int(time.time())
+            low, high = NUMBER_RANGES.get(name, (0.0, 1.0))
+            low = schema.get("minimum", schema.get("exclusiveMinimum", low))
+            high = schema.get("maximum", schema.get("exclusiveMaximum", high))
+            if kind == "integer":
+                return self.rng.randint(int(math.ceil(low)), int(math.floor(high)))
+            return round(self.rng.uniform(low, high), 3)
+        if kind == "null":
+            return None
+        if name == "object_id" and self.object_ids:
+            return self.object_ids[0]
+        length = TEXT_LENGTHS.get(name, 20)
+        text = (FILLER_TEXT * (length // len(FILLER_TEXT) + 1))[:length]
+        return text[:schema["maxLength"]] if "maxLength" in schema else text
+
+
+def _message_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(str(part.get("text", "")) for part in content if isinstance(part, dict))
+        parts.append(str(content or ""))
+    return "\n".join(parts)
+
+
+def _pick_tool(body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """tool_choice 指定的函数；未指定时取第一个工具"""
+    tools = [t.get("function", {}) for t in body.get("tools") or [] if t.get("type") == "function"]
+    if not tools:
+        # 旧版 functions / function_call 协议
+        tools = body.get("functions") or []
+    if not tools:
+        return None
+    choice = body.get("tool_choice") or body.get("function_call")
+    if isinstance(choice, dict):
+        name = (choice.get("function") or choice).get("name")
+        for tool in tools:
+            if tool.get("name") == name:
+                return tool
+    return tools[0]
+
+
+def _error(status: int, message: str, error_type: str, headers: Dict[str, str] = None) -> JSONResponse:
+    return JSONResponse(status_code=status, headers=headers,
+                        content={"error": {"message": message, "type": error_type, "code": error_type}})
+
+
+# ==========================================
+# 服务
+# ==========================================
+def create_app(config: MockLLMConfig = None) -> FastAPI:
+    """创建模拟服务 (也可以通过 httpx.ASGITransport 在进程内使用)"""
+    config = config or MockLLMConfig()
+    app = FastAPI(title="Mock OpenAI-compatible LLM")
+    state = {"in_flight": 0, "requests": 0, "ok": 0, "errors": 0, "rate_limited": 0,
+             "latency_total": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+             "by_model": {}, "by_tool": {}}
+    app.state.mock_config = config
+    app.state.mock_stats = state
+    rng = random.Random(config.seed)
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        state["requests"] += 1
+        model = body.get("model", "mock")
+        state["by_model"][model] = state["by_model"].get(model, 0) + 1
+        if body.get("stream"):
+            return _error(400, "stream is not supported by the mock server", "invalid_request_error")
+
+        if config.max_concurrency and state["in_flight"] >= config.max_concurrency:
+            state["rate_limited"] += 1
+            return _error(429, "Rate limit reached (concurrency)", "rate_limit_exceeded",
+                          {"Retry-After": str(config.retry_after)})
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            state["rate_limited"] += 1
+            return _error(429, "Rate limit reached", "rate_limit_exceeded", {"Retry-After": str(config.retry_after)})
+
+        state["in_flight"] += 1
+        started = time.perf_counter()
+        try:
+            prompt_text = _message_text(body.get("messages") or [])
+            # 同一 seed 下相同的请求内容生成相同的结果
+            digest = hashlib.sha256(f"{config.seed}|{model}|{prompt_text}".encode("utf-8")).hexdigest()
+            content_rng = random.Random(int(digest[:16], 16))
+            tool = _pick_tool(body)
+
+            message: Dict[str, Any] = {"role": "assistant", "content": None}
+            if tool is not None:
+                parameters = tool.get("parameters") or {}
+                faker = SchemaFaker(content_rng, config, OBJECT_ID_RE.findall(prompt_text))
+                arguments = json.dumps(faker.value(parameters, parameters), ensure_ascii=False)
+                output_text = arguments
+                tool_name = tool.get("name", "function")
+                state["by_tool"][tool_name] = state["by_tool"].get(tool_name, 0) + 1
+                if body.get("tools"):
+                    message["tool_calls"] = [{"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function",
+                                              "function": {"name": tool_name, "arguments": arguments}}]
+                    finish_reason = "tool_calls"
+                else:
+                    message["function_call"] = {"name": tool_name, "arguments": arguments}
+                    finish_reason = "function_call"
+            else:
+                output_text = FILLER_TEXT
+                message["content"] = output_text
+                finish_reason = "stop"
+
+            prompt_tokens = estimate_tokens(prompt_text)
+            completion_tokens = estimate_tokens(output_text)
+            delay = sample_latency(config, rng) + completion_tokens * config.ms_per_output_token / 1000
+            await asyncio.sleep(delay)
+
+            # 随机错误放在延迟之后：真实上游的失败通常也要等一段时间才返回
+            if roll < config.rate_limit_rate + config.error_rate:
+                state["errors"] += 1
+                return _error(500, "The server had an error while processing your request.", "server_error")
+
+            state["ok"] += 1
+            state["latency_total"] += time.perf_counter() - started
+            state["prompt_tokens"] += prompt_tokens
+            state["completion_tokens"] += completion_tokens
+            return {
+                "id": f"chatcmpl-mock-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": message, "logprobs": None, "finish_reason": finish_reason}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            }
+        finally:
+            state["in_flight"] -= 1
+
+    # base_url 可以带或不带 /v1
+    app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/chat/completions", chat_completions, methods=["POST"])
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": m, "object": "model", "owned_by": "mock"}
+                                           for m in state["by_model"]]}
+
+    @app.get("/mock/stats")
+    async def mock_stats():
+        return {
+            **{k: v for k, v in state.items() if k != "latency_total"},
+            "avg_latency_s": round(state["latency_total"] / state["ok"], 3) if state["ok"] else None,
+            "config": asdict(config),
+        }
+
+    @app.post("/mock/config")
+    async def mock_config(request: Request):
+        try:
+            config.update(await request.json())
+        except (ValueError, TypeError) as e:
+            return _error(400, str(e), "invalid_request_error")
+        return asdict(config)
+
+    return app
+
+
+def main(argv: Optional[List[str]] = None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    defaults = MockLLMConfig()
+    for f in fields(MockLLMConfig):
+        option = "--" + f.name.replace("_", "-")
+        if f.name == "latency_dist":
+            parser.add_argument(option, default=defaults.latency_dist, choices=LATENCY_DISTRIBUTIONS)
+        else:
+            parser.add_argument(option, type=type(getattr(defaults, f.name)), default=getattr(defaults, f.name))
+    args = parser.parse_args(argv)
+
+    config = MockLLMConfig(**{f.name: getattr(args, f.name) for f in fields(MockLLMConfig)})
+    print(f"🧪 [MockLLM] http://{args.host}:{args.port}/v1 | {asdict(config)}")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
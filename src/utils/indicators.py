@@ -0,0 +1,116 @@
+# src/utils/indicators.py
+"""
+向量化技术指标 (基于 numpy)。
+
+输入是共享 K 线存储 (src/core/candle_store.py) 返回的列式结构化数组，可一次传入多个交易对 / 周期：
+相同长度的序列堆叠成 (序列数, K线数) 的二维数组，一次计算出全部指标，不再逐个用 Python 循环。
+
+每个序列返回最新一根 K 线上的指标值：
+- rsi: Wilder RSI (不足 period + 1 根时为 50)
+- ema_fast / ema_slow: EMA (以前 period 根的均值为初值)
+- atr / atr_pct: Wilder ATR 及其占现价的百分比
+- volatility_pct: 对数收益率的标准差 (单根 K 线，百分比)
+- vwap / vwap_dev_pct: 窗口内成交量加权均价及现价偏离
+- volume_z: 最后一根成交量相对窗口内此前各根的 z-score；volume_ratio: 相对上一根的倍数
+- change_pct: 窗口首根收盘价到现价的涨跌幅；last_change_pct: 最后一根 K 线的开收涨跌幅
+"""
+from typing import Any, Dict, Hashable, Mapping
+
+import numpy as np
+
+RSI_PERIOD = 14
+EMA_FAST = 12
+EMA_SLOW = 26
+ATR_PERIOD = 14
+
+
+def _smoothed_last(values: np.ndarray, period: int, alpha: float) -> np.ndarray:
+    """
+    递推平滑 avg = avg * (1 - alpha) + alpha * x 的最终值 (初值为前 period 个的均值)，按行计算。
+    递推式展开为加权和，一次矩阵乘法即可得到所有序列的结果；长度不足 period 时为 NaN。
+    """
+    rows, length = values.shape
+    if length < period:
+        return np.full(rows, np.nan)
+    seed = values[:, :period].mean(axis=1)
+    rest = values[:, period:]
+    decay = 1.0 - alpha
+    weights = alpha * decay ** np.arange(rest.shape[1] - 1, -1, -1)
+    return seed * decay ** rest.shape[1] + rest @ weights
+
+
+def _compute_block(o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray, v: np.ndarray) -> Dict[str, np.ndarray]:
+    """对 (序列数, K线数) 的二维数组计算指标，每个指标返回长度为序列数的一维数组"""
+    length = c.shape[1]
+    last = c[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        deltas = np.diff(c, axis=1)
+
+        # RSI (Wilder 平滑)
+        if length < RSI_PERIOD + 1:
+            rsi = np.full(len(c), 50.0)
+        else:
+            avg_gain = _smoothed_last(np.clip(deltas, 0, None), RSI_PERIOD, 1.0 / RSI_PERIOD)
+            avg_loss = _smoothed_last(np.clip(-deltas, 0, None), RSI_PERIOD, 1.0 / RSI_PERIOD)
+            rsi = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+
+        # ATR (真实波幅的 Wilder 平滑)
+        prev_close = c[:, :-1]
+        true_range = np.maximum.reduce([h[:, 1:] - l[:, 1:], np.abs(h[:, 1:] - prev_close),
+                                        np.abs(l[:, 1:] - prev_close)])
+        atr = _smoothed_last(true_range, ATR_PERIOD, 1.0 / ATR_PERIOD)
+
+        log_returns = np.diff(np.log(c), axis=1)
+        volatility = log_returns.std(axis=1, ddof=1) * 100 if length > 2 else np.full(len(c), np.nan)
+
+        typical = (h + l + c) / 3
+        volume_sum = v.sum(axis=1)
+        vwap = np.where(volume_sum > 0, (typical * v).sum(axis=1) / volume_sum, np.nan)
+
+        if length > 2:
+            history = v[:, :-1]
+            volume_std = history.std(axis=1, ddof=1)
+            volume_z = np.where(volume_std > 0, (v[:, -1] - history.mean(axis=1)) / volume_std, 0.0)
+        else:
+            volume_z = np.full(len(c), np.nan)
+        volume_ratio = v[:, -1] / v[:, -2] if length > 1 else np.full(len(c), np.nan)
+
+        return {
+            "close": last,
+            "change_pct": (last / c[:, 0] - 1) * 100,
+            "last_change_pct": (last / o[:, -1] - 1) * 100,
+            "rsi": rsi,
+            "ema_fast": _smoothed_last(c, EMA_FAST, 2.0 / (EMA_FAST + 1)),
+            "ema_slow": _smoothed_last(c, EMA_SLOW, 2.0 / (EMA_SLOW + 1)),
+            "atr": atr,
+            "atr_pct": atr / last * 100,
+            "volatility_pct": volatility,
+            "vwap": vwap,
+            "vwap_dev_pct": (last / vwap - 1) * 100,
+            "volume_z": volume_z,
+            "volume_ratio": volume_ratio,
+        }
+
+
+def compute_indicators(series: Mapping[Hashable, np.ndarray]) -> Dict[Hashable, Dict[str, Any]]:
+    """
+    批量计算指标。series: {键 (如 ("BTCUSDT", "1h")): K 线结构化数组}。
+    返回 {键: {指标名: float 或 None}}，空序列对应空字典；无法计算的指标 (数据不足) 为 None。
+    """
+    results: Dict[Hashable, Dict[str, Any]] = {key: {} for key in series}
+    # 按长度分组，同组堆叠成二维数组一次计算
+    groups: Dict[int, list] = {}
+    for key, candles in series.items():
+        if len(candles):
+            groups.setdefault(len(candles), []).append(key)
+
+    for keys in groups.values():
+        stacked = np.stack([series[key] for key in keys])
+        block = _compute_block(*(stacked[field].astype(np.float64)
+                                 for field in ("open", "high", "low", "close", "volume")))
+        for i, key in enumerate(keys):
+            results[key] = {
+                name: (float(values[i]) if np.isfinite(values[i]) else None)
+                for name, values in block.items()
+            }
+    return results
@@ -4,6 +4,30 @@ from datetime import datetime, timezone
 from src.schemas.data_models import TradingSignal
 
 
+def extract_base_analysis(current_text: str) -> str:
+    """
+    取出 analysis 字段中的基础分析 (NLP 的 Impact / Score 字符串)，不含 Agent 追加的信号。
+
+    :param current_text: 数据库当前存储的 analysis 字符串 (JSON 结构或旧格式纯文本)
+    :return: base_analysis 字符串，没有时返回空串
+    """
+    if not current_text:
+        return ""
+    try:
+        data = json.loads(current_text)
+    except (json.JSONDecodeError, TypeError):
+        # 旧格式：去掉拼接在后面的信号片段
+        parts = current_text.split(" || ")
+        return " || ".join(
+            p for p in parts
+            if "【MACRO_SIGNAL】" not in p and "【1H_PREDICTION】" not in p and p.strip()
+        )
+    if isinstance(data, dict):
+        base = data.get("base_analysis")
+        return base if isinstance(base, str) else ""
+    return str(data)
+
+
 def append_signal_to_structure(current_text: str, new_signal: TradingSignal, signal_type: str) -> str:
     """
     将新的信号追加到 analysis 字段的列表中，保留历史记录。
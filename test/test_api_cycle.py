@@ -1,11 +1,14 @@
+import os
 import requests
 import json
 import time
 from datetime import datetime, timedelta
 
 # --- 配置 ---
-FETCH_URL = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto/fetchCryptoPanic"
-UPDATE_URL = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto/updatePanicNews"
+# 可通过环境变量 DATACENTER_BASE_URL 指向本地模拟服务 (python -m src.mocks.datacenter_server)
+DATACENTER_BASE_URL = os.getenv("DATACENTER_BASE_URL", "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto")
+FETCH_URL = f"{DATACENTER_BASE_URL}/fetchCryptoPanic"
+UPDATE_URL = f"{DATACENTER_BASE_URL}/updatePanicNews"
 
 HEADERS = {
     'Content-Type': 'application/json',
@@ -1,10 +1,13 @@
 import asyncio
+import os
 import httpx
 from datetime import datetime, timedelta
 import json
 
 # --- 配置 (与你的项目保持一致) ---
-FETCH_API_URL = "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto/fetchCryptoPanic"
+# 可通过环境变量 DATACENTER_BASE_URL 指向本地模拟服务 (python -m src.mocks.datacenter_server)
+DATACENTER_BASE_URL = os.getenv("DATACENTER_BASE_URL", "http://api.ibyteai.com:15008/10Ai/dataCenter/crypto")
+FETCH_API_URL = f"{DATACENTER_BASE_URL}/fetchCryptoPanic"
 HEADERS = {'Content-Type': 'application/json'}
 
 
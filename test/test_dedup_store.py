@@ -0,0 +1,95 @@
+import asyncio
+import os
+
+# 使用内存数据库，不碰真实的 DATABASE_URL (必须在导入 src 之前设置)
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///:memory:"
+
+from src.core import dedup_store as dedup_module  # noqa: E402
+from src.core.database import async_session, ensure_tables  # noqa: E402
+from src.core.dedup_store import MemoryDedupStore, SQLDedupStore  # noqa: E402
+from src.core.models import SeenNews  # noqa: E402
+
+# --- 配置 ---
+TTL_SECONDS = 48 * 3600
+LEASE_SECONDS = 30 * 60
+CAPACITY = 1000
+START_TIME = 1_700_000_000.0
+
+
+class FakeClock:
+    """替换 dedup_store 模块里的 time，手动推进时间"""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+def broken_session_factory():
+    raise ConnectionError("database is down")
+
+
+async def check_lease_cycle(name: str, store, clock: FakeClock, report):
+    """短租约到期后可重新占用；confirm 之后按完整 TTL 保留"""
+    report(f"[{name}] 首次占用", await store.claim_many(["a", "b"]) == {"a", "b"})
+    report(f"[{name}] 租约内不能重复占用", await store.claim_many(["a", "b", "c"]) == {"c"})
+
+    await store.confirm_many(["b"])
+    clock.now += LEASE_SECONDS + 1
+    report(f"[{name}] 租约到期后重新占用，已确认的仍保留", await store.claim_many(["a", "b"]) == {"a"})
+    report(f"[{name}] 已确认的 ID 仍在索引中", await store.contains("b"))
+
+    clock.now += TTL_SECONDS
+    report(f"[{name}] TTL 到期后可再次占用", await store.claim_many(["b"]) == {"b"})
+
+
+async def main():
+    await ensure_tables()
+    clock = FakeClock(START_TIME)
+    dedup_module.time = clock
+
+    failed = 0
+
+    def report(name: str, ok: bool):
+        nonlocal failed
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} {name}")
+
+    # 1. 两种后端的租约 / 确认 / 过期
+    await check_lease_cycle("memory", MemoryDedupStore(TTL_SECONDS, CAPACITY, LEASE_SECONDS), clock, report)
+    await check_lease_cycle("sql", SQLDedupStore(async_session, TTL_SECONDS, CAPACITY, LEASE_SECONDS), clock, report)
+
+    # 2. 两个副本共用一个数据库：租约期间互斥，租约到期后只有一个副本能重新占用
+    replica_a = SQLDedupStore(async_session, TTL_SECONDS, CAPACITY, LEASE_SECONDS)
+    replica_b = SQLDedupStore(async_session, TTL_SECONDS, CAPACITY, LEASE_SECONDS)
+    report("[replica] A 占用", await replica_a.claim_many(["r1"]) == {"r1"})
+    report("[replica] A 的租约期间 B 不能占用", await replica_b.claim_many(["r1"]) == set())
+    clock.now += LEASE_SECONDS + 1
+    report("[replica] A 的租约到期后 B 重新占用", await replica_b.claim_many(["r1"]) == {"r1"})
+    report("[replica] B 重新占用后 A 不能再占用", await replica_a.claim_many(["r1"]) == set())
+
+    # 3. 主键冲突后的逐条占用：过期行续期、新 ID 插入、未过期的行保持不变
+    now = clock.now
+    async with async_session() as session:
+        session.add(SeenNews(object_id="held", seen_at=now, expires_at=now + LEASE_SECONDS))
+        session.add(SeenNews(object_id="expired", seen_at=now - TTL_SECONDS, expires_at=now - 1))
+        await session.commit()
+    store = SQLDedupStore(async_session, TTL_SECONDS, CAPACITY, LEASE_SECONDS)
+    claimed = await store._claim_one_by_one(SeenNews, ["held", "expired", "fresh"], now)
+    report("[fallback] 逐条占用过期行和新 ID", claimed == {"expired", "fresh"})
+    async with async_session() as session:
+        renewed = await session.get(SeenNews, "expired")
+    report("[fallback] 过期行续期为新的租约", renewed.expires_at == now + LEASE_SECONDS)
+
+    # 4. 数据库不可用时降级为进程内去重
+    store = SQLDedupStore(broken_session_factory, TTL_SECONDS, CAPACITY, LEASE_SECONDS)
+    report("[degraded] 数据库不可用时仍能占用", await store.claim_many(["d1"]) == {"d1"} and store.db_errors == 1)
+    report("[degraded] 进程内仍然去重", await store.claim_many(["d1"]) == set())
+
+    print("=" * 40)
+    print("🎉 全部通过" if not failed else f"❌ 失败 {failed} 项")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
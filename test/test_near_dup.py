@@ -0,0 +1,61 @@
+import json
+
+from src.core.near_dup import NearDupIndex, news_text
+from src.core.collectors import reusable_result
+
+# --- 配置 ---
+MAX_HAMMING = 8
+# 共用模板描述：旧版本把描述也算进指纹，会把方向相反的快讯拉到阈值以内
+BOILERPLATE = "据交易所行情数据显示，市场波动加剧，请投资者注意风险，理性投资。本文不构成投资建议。"
+
+# 方向相反 / 数字不同的快讯，不能被当成同一簇
+CONFLICT_PAIRS = [
+    ("ETH 跌破 4,500 USDT", "ETH 突破 4,500 USDT"),
+    ("BTC 跌破 100,000 美元", "BTC 突破 100,000 美元"),
+    ("BTC surges past $100,000", "BTC plunges below $100,000"),
+    ("ETH 跌破 4,500 USDT", "ETH 跌破 4,400 USDT"),
+]
+# 同一快讯的改写，仍然应该命中
+DUPLICATE_PAIRS = [
+    ("ETH 跌破 4,500 USDT", "ETH 跌破 4500 USDT"),
+    ("BTC 跌破 100,000 美元，日内跌幅 2%", "BTC跌破100000美元,日内跌幅2%"),
+]
+
+
+def check_pair(first: str, second: str) -> bool:
+    index = NearDupIndex(max_hamming=MAX_HAMMING, window_seconds=3600, capacity=100)
+    index.check_and_add("a", news_text({"title": first, "description": BOILERPLATE}))
+    return index.check_and_add("b", news_text({"title": second, "description": BOILERPLATE})) == "a"
+
+
+def main():
+    failed = 0
+    for first, second in CONFLICT_PAIRS:
+        ok = not check_pair(first, second)
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} 不应合并: {first} | {second}")
+    for first, second in DUPLICATE_PAIRS:
+        ok = check_pair(first, second)
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} 应合并: {first} | {second}")
+
+    # 复用结果时只带基础分析，canonical 的 Agent 信号不会被复制，analysis 仍是合法结构
+    canonical = {
+        "newsTag": 3,
+        "summary": "ETH 跌破 4500",
+        "analysis": json.dumps({
+            "base_analysis": "Impact:HIGH|Score:-0.70",
+            "short_term_signals": [{"direction": "BEARISH", "confidence": 0.8}],
+        }),
+    }
+    result = reusable_result(canonical)
+    ok = result["analysis"] == "Impact:HIGH|Score:-0.70"
+    failed += not ok
+    print(f"{'✅' if ok else '❌'} 复用的 analysis: {result['analysis']}")
+
+    print("=" * 40)
+    print("🎉 全部通过" if not failed else f"❌ 失败 {failed} 项")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import asyncio
+import os
+
+# 使用内存数据库，不碰真实的 DATABASE_URL (必须在导入 src 之前设置)
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///:memory:"
+
+from src.core import retry_queue as retry_module  # noqa: E402
+from src.core.database import async_session, ensure_tables  # noqa: E402
+from src.core.models import RetryQueueEntry, DeadLetterEntry  # noqa: E402
+from src.core.retry_queue import RetryQueue  # noqa: E402
+
+# --- 配置 ---
+MAX_ATTEMPTS = 3
+BASE_DELAY = 120
+MAX_DELAY = 3600
+START_TIME = 1_700_000_000.0
+
+
+class FakeClock:
+    """替换 retry_queue 模块里的 time，手动推进时间"""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+async def get_row(model, object_id: str):
+    async with async_session() as session:
+        return await session.get(model, object_id)
+
+
+async def main():
+    await ensure_tables()
+    clock = FakeClock(START_TIME)
+    retry_module.time = clock
+    queue = RetryQueue(async_session, max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY, max_delay=MAX_DELAY)
+    item = {"objectId": "retry-1", "title": "BTC 跌破 100,000 美元"}
+
+    failed = 0
+
+    def report(name: str, ok: bool):
+        nonlocal failed
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} {name}")
+
+    # 1. 第一次失败：按 BASE_DELAY (±20% 抖动) 安排重试，到期前不会被取出
+    report("第一次失败安排重试", await queue.schedule(item, "LLM timeout"))
+    row = await get_row(RetryQueueEntry, "retry-1")
+    delay = row.next_attempt_at - clock.now
+    report(f"退避时间在 BASE_DELAY 抖动范围内 ({delay:.0f}s)", BASE_DELAY * 0.8 <= delay <= BASE_DELAY * 1.2)
+    report("到期前不会取出", await queue.take_due(10) == [])
+    report("已在队列中的 ID", await queue.queued_ids(["retry-1", "other"]) == {"retry-1"})
+
+    # 2. 到期后取出，并把下次时间推后 MAX_DELAY 作为租约
+    clock.now = row.next_attempt_at
+    report("到期后取出", await queue.take_due(10) == [item])
+    row = await get_row(RetryQueueEntry, "retry-1")
+    report("取出后租约推后 MAX_DELAY", row.next_attempt_at == clock.now + MAX_DELAY and "retry-1" in queue.in_flight)
+    report("租约期间不会重复取出", await queue.take_due(10) == [])
+
+    # 3. 第二次失败：退避翻倍
+    report("第二次失败安排重试", await queue.schedule(item, "crawl timeout"))
+    row = await get_row(RetryQueueEntry, "retry-1")
+    delay = row.next_attempt_at - clock.now
+    report(f"第二次退避翻倍 ({delay:.0f}s)", BASE_DELAY * 2 * 0.8 <= delay <= BASE_DELAY * 2 * 1.2
+           and row.attempts == 2 and "retry-1" not in queue.in_flight)
+
+    # 4. 达到最大次数：移入死信表，保留原始条目和最后的错误
+    clock.now = row.next_attempt_at
+    await queue.take_due(10)
+    report("达到最大次数后不再重试", not await queue.schedule(item, "parse error"))
+    dead = await get_row(DeadLetterEntry, "retry-1")
+    report("移出重试队列", await get_row(RetryQueueEntry, "retry-1") is None)
+    report("写入死信表", dead is not None and dead.attempts == MAX_ATTEMPTS and dead.last_error == "parse error"
+           and dead.first_failed_at == START_TIME and "BTC" in dead.item)
+
+    # 5. 重试成功后从队列删除
+    await queue.schedule({"objectId": "retry-2"}, "LLM timeout")
+    clock.now += MAX_DELAY * 2
+    await queue.take_due(10)
+    await queue.resolve("retry-2")
+    report("重试成功后删除", await get_row(RetryQueueEntry, "retry-2") is None and queue.recovered == 1
+           and not queue.in_flight)
+
+    print("=" * 40)
+    print("🎉 全部通过" if not failed else f"❌ 失败 {failed} 项")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
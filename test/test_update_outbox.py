@@ -0,0 +1,148 @@
+import asyncio
+import os
+
+# 使用内存数据库，不碰真实的 DATABASE_URL (必须在导入 src 之前设置)
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///:memory:"
+
+from sqlalchemy import select  # noqa: E402
+
+from src.core import news_store, update_outbox as outbox_module  # noqa: E402
+from src.core.database import async_session, ensure_tables  # noqa: E402
+from src.core.models import UpdateOutboxEntry  # noqa: E402
+from src.core.update_outbox import UpdateOutbox  # noqa: E402
+
+# --- 配置 ---
+MAX_ATTEMPTS = 2
+START_TIME = 1_700_000_000.0
+
+
+class FakeClock:
+    """替换 update_outbox 模块里的 time，手动推进时间"""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+
+class FakeSender:
+    """替换 UpdateOutbox._send：记录发出的 payload，按 results 依次返回成功 / 失败"""
+
+    def __init__(self, results=None, during_send=None):
+        self.results = list(results or [])
+        self.during_send = during_send
+        self.sent = []
+
+    async def __call__(self, payload):
+        self.sent.append(dict(payload))
+        if self.during_send is not None:
+            hook, self.during_send = self.during_send, None
+            await hook()
+        ok = self.results.pop(0) if self.results else True
+        return (True, None) if ok else (False, "API Code 500")
+
+
+async def pending_rows(object_id: str):
+    async with async_session() as session:
+        result = await session.execute(select(UpdateOutboxEntry).where(UpdateOutboxEntry.object_id == object_id))
+        return list(result.scalars())
+
+
+def new_outbox(sender: FakeSender) -> UpdateOutbox:
+    outbox = UpdateOutbox(async_session, concurrency=2, max_attempts=MAX_ATTEMPTS)
+    outbox._send = sender
+    return outbox
+
+
+async def check_merge(report):
+    """同一 objectId 的两次入队合并成一条记录，字段按先后覆盖，只发送一次"""
+    sender = FakeSender()
+    outbox = new_outbox(sender)
+    await outbox.enqueue({"objectId": "merge-1", "newsTag": 3, "summary": "old"})
+    await outbox.enqueue({"objectId": "merge-1", "summary": "new"}, verify_tag=3)
+
+    rows = await pending_rows("merge-1")
+    row = rows[0] if rows else None
+    report("两次入队只有一条记录", len(rows) == 1)
+    report("合并后的 payload 与版本号", row is not None and row.version == 2
+           and '"summary": "new"' in row.payload and '"newsTag": 3' in row.payload)
+    report("合并后的修改固定在本地副本", news_store._pinned_updates.get("merge-1") == {"newsTag": 3, "summary": "new"})
+
+    delivered = await outbox.flush_due()
+    report("只发送一次合并后的 payload", delivered == 1 and sender.sent == [
+        {"objectId": "merge-1", "newsTag": 3, "summary": "new"}])
+    report("送达后删除记录并解除固定", not await pending_rows("merge-1") and "merge-1" not in news_store._pinned_updates)
+
+
+async def check_enqueue_during_flush(report, clock: FakeClock):
+    """发送过程中又合并进新修改：本次送达不删除记录，立即再发一次"""
+    outbox = None
+
+    async def late_update():
+        await outbox.enqueue({"objectId": "race-1", "summary": "late"})
+
+    sender = FakeSender(during_send=late_update)
+    outbox = new_outbox(sender)
+    await outbox.enqueue({"objectId": "race-1", "newsTag": 2})
+
+    await outbox.flush_due()
+    rows = await pending_rows("race-1")
+    row = rows[0] if rows else None
+    report("发送期间的新修改保留记录", row is not None and row.status == "pending" and row.attempts == 0
+           and row.next_attempt_at <= clock.now)
+    report("记录保留期间仍固定在本地副本", "race-1" in news_store._pinned_updates)
+
+    await outbox.flush_due()
+    report("第二次发送带上新修改", len(sender.sent) == 2 and sender.sent[1].get("summary") == "late"
+           and sender.sent[1].get("newsTag") == 2)
+    report("第二次送达后删除记录", not await pending_rows("race-1") and "race-1" not in news_store._pinned_updates)
+
+
+async def check_dead(report, clock: FakeClock):
+    """重试次数用尽后标记为 dead 并解除固定"""
+    sender = FakeSender(results=[False] * MAX_ATTEMPTS)
+    outbox = new_outbox(sender)
+    await outbox.enqueue({"objectId": "dead-1", "newsTag": 1})
+
+    await outbox.flush_due()
+    row = (await pending_rows("dead-1"))[0]
+    report("第一次失败后退避重试", row.status == "pending" and row.attempts == 1
+           and row.next_attempt_at > clock.now and row.last_error == "API Code 500")
+    report("退避期间不会重发", await outbox.flush_due() == 0 and len(sender.sent) == 1)
+
+    clock.now = row.next_attempt_at + 1
+    await outbox.flush_due()
+    row = (await pending_rows("dead-1"))[0]
+    report("达到最大次数后标记为 dead", row.status == "dead" and row.attempts == MAX_ATTEMPTS and outbox.dead == 1)
+    report("dead 记录解除固定", "dead-1" not in news_store._pinned_updates)
+
+    clock.now += 3600
+    report("dead 记录不再发送", await outbox.flush_due() == 0 and len(sender.sent) == MAX_ATTEMPTS)
+
+
+async def main():
+    await ensure_tables()
+    clock = FakeClock(START_TIME)
+    outbox_module.time = clock
+
+    failed = 0
+
+    def report(name: str, ok: bool):
+        nonlocal failed
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} {name}")
+
+    await check_merge(report)
+    await check_enqueue_during_flush(report, clock)
+    await check_dead(report, clock)
+
+    print("=" * 40)
+    print("🎉 全部通过" if not failed else f"❌ 失败 {failed} 项")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())